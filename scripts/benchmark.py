@@ -0,0 +1,152 @@
+# bash: python benchmark.py --days 7 --tweets_per_day 1000 --vocab_size 3000 --compare ../data/benchmarks/<earlier run>.json
+# time every stage of the pipeline on synthetic data, results are written as json to compare runs over time
+# RunBenchmark, CompareBenchmarks
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import tempfile
+import numpy as np
+import networkx as nx
+
+from synthetic_data import GenerateSyntheticData, MakeSyntheticDateRange, DEFAULT_KEYWORDS
+from main_run_clustering import MakeTokenGraphsRaw, WeightAndPruneTokenGraph, AddRemovedNodesToClusters, PRUNING_DEFAULTS, AddPruningArguments, PruningFromArgs
+from mcl_with_removal import FindOptimClustering
+from main_trace_transition import GetCrispTransitionTuples, GetFuzzyTransitionTuples
+from transition_visualization import TransitionViz
+
+BENCHMARK_FORMAT_VERSION = 1
+
+
+def _timeStage(stage_results, stage_name, function, *args, **kwargs):
+	""" run function once, record its wall time under stage_name and return its output """
+	start = time.perf_counter()
+	output = function(*args, **kwargs)
+	stage_results[stage_name] = {'seconds': time.perf_counter() - start}
+	return output
+
+
+def RunBenchmark(work_dir, days=7, tweets_per_day=1000, vocab_size=3000, num_topics=20, drift=0.1, removal_fraction=0.2, seed=0, pruning=None):
+	""" generate synthetic data in work_dir and time MakeTokenGraphsRaw, ComputeEdgeWeights, FindOptimClustering,
+		crisp and fuzzy tracing and rendering on it
+		* pruning - rules of main_run_clustering.WeightAndPruneTokenGraph, compare with a run without them for the time saved
+		* benchmark - {'config', 'environment', 'stages': {stage: {'seconds', sizes...}}, 'total_seconds'}
+	"""
+	config = {'days': days, 'tweets_per_day': tweets_per_day, 'vocab_size': vocab_size, 'num_topics': num_topics,
+			  'drift': drift, 'removal_fraction': removal_fraction, 'seed': seed, 'pruning': dict(PRUNING_DEFAULTS, **(pruning or dict()))}
+	stages = dict()
+
+	data_dir = os.path.join(work_dir, 'processed')
+	date_range = MakeSyntheticDateRange(days)
+	_timeStage(stages, 'generate', GenerateSyntheticData, data_dir, date_range, tweets_per_day, vocab_size, num_topics, drift=drift, seed=seed)
+
+	graphs, daily_tweet_counts = _timeStage(stages, 'make_token_graphs', MakeTokenGraphsRaw, date_range, data_dir, DEFAULT_KEYWORDS)
+	stages['make_token_graphs']['num_tweets'] = sum(daily_tweet_counts)
+	stages['make_token_graphs']['num_nodes'] = sum(g.number_of_nodes() for g in graphs)
+	stages['make_token_graphs']['num_edges'] = sum(g.number_of_edges() for g in graphs)
+
+	def computeAllEdgeWeights():
+		total_num_tweets = sum(daily_tweet_counts)
+		removed = dict()
+		for graph in graphs:
+			for rule, rule_removed in WeightAndPruneTokenGraph(graph, total_num_tweets, config['pruning']).items():
+				for kind, count in rule_removed.items():
+					removed[rule + '_' + kind] = removed.get(rule + '_' + kind, 0) + count
+		return removed
+	removed = _timeStage(stages, 'compute_edge_weights', computeAllEdgeWeights)
+	stages['compute_edge_weights'].update(('removed_' + name, count) for name, count in removed.items())
+	stages['compute_edge_weights']['num_nodes'] = sum(g.number_of_nodes() for g in graphs)
+	stages['compute_edge_weights']['num_edges'] = sum(g.number_of_edges() for g in graphs)
+
+	def clusterAllDays():
+		clustering_by_timepoint = list()
+		for graph in graphs:
+			modularity_vals, highest_modularity, best_nodes_removed, best_subgraph, best_clustering = FindOptimClustering(graph, iteration=int(graph.number_of_nodes() * removal_fraction))
+			clustering_by_timepoint.append(AddRemovedNodesToClusters(graph, best_nodes_removed, best_clustering))
+		return clustering_by_timepoint
+	clustering_by_timepoint = _timeStage(stages, 'find_optim_clustering', clusterAllDays)
+	stages['find_optim_clustering']['num_clusters'] = sum(len(clustering) for clustering in clustering_by_timepoint)
+
+	crisp_tuples = _timeStage(stages, 'trace_crisp', GetCrispTransitionTuples, clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=2/3)
+	stages['trace_crisp']['num_tuples'] = len(crisp_tuples)
+
+	fuzzy_tuples = _timeStage(stages, 'trace_fuzzy', GetFuzzyTransitionTuples, clustering_by_timepoint, date_range)
+	stages['trace_fuzzy']['num_tuples'] = len(fuzzy_tuples)
+
+	tuples_path = os.path.join(work_dir, 'fuzzy_graph_tuples.json')
+	with open(tuples_path, 'w', encoding='utf-8') as textfile:
+		json.dump(fuzzy_tuples, textfile, indent=2)
+	_timeStage(stages, 'render', TransitionViz, tuples_path, os.path.join(work_dir, 'dot', 'fuzzy_graph_tuples.dot'), date_range)
+
+	environment = {'python': platform.python_version(), 'numpy': np.__version__, 'networkx': nx.__version__,
+				   'platform': platform.platform(), 'processor': platform.processor()}
+
+	return {'format_version': BENCHMARK_FORMAT_VERSION,
+			'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+			'config': config,
+			'environment': environment,
+			'stages': stages,
+			'total_seconds': sum(stage['seconds'] for name, stage in stages.items() if name != 'generate')}
+
+
+def CompareBenchmarks(previous, current):
+	""" speedup of each stage of current over previous, > 1 is faster, e.g. of a run with pruning over one without
+		* speedups - {stage: previous seconds / current seconds}
+	"""
+	previous_config = dict(previous['config'])
+	current_config = dict(current['config'])
+	if previous_config.pop('pruning', PRUNING_DEFAULTS) != current_config.pop('pruning'):
+		print('pruning differs:', previous['config'].get('pruning', PRUNING_DEFAULTS), '->', current['config']['pruning'], file=sys.stderr)
+	if previous_config != current_config:
+		print('WARNING: benchmark configs differ, timings are not comparable', file=sys.stderr)
+	speedups = dict()
+	for stage_name, stage in current['stages'].items():
+		if stage_name in previous['stages'] and stage['seconds'] > 0:
+			speedups[stage_name] = previous['stages'][stage_name]['seconds'] / stage['seconds']
+	return speedups
+
+
+if __name__=='__main__':
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='benchmark parameters')
+	parser.add_argument('--days', type=int, default=7, help='number of days')
+	parser.add_argument('--tweets_per_day', type=int, default=1000, help='number of tweets per day')
+	parser.add_argument('--vocab_size', type=int, default=3000, help='number of distinct nouns')
+	parser.add_argument('--num_topics', type=int, default=20, help='number of topics')
+	parser.add_argument('--drift', type=float, default=0.1, help='fraction of topic tokens replaced each day')
+	parser.add_argument('--removal_fraction', type=float, default=0.2, help='fraction of nodes FindOptimClustering tries to remove')
+	parser.add_argument('--seed', type=int, default=0, help='random seed')
+	parser.add_argument('--output_dir', type=str, default='../data/benchmarks/', help='directory for the benchmark json files')
+	parser.add_argument('--work_dir', type=str, default=None, help='keep the synthetic data and outputs here instead of a temporary directory')
+	parser.add_argument('--compare', type=str, default=None, help='earlier benchmark json to compare against')
+	AddPruningArguments(parser)
+	args = parser.parse_args()
+
+	work_dir = args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix='benchmark_')
+	try:
+		benchmark = RunBenchmark(work_dir, args.days, args.tweets_per_day, args.vocab_size, args.num_topics, args.drift, args.removal_fraction, args.seed, PruningFromArgs(args))
+	finally:
+		if args.work_dir is None:
+			shutil.rmtree(work_dir, ignore_errors=True)
+
+	if not os.path.isdir(args.output_dir):
+		os.makedirs(args.output_dir)
+	output_path = os.path.join(args.output_dir, 'benchmark_' + benchmark['timestamp'].replace(':', '') + '.json')
+	with open(output_path, 'w', encoding='utf-8') as textfile:
+		json.dump(benchmark, textfile, indent=2)
+
+	for stage_name, stage in benchmark['stages'].items():
+		print('{:<24}{:>10.3f}s'.format(stage_name, stage['seconds']))
+	print('results written to', output_path)
+
+	if args.compare is not None:
+		with open(args.compare, 'r', encoding='utf-8') as textfile:
+			previous = json.load(textfile)
+		for stage_name, speedup in CompareBenchmarks(previous, benchmark).items():
+			print('{:<24}{:>9.2f}x'.format(stage_name, speedup))
@@ -1,26 +1,109 @@
 
-# ClusterNode, GraphEdge, Graph 
+# Vocabulary, ClusterNode, GraphEdge, GraphEdgeIntersection, Graph 
+
+import numpy as np 
+from collections import deque 
+
+# shared by all the nodes and edges without neighbors or fuzzy types, never modified in place 
+_EMPTY_MAPPING = dict() 
+
+
+def _lazyEdgeMapping(slot_name): 
+	""" property for an edge mapping of ClusterNode or Graph 
+		the edges of a graph loaded from arrays are only created when the mapping is first accessed 
+	"""
+	def getter(self): 
+		if self.edge_loader is not None: 
+			edge_loader = self.edge_loader 
+			self.edge_loader = None 
+			edge_loader.LoadEdges(self) 
+		return getattr(self, slot_name) 
+		
+	def setter(self, mapping): 
+		setattr(self, slot_name, mapping) 
+		
+	return property(getter, setter) 
+
+
+class Vocabulary(object): 
+	""" token to integer id mapping shared by all the nodes of a graph """
+	__slots__ = ('token_to_id', 'id_to_token')
+	
+	def __init__(self): 
+		self.token_to_id = dict() 
+		self.id_to_token = list() 
+		
+	def __len__(self): 
+		return len(self.id_to_token) 
+		
+	def GetTokenID(self, token): 
+		""" return the id of the token, None if not in vocabulary """
+		return self.token_to_id.get(token) 
+		
+	def GetToken(self, token_id): 
+		return self.id_to_token[token_id] 
+		
+	def Encode(self, elements): 
+		""" return the sorted unique token ids of the elements, new tokens are added to the vocabulary """
+		element_ids = list() 
+		for token in elements: 
+			token_id = self.token_to_id.get(token) 
+			if token_id is None: 
+				token_id = len(self.id_to_token) 
+				self.token_to_id[token] = token_id 
+				self.id_to_token.append(token) 
+			element_ids.append(token_id) 
+		return np.unique(np.array(element_ids, dtype=np.int32)) 
+		
+	def Decode(self, element_ids): 
+		""" return the set of tokens of the ids """
+		id_to_token = self.id_to_token 
+		return set(id_to_token[token_id] for token_id in element_ids.tolist()) 
+		
 
 class ClusterNode(object): 
-	def __init__(self, cluster_elements, timepoint, cluster_idx): 
-		self.cluster = set(cluster_elements) 
-		self.size = len(self.cluster) 
+	__slots__ = ('element_ids', 'vocabulary', 'size', 'timepoint', 'timepoint_idx', 'cluster_idx', 'cluster_id', '_incoming_neighbors', '_outgoing_neighbors', 
+				 '_reappear_neighbors', '_node_to_inter_edge_mapping', 'edge_loader', 'x_disappear')
+	
+	incoming_neighbors = _lazyEdgeMapping('_incoming_neighbors')
+	outgoing_neighbors = _lazyEdgeMapping('_outgoing_neighbors')
+	reappear_neighbors = _lazyEdgeMapping('_reappear_neighbors')
+	node_to_inter_edge_mapping = _lazyEdgeMapping('_node_to_inter_edge_mapping')
+	
+	def __init__(self, cluster_elements, timepoint, cluster_idx, vocabulary=None, element_ids=None): 
+		""" * element_ids - sorted unique token ids in vocabulary, used instead of encoding cluster_elements if not None """
+		if vocabulary is None: 
+			vocabulary = Vocabulary() 
+		self.vocabulary = vocabulary 
+		if element_ids is None: 
+			element_ids = vocabulary.Encode(cluster_elements)
+		self.element_ids = element_ids # sorted token ids 
+		self.size = len(self.element_ids) 
 		self.timepoint = timepoint 
+		self.timepoint_idx = None # position of the timepoint in the graph, set by Graph.AddNode 
 		self.cluster_idx = cluster_idx 
-		self.cluster_id = str(timepoint) + '_' + str(cluster_idx).zfill(2)
-		self.incoming_neighbors = dict() # {node_id: edge_obj }
-		self.outgoing_neighbors = dict() # {node_id: edge_obj }
-		self.reappear_neighbors = dict() 
-		self.node_id_to_inter_edge_mapping = dict() 
+		self.cluster_id = None # only formatted when first asked for 
+		# the neighbor mappings are only created when the first neighbor is added 
+		self.incoming_neighbors = _EMPTY_MAPPING # {node_id: edge_obj }
+		self.outgoing_neighbors = _EMPTY_MAPPING # {node_id: edge_obj }
+		self.reappear_neighbors = _EMPTY_MAPPING 
+		self.node_to_inter_edge_mapping = _EMPTY_MAPPING # {node_obj: intersecting edge_obj }, keyed by the node so no id is formatted 
+		self.edge_loader = None # set for the nodes of a graph loaded from arrays 
 		self.x_disappear = None 
 
 	def __str__(self): 
 		return 'cluster {} at timepoint {}, number of elements in cluster: {}'.format(self.cluster_idx, self.timepoint, self.size)
 
 	def GetElements(self): 
-		return self.cluster 
+		""" the set of tokens of the cluster, decoded on every call, for output only, compare clusters by GetElementIDs """
+		return self.vocabulary.Decode(self.element_ids) 
+		
+	def GetElementIDs(self): 
+		return self.element_ids 
 
 	def GetID(self):
+		if self.cluster_id is None: 
+			self.cluster_id = str(self.timepoint) + '_' + str(self.cluster_idx).zfill(2)
 		return self.cluster_id 
 
 	def GetTimepoint(self):
@@ -28,6 +111,9 @@ class ClusterNode(object):
 
 	def GetIndex(self): 
 		return self.cluster_idx 
+		
+	def GetTimepointIndex(self): 
+		return self.timepoint_idx 
 
 	def GetSize(self): 
 		return self.size 
@@ -109,30 +195,64 @@ class ClusterNode(object):
 			return self.reappear_neighbors[neighbor_id] 
 
 	def AddIncomingNeighbor(self, neighbor_id, edge):
+		if self.incoming_neighbors is _EMPTY_MAPPING: 
+			self.incoming_neighbors = dict() 
 		self.incoming_neighbors[neighbor_id] = edge 
 
 	def AddOutgoingNeighbor(self, neighbor_id, edge):
+		if self.outgoing_neighbors is _EMPTY_MAPPING: 
+			self.outgoing_neighbors = dict() 
 		self.outgoing_neighbors[neighbor_id] = edge 
 		
 	def AddReappearNeighbor(self, node, type, element_change=0): 
 		assert type != None
 		neighbor_id = node.GetID() 
 		edge = GraphEdge(self, node, type, element_change) 
+		if self.reappear_neighbors is _EMPTY_MAPPING: 
+			self.reappear_neighbors = dict() 
 		self.reappear_neighbors[neighbor_id] = edge 
 
+	# the intersecting edges are keyed by the neighbor node, the *ByNode methods are for the hot paths and 
+	# the methods taking node ids look the neighbor up among the intersecting neighbors 
+	def _getIntersectingNeighborByID(self, node_id): 
+		for node in self.node_to_inter_edge_mapping: 
+			if node.GetID() == node_id: 
+				return node 
+		assert False, 'no intersecting edge with ' + str(node_id)
+		
+	def AddIntersectingEdgeByNode(self, node, edge): 
+		if self.node_to_inter_edge_mapping is _EMPTY_MAPPING: 
+			self.node_to_inter_edge_mapping = dict() 
+		self.node_to_inter_edge_mapping[node] = edge 
+		
 	def AddIntersectingEdge(self, node_id, edge): 
-		self.node_id_to_inter_edge_mapping[node_id] = edge 
+		node_1, node_2 = edge.GetNodes() 
+		node = node_2 if node_1 is self else node_1 
+		assert node.GetID() == node_id, 'the edge does not connect to ' + str(node_id)
+		self.AddIntersectingEdgeByNode(node, edge)
 		
-	def GetIntersectingElements(self, node_id): 
-		edge = self.node_id_to_inter_edge_mapping[node_id]
+	def GetIntersectingElementsByNode(self, node): 
+		edge = self.node_to_inter_edge_mapping[node]
 		return edge.GetIntersectingElements()
 		
+	def GetIntersectingElements(self, node_id): 
+		return self.GetIntersectingElementsByNode(self._getIntersectingNeighborByID(node_id))
+		
 	def GetIntersectingNeighborsAndElements(self): 
-		for node_id, edge in self.node_id_to_inter_edge_mapping.items(): 
-			yield node_id, edge.GetIntersectingElements()
+		for node, edge in self.node_to_inter_edge_mapping.items(): 
+			yield node.GetID(), edge.GetIntersectingElements()
+			
+	def GetIntersectingNeighborsAndEdges(self): 
+		for node, edge in self.node_to_inter_edge_mapping.items(): 
+			yield node.GetID(), edge 
+			
+	def GetIntersectingNodesAndEdges(self): 
+		""" (neighbor node, intersecting edge) of the intersecting edges """
+		for node, edge in self.node_to_inter_edge_mapping.items(): 
+			yield node, edge 
 			
 	def GetNumOfIntersectingNeighbors(self): 
-		return len(self.node_id_to_inter_edge_mapping)
+		return len(self.node_to_inter_edge_mapping)
 		
 	def SetDisappearStrength(self, x): 
 		self.x_disappear = x 
@@ -143,15 +263,17 @@ class ClusterNode(object):
 
 # directed edge goes from time_a to time_a+1
 class GraphEdge(object): 
+	__slots__ = ('start', 'end', 'type', 'fuzzy_types', 'element_change')
+	
 	def __init__(self, cluster_1, cluster_2, type=None, element_change=0): 
 		self.start = cluster_1 # on the no arrow side 
 		self.end = cluster_2 # on the arrow side 
 		self.type = type 
-		self.fuzzy_types = dict() # {type: x }
+		self.fuzzy_types = _EMPTY_MAPPING # {type: x }, created with the first fuzzy type 
 		self.element_change = element_change 
 
 	def __str__(self): 
-		return '{} --> {}, type {}, element change {}'.format(cluster_1.GetID(), cluster_2.GetID(), self.type, self.element_change)
+		return '{} --> {}, type {}, element change {}'.format(self.start.GetID(), self.end.GetID(), self.type, self.element_change)
 		
 	def SetEdgeType(self, type):
 		self.type = type 
@@ -172,6 +294,8 @@ class GraphEdge(object):
 		return self.element_change 
 	
 	def AddFuzzyType(self, type, x): 
+		if self.fuzzy_types is _EMPTY_MAPPING: 
+			self.fuzzy_types = dict() 
 		self.fuzzy_types[type] = x 
 	
 	def GetFuzzytypes(self):
@@ -179,27 +303,67 @@ class GraphEdge(object):
 
 
 class GraphEdgeIntersection(object): 
-	def __init__(self, node_id_1, node_id_2, intersection): 
-		self.intersection = set(intersection) 
-		self.node_1 = node_id_1 
-		self.node_2 = node_id_2 
+	__slots__ = ('intersection_ids', 'num_intersection', 'vocabulary', 'node_1', 'node_2')
+	
+	def __init__(self, node_1, node_2, intersection_ids, vocabulary=None, num_intersection=None): 
+		""" * node_1, node_2 - ClusterNodes at the earlier and the later timepoint 
+			* intersection_ids - token ids of the intersecting elements 
+			* vocabulary - to decode the ids, only the number of intersecting elements is kept if None 
+			* num_intersection - number of intersecting elements when intersection_ids is None 
+		"""
+		if intersection_ids is not None: 
+			num_intersection = len(intersection_ids) 
+		self.num_intersection = num_intersection 
+		self.vocabulary = vocabulary 
+		self.intersection_ids = None 
+		if vocabulary is not None: 
+			self.intersection_ids = np.asarray(intersection_ids, dtype=np.int32)
+		self.node_1 = node_1 
+		self.node_2 = node_2 
+	
+	def HasIntersectingElements(self): 
+		return self.intersection_ids is not None 
 	
 	def GetIntersectingElements(self): 
-		return self.intersection 
+		assert self.HasIntersectingElements(), 'intersecting elements are not kept in counts only mode'
+		return self.vocabulary.Decode(self.intersection_ids) 
+		
+	def GetIntersectingElementIDs(self): 
+		assert self.HasIntersectingElements(), 'intersecting elements are not kept in counts only mode'
+		return self.intersection_ids 
 		
 	def GetNumOfIntersectingElements(self): 
-		return len(self.intersection) 
+		return self.num_intersection 
 		
-	def GetNodeIDs(self): 
+	def GetNodes(self): 
 		return self.node_1, self.node_2 
+		
+	def GetNodeIDs(self): 
+		return self.node_1.GetID(), self.node_2.GetID() 
 
 
 
 class Graph(object): 
-	def __init__(self): 
-		self.cluster_id_to_node_mapping = dict() 
-		self.timepoint_to_node_mapping = dict()
-		self.node_pair_to_inter_edge_mapping = dict() #{(node_id_1, node_id_2)}
+	node_pair_to_inter_edge_mapping = _lazyEdgeMapping('_node_pair_to_inter_edge_mapping')
+	
+	def __init__(self, vocabulary=None, store_intersections=True): 
+		""" * vocabulary - token ids shared by all the nodes, a new one if None 
+			* store_intersections - keep the intersecting elements of the intersecting edges, or only their number 
+		"""
+		if vocabulary is None: 
+			vocabulary = Vocabulary() 
+		self.vocabulary = vocabulary 
+		self.store_intersections = store_intersections 
+		# nodes are stored by [timepoint_idx][cluster_idx], None where a cluster index is not in graph 
+		self.timepoints = list() 
+		self.timepoint_to_idx = dict() 
+		self.timepoint_str_to_idx = dict() # to parse the timepoint of node ids 
+		self.nodes_by_timepoint = list() 
+		self.num_nodes_by_timepoint = list() 
+		self.num_nodes = 0 
+		self.node_pair_to_inter_edge_mapping = dict() #{(node_obj_1, node_obj_2): intersecting edge_obj }
+		self.edge_loader = None # set for a graph loaded from arrays 
+		self.source_edge_loader = None # kept while the edges of a loaded graph are only in the arrays 
 
 	# def __eq__(self, rhs)
 	# https://stackoverflow.com/questions/390250/elegant-ways-to-support-equivalence-equality-in-python-classes 
@@ -212,44 +376,93 @@ class Graph(object):
 	def __hash__(self):
 		return hash(set(self.GetAllNodesID()))
 
+	def _getNodeByIndices(self, timepoint_idx, cluster_idx): 
+		""" return the node at [timepoint_idx][cluster_idx], None if not in graph """
+		if timepoint_idx is None or cluster_idx < 0: 
+			return None 
+		nodes = self.nodes_by_timepoint[timepoint_idx]
+		if cluster_idx < len(nodes): 
+			return nodes[cluster_idx]
+		return None 
+		
+	def _getNodeByID(self, node_id): 
+		""" parse node id into timepoint and cluster index, return the node, None if not in graph """
+		timepoint, _, cluster_idx = node_id.rpartition('_')
+		if not cluster_idx.isdigit(): 
+			return None 
+		node = self._getNodeByIndices(self.timepoint_str_to_idx.get(timepoint), int(cluster_idx))
+		# e.g. 0819_1 is not the id of 0819_01 
+		if node is None or node.GetID() != node_id: 
+			return None 
+		return node 
+		
+	def _getTimepointIndex(self, timepoint): 
+		timepoint_idx = self.timepoint_to_idx.get(timepoint)
+		if timepoint_idx is None: 
+			timepoint_idx = self.timepoint_str_to_idx.get(str(timepoint))
+		return timepoint_idx 
+
 	def HasNode(self, node_id): 
-		return node_id in self.cluster_id_to_node_mapping
+		return self._getNodeByID(node_id) is not None 
+		
+	def HasTimepoint(self, timepoint): 
+		return self._getTimepointIndex(timepoint) is not None 
 	
 	def GetNumOfNodes(self): 
-		return len(self.cluster_id_to_node_mapping) 
+		return self.num_nodes 
 		
 	def GetNumOfNodesByTimepoint(self, timepoint): 
-		return len(self.timepoint_to_node_mapping[timepoint])
+		timepoint_idx = self._getTimepointIndex(timepoint)
+		assert timepoint_idx is not None, 'timepoint not in graph'
+		return self.num_nodes_by_timepoint[timepoint_idx]
+		
+	def GetTimepoints(self): 
+		""" timepoints in the order they are added to graph """
+		return list(self.timepoints) 
+		
+	def GetTimepointIndex(self, timepoint): 
+		timepoint_idx = self._getTimepointIndex(timepoint)
+		assert timepoint_idx is not None, 'timepoint not in graph'
+		return timepoint_idx 
 	
 	def GetAllNodes(self): 
-		for node_id, node in self.cluster_id_to_node_mapping.items():
-			yield node 
+		for timepoint_idx in range(len(self.timepoints)): 
+			for node in self.GetNodesAtTimepointIndex(timepoint_idx): 
+				yield node 
 
 	def GetAllNodesID(self):
-		return list(self.cluster_id_to_node_mapping.keys()) 
+		return [node.GetID() for node in self.GetAllNodes()]
+
+	def GetNodesAtTimepointIndex(self, timepoint_idx): 
+		for node in self.nodes_by_timepoint[timepoint_idx]: 
+			if node is not None: 
+				yield node 
 
 	def GetNodesAtTimepoint(self, timepoint): 
-		for node in self.timepoint_to_node_mapping[timepoint]: 
-			yield node 
+		""" nodes at timepoint ordered by cluster index """
+		return self.GetNodesAtTimepointIndex(self.GetTimepointIndex(timepoint))
 			
 	def GetSortedNodesAtTimepoint(self, timepoint): 
-		ordered_nodes_id = list() 
-		for nodes in self.GetNodesAtTimepoint(timepoint): 
-			node_id = nodes.GetID()
-			ordered_nodes_id.append(node_id) 
-			
-		ordered_nodes_id = sorted(ordered_nodes_id) 
-		for node_id in ordered_nodes_id: 
-			yield self.GetNodeByID(node_id)
+		# nodes are stored by cluster index, which also orders indices of 100 and above correctly 
+		return self.GetNodesAtTimepoint(timepoint)
 	
 	def GetNodeByID(self, node_id): 
-		assert self.HasNode(node_id), 'node not in graph'
-		return self.cluster_id_to_node_mapping[node_id]
+		node = self._getNodeByID(node_id)
+		assert node is not None, 'node not in graph'
+		return node 
 
 	def GetNodeByTimepointAndIndex(self, timepoint, cluster_idx):
-		node_id = str(timepoint) + '_' + str(cluster_idx).zfill(2) 
-		assert self.HasNode(node_id), 'node not in graph'
-		return self.cluster_id_to_node_mapping[node_id]
+		node = self._getNodeByIndices(self._getTimepointIndex(timepoint), cluster_idx)
+		assert node is not None, 'node not in graph'
+		return node 
+		
+	def GetNodeByIndices(self, timepoint_idx, cluster_idx): 
+		node = self._getNodeByIndices(timepoint_idx, cluster_idx)
+		assert node is not None, 'node not in graph'
+		return node 
+		
+	def HasNodeObject(self, node): 
+		return node.GetTimepointIndex() is not None and self._getNodeByIndices(node.GetTimepointIndex(), node.GetIndex()) is node 
 
 	def HasEdge(self, node_id_1, node_id_2, include_reappear=False): 
 		node_1 = self.GetNodeByID(node_id_1)
@@ -263,45 +476,91 @@ class Graph(object):
 		edge = self.GetEdge(node_id_1, node_id_2, include_reappear)
 		return edge.GetFuzzytypes()
 		
+	# the intersecting edges are keyed by the node objects, node_1 at the earlier timepoint, the *ByNodes methods 
+	# are for the hot paths, the methods taking node ids find the nodes by their (timepoint_idx, cluster_idx) 
+	def AddIntersectingEdgeByNodes(self, node_1, node_2, intersection_ids): 
+		""" * intersection_ids - token ids of the intersecting elements in the graph vocabulary """
+		assert len(intersection_ids) != 0, 'no intersecting elements'
+		assert self.HasNodeObject(node_1) and self.HasNodeObject(node_2) 
+		if self.store_intersections: 
+			edge = GraphEdgeIntersection(node_1, node_2, intersection_ids, self.vocabulary) 
+		else: 
+			edge = GraphEdgeIntersection(node_1, node_2, intersection_ids) 
+		self.node_pair_to_inter_edge_mapping[(node_1, node_2)] = edge 
+		node_1.AddIntersectingEdgeByNode(node_2, edge)
+		node_2.AddIntersectingEdgeByNode(node_1, edge)
+		
 	def AddIntersectingEdge(self, node_id_1, node_id_2, intersection): 
 		assert len(intersection) != 0, 'no intersecting elements'
-		edge = GraphEdgeIntersection(node_id_1, node_id_2, intersection) 
-		self.node_pair_to_inter_edge_mapping[(node_id_1, node_id_2)] = edge 
-		self.GetNodeByID(node_id_1).AddIntersectingEdge(node_id_2, edge)
-		self.GetNodeByID(node_id_2).AddIntersectingEdge(node_id_1, edge)
+		self.AddIntersectingEdgeIDs(node_id_1, node_id_2, self.vocabulary.Encode(intersection))
+		
+	def AddIntersectingEdgeIDs(self, node_id_1, node_id_2, intersection_ids): 
+		self.AddIntersectingEdgeByNodes(self.GetNodeByID(node_id_1), self.GetNodeByID(node_id_2), intersection_ids)
+
+	def _getIntersectingEdgeByNodes(self, node_1, node_2): 
+		""" look up through the node so that a loaded graph does not create all its intersecting edges """
+		edge = node_1.node_to_inter_edge_mapping.get(node_2) 
+		if edge is None or edge.GetNodes()[0] is not node_1: 
+			return None 
+		return edge 
+		
+	def GetIntersectingEdgeByNodes(self, node_1, node_2): 
+		edge = self._getIntersectingEdgeByNodes(node_1, node_2) 
+		assert edge is not None, 'no intersecting edge between ' + node_1.GetID() + ' and ' + node_2.GetID() 
+		return edge 
 
 	def HasIntersectingEdge(self, node_id_1, node_id_2): 
-		return (node_id_1, node_id_2) in self.node_pair_to_inter_edge_mapping 
+		node_1 = self._getNodeByID(node_id_1) 
+		node_2 = self._getNodeByID(node_id_2) 
+		if node_1 is None or node_2 is None: 
+			return False 
+		return self._getIntersectingEdgeByNodes(node_1, node_2) is not None 
 
 	def GetIntersectingEdge(self, node_id_1, node_id_2): 
-		return self.node_pair_to_inter_edge_mapping[(node_id_1, node_id_2)]
+		return self.GetIntersectingEdgeByNodes(self.GetNodeByID(node_id_1), self.GetNodeByID(node_id_2))
 		
 	def GetIntersectingElements(self, node_id_1, node_id_2): 
 		return self.GetIntersectingEdge(node_id_1, node_id_2).GetIntersectingElements()
 	
-	def AddNode(self, cluster_elements, timepoint, cluster_idx):
-		node = ClusterNode(cluster_elements, timepoint, cluster_idx)
-		node_id = node.GetID()
-		self.cluster_id_to_node_mapping[node_id] = node 
+	def AddTimepoint(self, timepoint): 
+		""" add a timepoint without nodes, timepoints are ordered by when they are added """
+		if timepoint in self.timepoint_to_idx: 
+			return self.timepoint_to_idx[timepoint]
+		timepoint_idx = len(self.timepoints)
+		self.timepoints.append(timepoint) 
+		self.timepoint_to_idx[timepoint] = timepoint_idx 
+		self.timepoint_str_to_idx[str(timepoint)] = timepoint_idx 
+		self.nodes_by_timepoint.append(list()) 
+		self.num_nodes_by_timepoint.append(0) 
+		return timepoint_idx 
+	
+	def AddNode(self, cluster_elements, timepoint, cluster_idx, element_ids=None):
+		""" * element_ids - sorted unique token ids in the graph vocabulary, used instead of cluster_elements if not None """
+		node = ClusterNode(cluster_elements, timepoint, cluster_idx, self.vocabulary, element_ids)
+		timepoint_idx = self.AddTimepoint(timepoint)
+		node.timepoint_idx = timepoint_idx 
 		
-		if timepoint not in self.timepoint_to_node_mapping:
-			self.timepoint_to_node_mapping[timepoint] = list() 
+		nodes = self.nodes_by_timepoint[timepoint_idx]
+		if cluster_idx >= len(nodes): 
+			nodes.extend([None] * (cluster_idx + 1 - len(nodes)))
+		if nodes[cluster_idx] is None: 
+			self.num_nodes_by_timepoint[timepoint_idx] += 1 
+			self.num_nodes += 1 
+		nodes[cluster_idx] = node 
 		
-		self.timepoint_to_node_mapping[timepoint].append(node) 
+		return node 
 		
 	def AddDirectedEdge(self, cluster_1, cluster_2, type, element_change=0):
 		cluster_id_1 = cluster_1.GetID()
 		cluster_id_2 = cluster_2.GetID()
-		assert self.HasNode(cluster_id_1) and self.HasNode(cluster_id_2) 
+		assert self.HasNodeObject(cluster_1) and self.HasNodeObject(cluster_2) 
 		assert type != 'reappear'
 		edge = GraphEdge(cluster_1, cluster_2, type, element_change)
 		cluster_1.AddOutgoingNeighbor(cluster_id_2, edge) 
 		cluster_2.AddIncomingNeighbor(cluster_id_1, edge)
 
 	def AddReappearEdge(self, cluster_1, cluster_2, element_change=0): 
-		cluster_id_1 = cluster_1.GetID()
-		cluster_id_2 = cluster_2.GetID() 
-		assert self.HasNode(cluster_id_1) and self.HasNode(cluster_id_2) 
+		assert self.HasNodeObject(cluster_1) and self.HasNodeObject(cluster_2) 
 		cluster_1.AddReappearNeighbor(cluster_2, 'reappear', element_change) 
 		cluster_2.AddReappearNeighbor(cluster_1, 'reappear', element_change * -1)
 		
@@ -321,55 +580,45 @@ class Graph(object):
 
 	def GetTransitionSubgraphByNodeID(self, node_id, include_reappear=False): 
 		# get a subgraph with the starting node 
-		subgraph = Graph() 
-		node_id_to_visit = [node_id] 
-		nodes_visited = list() 
+		subgraph = Graph(self.vocabulary, self.store_intersections) 
+		node_to_visit = deque([self.GetNodeByID(node_id)]) 
+		nodes_visited = set() 
+		nodes_in_subgraph = dict() # {node_obj: None} in the order the nodes are reached 
+		edges_in_subgraph = list() # edges in the order they are reached, from both of their nodes 
 		
-		while len(node_id_to_visit) > 0: 
-			
-			current_node_id = node_id_to_visit.pop(0) 
+		while len(node_to_visit) > 0: 
+			current_node = node_to_visit.popleft() 
 			
-			if current_node_id not in nodes_visited: 
-				current_node = self.GetNodeByID(current_node_id) 
-				current_elements = current_node.GetElements() 
-				current_timepoint = current_node.GetTimepoint()
-				current_index = current_node.GetIndex()
-				
-				if not subgraph.HasNode(current_node_id):
-					subgraph.AddNode(current_elements, current_timepoint, current_index)
-					
+			if current_node not in nodes_visited: 
+				nodes_in_subgraph[current_node] = None 
 				for neighbor_id, edge_obj in current_node.GetNeighborsAndEdges(include_reappear):
-					node_id_to_visit.append(neighbor_id) 
-
-					neighbor_node = self.GetNodeByID(neighbor_id)
-					neighbor_elements = neighbor_node.GetElements() 
-					neighbor_timepoint = neighbor_node.GetTimepoint() 
-					neighbor_iddex = neighbor_node.GetIndex() 
-
-					if not subgraph.HasNode(neighbor_id):
-						subgraph.AddNode(neighbor_elements, neighbor_timepoint, neighbor_iddex)
-
-					edge_type = edge_obj.GetEdgeType() 
-					edge_element_change = edge_obj.GetElementChangePercentage() 
-					
-					node_a = subgraph.GetNodeByID(edge_obj.GetNodeStart().GetID())
-					node_b = subgraph.GetNodeByID(edge_obj.GetNodeEnd().GetID())
+					neighbor_node = edge_obj.GetNodeEnd() if edge_obj.GetNodeStart() is current_node else edge_obj.GetNodeStart() 
+					node_to_visit.append(neighbor_node) 
+					nodes_in_subgraph[neighbor_node] = None 
+					edges_in_subgraph.append(edge_obj) 
 					
-					subgraph.AddEdge(node_a, node_b, edge_type, edge_element_change) 
-
-				nodes_visited.append(current_node_id) 
+				nodes_visited.add(current_node) 
+		
+		# the timepoints keep the order of the graph, whichever node the search started from 
+		for timepoint_idx in sorted(set(node.GetTimepointIndex() for node in nodes_in_subgraph)): 
+			subgraph.AddTimepoint(self.timepoints[timepoint_idx]) 
+		for node in nodes_in_subgraph: 
+			subgraph.AddNode(None, node.GetTimepoint(), node.GetIndex(), element_ids=node.GetElementIDs())
+		for edge_obj in edges_in_subgraph: 
+			node_a = subgraph.GetNodeByTimepointAndIndex(edge_obj.GetNodeStart().GetTimepoint(), edge_obj.GetNodeStart().GetIndex())
+			node_b = subgraph.GetNodeByTimepointAndIndex(edge_obj.GetNodeEnd().GetTimepoint(), edge_obj.GetNodeEnd().GetIndex())
+			subgraph.AddEdge(node_a, node_b, edge_obj.GetEdgeType(), edge_obj.GetElementChangePercentage()) 
 		
 		return subgraph 
 		
 	def PrintTransitionGraph(self, include_reappear=True): 
-		nodes_id_in_graph = self.GetAllNodesID()
-		nodes_id_in_graph = sorted(nodes_id_in_graph)
-		
+		# nodes come ordered by (timepoint_idx, cluster_idx), sorting the ids would put 0819_100 before 0819_11 
 		print('TransitionGraph')
-		for node_id in nodes_id_in_graph:
-			node = self.GetNodeByID(node_id)
+		for node in self.GetAllNodes():
+			node_key = (node.GetTimepointIndex(), node.GetIndex())
 			for neighbor_node_id, edge in node.GetNeighborsAndEdges(include_reappear):
-				if node_id < neighbor_node_id:
-					print(node_id, '--', edge.GetEdgeType(), '-->', neighbor_node_id)
+				neighbor_node = edge.GetNodeEnd() if edge.GetNodeStart() is node else edge.GetNodeStart()
+				if node_key < (neighbor_node.GetTimepointIndex(), neighbor_node.GetIndex()):
+					print(node.GetID(), '--', edge.GetEdgeType(), '-->', neighbor_node_id)
 			
  
@@ -1,11 +1,75 @@
 # fuzzy cluster transitions 
-# MakeTransitionGraphFuzzy, ComputeFuzzySets
+# MakeTransitionGraphFuzzy, ExtendTransitionGraphFuzzy, ComputeFuzzySets, ComputeFuzzySetsBatch
+
+import bisect 
+import numpy as np 
 
 from cluster_transition_graph_config import ClusterNode, GraphEdge, Graph
+from minhash_lsh import MakeMinHashParams, FindCandidatePairsLSH, FindReappearCandidatesLSH
+from instrumentation import Stage, RecordSizes, ProfileStage 
+
+
+def BuildElementPostings(nodes): 
+	""" make the element to node postings for a list of nodes at one timepoint 
+		* element_to_positions - {element id: [position of node in nodes, ...]}
+	"""
+	element_to_positions = dict() 
+	
+	for pos, node in enumerate(nodes): 
+		for element in node.GetElementIDs().tolist(): 
+			if element not in element_to_positions: 
+				element_to_positions[element] = list() 
+			element_to_positions[element].append(pos) 
+			
+	return element_to_positions 
+
+
+def AddFuzzyEdgesForPair(transition_graph, current_timepoint, next_timepoint, minhash_params=None, lsh_bands=64): 
+	""" add the intersecting edges and fuzzy edges between the nodes of two adjacent timepoints 
+		* minhash_params - only intersect the candidate pairs found by MinHash/LSH if not None 
+	"""
+	approximate = minhash_params is not None 
+	current_nodes = list(transition_graph.GetNodesAtTimepoint(current_timepoint))
+	next_nodes = list(transition_graph.GetNodesAtTimepoint(next_timepoint))
+	if approximate: 
+		position_to_candidates = FindCandidatePairsLSH(current_nodes, next_nodes, minhash_params, lsh_bands)
+	else: 
+		element_to_positions = BuildElementPostings(next_nodes)
+	
+	for current_pos, node_a in enumerate(current_nodes): 
+		current_elements = node_a.GetElementIDs()
+		
+		# only the nodes sharing at least one element are candidates, collect their intersections 
+		position_to_intersection = dict() 
+		if approximate: 
+			for pos in position_to_candidates.get(current_pos, ()): 
+				intersection = np.intersect1d(current_elements, next_nodes[pos].GetElementIDs(), assume_unique=True)
+				if len(intersection) > 0: 
+					position_to_intersection[pos] = intersection 
+		else: 
+			for element in current_elements.tolist(): 
+				for pos in element_to_positions.get(element, ()): 
+					if pos not in position_to_intersection: 
+						position_to_intersection[pos] = list() 
+					position_to_intersection[pos].append(element) 
+		
+		# keep the order of the nodes at next timepoint for the edges 
+		for pos in sorted(position_to_intersection): 
+			node_b = next_nodes[pos]
+			intersection = position_to_intersection[pos]
+			transition_graph.AddIntersectingEdgeByNodes(node_a, node_b, intersection)
+			transition_graph.AddDirectedEdge(node_a, node_b, type='fuzzy')
 
 
-def MakeTransitionGraphRaw(list_of_timepoint, clustering_by_timepoint): 
-	transition_graph = Graph() 
+@ProfileStage('fuzzy_transition_graph')
+def MakeTransitionGraphRaw(list_of_timepoint, clustering_by_timepoint, approximate=False, num_perm=128, lsh_bands=64, store_intersections=True): 
+	""" make the graph of all intersecting clusters between adjacent timepoints 
+		* approximate - only intersect the candidate pairs found by MinHash/LSH instead of the exact postings, 
+			pairs with low jaccard similarity may be missed 
+		* store_intersections - keep the intersecting elements on the intersecting edges, or only their number 
+	"""
+	transition_graph = Graph(store_intersections=store_intersections) 
+	minhash_params = MakeMinHashParams(num_perm) if approximate else None 
 
 	for i in range(len(list_of_timepoint)): 
 		clustering = clustering_by_timepoint[i]
@@ -16,266 +80,262 @@ def MakeTransitionGraphRaw(list_of_timepoint, clustering_by_timepoint):
 			transition_graph.AddNode(cluster_elements, timepoint, cl_idx)
 	
 	for i in range(len(list_of_timepoint) - 1): 
-		current_timepoint = list_of_timepoint[i]
-		next_timepoint = list_of_timepoint[i + 1]
-		for node_a in transition_graph.GetNodesAtTimepoint(current_timepoint): 
-			current_elements = node_a.GetElements()
-			current_node_id = node_a.GetID() 
-			
-			for node_b in transition_graph.GetNodesAtTimepoint(next_timepoint): 
-				next_elements = node_b.GetElements() 
-				next_node_id = node_b.GetID() 
-				intersection = current_elements.intersection(next_elements)
-
-				if len(intersection) > 0:
-					transition_graph.AddIntersectingEdge(current_node_id, next_node_id, intersection)
-					transition_graph.AddDirectedEdge(node_a, node_b, type='fuzzy')
+		AddFuzzyEdgesForPair(transition_graph, list_of_timepoint[i], list_of_timepoint[i + 1], minhash_params, lsh_bands)
 			
+	RecordSizes(nodes=transition_graph.GetNumOfNodes(), intersecting_edges=len(transition_graph.node_pair_to_inter_edge_mapping))
 	return transition_graph 
 
 
-def XDisappear(node, transition_graph, timepoint, list_of_timepoint):
-	""" compute the disappear core x between current timepoint and next timepoint 
-		* return x value, if not None 
-	"""
-	# determine next timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx < len(list_of_timepoint) - 1:
-		next_timepoint = list_of_timepoint[current_timepoint_idx + 1]
-	else: return 0
+def IsDisjointClustering(nodes): 
+	""" check if no element is shared by two nodes of the same timepoint """
+	if len(nodes) == 0: 
+		return True 
+	num_elements = sum(node.GetSize() for node in nodes)
+	all_elements = np.concatenate([node.GetElementIDs() for node in nodes])
 	
-	# find number of element passed to next timepoint 
-	element_passed_to_next = set()
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements(): 
-		if neighbor_id.startswith(next_timepoint): 
-			element_passed_to_next.update(intersection)
-			
-	num_element_passed = len(element_passed_to_next)
-	num_elements_in_cluster = len(node.GetElements())
-	x = 1 - num_element_passed / num_elements_in_cluster
-	return x 
+	return num_elements == len(np.unique(all_elements)) 
 
-def XUnchange(node, transition_graph, timepoint, list_of_timepoint): 
-	""" compute the unchanged core x between current timepoint and next timepoint 
-		* return x value, if not None 
+
+def _countElementsPassed(node, neighbor_nodes, intersection_sizes, disjoint): 
+	""" number of elements of a node passed to the intersecting nodes on the other timepoint 
+		the sum of intersection sizes is exact only if the nodes on the other timepoint are disjoint 
 	"""
-	# determine next timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx < len(list_of_timepoint) - 1:
-		next_timepoint = list_of_timepoint[current_timepoint_idx + 1]
-	else: return
+	if disjoint or len(neighbor_nodes) == 0: 
+		return sum(intersection_sizes) 
 	
-	# check the number of intersecting neighbors 
-	num_intersecting_neighbors = node.GetNumOfIntersectingNeighbors()
-	if num_intersecting_neighbors <= 0: 
-		return 
+	neighbor_elements = np.concatenate([neighbor.GetElementIDs() for neighbor in neighbor_nodes])
+	return len(np.intersect1d(node.GetElementIDs(), neighbor_elements))
 	
-	# find the mapping between each unchanged cluster and the x	 
-	node_id_to_x_mapping = dict()
-	cluster_elements = node.GetElements()
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements():
-		if neighbor_id.startswith(next_timepoint): 
-			neighbor_elements = transition_graph.GetNodeByID(neighbor_id).GetElements()
-			union_clusters = set(cluster_elements).union(set(neighbor_elements))
-			x = len(intersection) / len(union_clusters)
-			node_id_to_x_mapping[neighbor_id] = x
-			
-	return node_id_to_x_mapping
-
-def XAbsorb(node, transition_graph, timepoint, list_of_timepoint): 
-	""" compute the absorb core x between current timepoint and next timepoint 
-		* return x value, if not None 
-	"""
-	# determine next timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx < len(list_of_timepoint) - 1:
-		next_timepoint = list_of_timepoint[current_timepoint_idx + 1]
-	else: return
+def _countUnionAll(node, neighbor_nodes, num_elements_passed, disjoint): 
+	""" number of elements in the union of a node and all its intersecting nodes on the other timepoint """
+	if disjoint: 
+		return node.GetSize() + sum(neighbor.GetSize() for neighbor in neighbor_nodes) - num_elements_passed 
+	
+	all_elements = np.concatenate([node.GetElementIDs()] + [neighbor.GetElementIDs() for neighbor in neighbor_nodes])
+	return len(np.unique(all_elements)) 
 	
-	# check the number of intersecting neighbors 
-	num_intersecting_neighbors = node.GetNumOfIntersectingNeighbors()
-	if num_intersecting_neighbors <= 0: 
-		return 
-
-	# find the mapping between each absorbed cluster and the x	
-	node_id_to_x_mapping = dict()
-	cluster_elements = node.GetElements()
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements():
-		if neighbor_id.startswith(next_timepoint): 
-			neighbor_elements = transition_graph.GetNodeByID(neighbor_id).GetElements()
-			union_clusters = set(cluster_elements).union(set(neighbor_elements))
-			x = len(intersection) / len(cluster_elements) - len(intersection) / len(union_clusters)
-			if x <= 0: 
-				continue 
-			node_id_to_x_mapping[neighbor_id] = x 
-
-	return node_id_to_x_mapping	 
 
-def XDissolve(node, transition_graph, timepoint, list_of_timepoint): 
-	""" compute the dissolve core x between current timepoint and next timepoint  
-		* return x value, if not None 
+def SetFuzzyTransitionCoresForPair(transition_graph, current_timepoint, next_timepoint, current_disjoint=None, next_disjoint=None): 
+	""" compute all the fuzzy cores between current timepoint and next timepoint in one traversal 
+		the cores are derived from intersection sizes and cluster sizes, |A U B| = |A| + |B| - |A n B|
+		* sets disappear x on the nodes of current timepoint 
+		* adds unchanged, absorbed, dissolved, split, merged x to the edges, in this order 
 	"""
-	# determine next timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx < len(list_of_timepoint) - 1:
-		next_timepoint = list_of_timepoint[current_timepoint_idx + 1]
-	else: return
+	current_nodes = list(transition_graph.GetNodesAtTimepoint(current_timepoint))
+	next_nodes = list(transition_graph.GetNodesAtTimepoint(next_timepoint))
+	if current_disjoint is None: 
+		current_disjoint = IsDisjointClustering(current_nodes)
+	if next_disjoint is None: 
+		next_disjoint = IsDisjointClustering(next_nodes)
 	
-	# check the number of intersecting neighbors 
-	num_intersecting_neighbors = node.GetNumOfIntersectingNeighbors()
-	if num_intersecting_neighbors <= 0: 
-		return 
+	# merge core of the nodes at next timepoint 
+	node_id_to_x_merge = dict() 
+	for node_b in next_nodes: 
+		previous_nodes = list() 
+		intersection_sizes = list() 
+		for neighbor_id, edge in node_b.GetIncomingNeighborsAndEdges(): 
+			inter_edge = transition_graph.GetIntersectingEdgeByNodes(edge.GetNodeStart(), node_b)
+			previous_nodes.append(edge.GetNodeStart())
+			intersection_sizes.append(inter_edge.GetNumOfIntersectingElements())
+			
+		if len(previous_nodes) <= 1: 
+			continue 
+		
+		num_elements_passed = _countElementsPassed(node_b, previous_nodes, intersection_sizes, current_disjoint)
+		union_all = _countUnionAll(node_b, previous_nodes, num_elements_passed, current_disjoint)
+		node_id_to_x_merge[node_b.GetID()] = num_elements_passed / union_all 
 	
-	# find the mapping between each dissolved cluster and the x 
-	node_id_to_x_mapping = dict()
-	cluster_elements = node.GetElements()
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements():
-		if neighbor_id.startswith(next_timepoint): 
-			neighbor_elements = transition_graph.GetNodeByID(neighbor_id).GetElements()
-			union_clusters = set(cluster_elements).union(set(neighbor_elements)) 
-			x = len(intersection) / len(neighbor_elements) - len(intersection) / len(union_clusters)
-			if x <= 0: 
-				continue 
-			node_id_to_x_mapping[neighbor_id] = x 
+	for node_a in current_nodes: 
+		current_size = node_a.GetSize() 
+		
+		neighbors = list() # [(edge, neighbor_node), ...]
+		intersection_sizes = list() 
+		for neighbor_id, edge in node_a.GetOutgoingNeighborsAndEdges(): 
+			inter_edge = transition_graph.GetIntersectingEdgeByNodes(node_a, edge.GetNodeEnd())
+			neighbors.append((edge, edge.GetNodeEnd()))
+			intersection_sizes.append(inter_edge.GetNumOfIntersectingElements())
+		
+		num_elements_passed = _countElementsPassed(node_a, [node_b for _, node_b in neighbors], intersection_sizes, next_disjoint)
+		node_a.SetDisappearStrength(1 - num_elements_passed / current_size)
+		
+		x_split = None 
+		if len(neighbors) > 1: 
+			union_all = _countUnionAll(node_a, [node_b for _, node_b in neighbors], num_elements_passed, next_disjoint)
+			x_split = num_elements_passed / union_all 
+			
+		for (edge, node_b), num_intersection in zip(neighbors, intersection_sizes): 
+			next_size = node_b.GetSize() 
+			union_size = current_size + next_size - num_intersection 
 			
-	return node_id_to_x_mapping	 
+			edge.AddFuzzyType('unchanged', num_intersection / union_size)
+			
+			x = num_intersection / current_size - num_intersection / union_size 
+			if x > 0: 
+				edge.AddFuzzyType('absorbed', x)
+				
+			x = num_intersection / next_size - num_intersection / union_size 
+			if x > 0: 
+				edge.AddFuzzyType('dissolved', x)
+				
+			if x_split: 
+				edge.AddFuzzyType('split', x_split)
+				
+			x_merge = node_id_to_x_merge.get(node_b.GetID())
+			if x_merge: 
+				edge.AddFuzzyType('merged', x_merge)
+				
+	return next_disjoint 
+	
 
-def XSplit(node, transition_graph, timepoint, list_of_timepoint): 
-	""" compute the split core x between current timepoint and next timepoint  
-		* return x value, if not None 
-	"""
-	# determine next timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx < len(list_of_timepoint) - 1:
-		next_timepoint = list_of_timepoint[current_timepoint_idx + 1]
-	else: return
+def SetFuzzyTransitionCores(transition_graph, list_of_timepoint): 
+	""" set the fuzzy cores of all nodes and edges of the graph, one traversal per pair of adjacent timepoints """
+	disjoint = None 
+	for i in range(len(list_of_timepoint) - 1): 
+		with Stage('fuzzy_cores', day=list_of_timepoint[i]): 
+			disjoint = SetFuzzyTransitionCoresForPair(transition_graph, list_of_timepoint[i], list_of_timepoint[i + 1], current_disjoint=disjoint)
 	
-	# check the number of intersecting neighbors 
-	num_intersecting_neighbors = node.GetNumOfIntersectingNeighbors()
-	if num_intersecting_neighbors <= 1: 
-		return 
+	# nothing is passed on from the last timepoint 
+	if len(list_of_timepoint) > 0: 
+		for node in transition_graph.GetNodesAtTimepoint(list_of_timepoint[-1]): 
+			node.SetDisappearStrength(0)
 	
-	# find the mapping between each split cluster and the x 
-	cluster_elements = node.GetElements()
-	intersection_union = set() 
-	union_all = set(cluster_elements)
-	num_intersecting_neighbors = 0
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements():
-		if neighbor_id.startswith(next_timepoint): 
-			num_intersecting_neighbors += 1
-			neighbor_elements = transition_graph.GetNodeByID(neighbor_id).GetElements()
-			intersection_union.update(intersection)
-			union_all.update(set(neighbor_elements))
-			
-	if num_intersecting_neighbors <= 1:
-		return 
+				
+def MakeTransitionGraphFuzzy(list_of_timepoint, clustering_by_timepoint, approximate=False, num_perm=128, lsh_bands=64, store_intersections=True): 
+	""" main function to create and setup fuzzy transition graph """
+	transition_graph = MakeTransitionGraphRaw(list_of_timepoint, clustering_by_timepoint, approximate, num_perm, lsh_bands, store_intersections)
+	SetFuzzyTransitionCores(transition_graph, list_of_timepoint)
 	
-	x = len(intersection_union) / len(union_all)
+	return transition_graph 
 
-	return x 
 
-def XMerge(node, transition_graph, timepoint, list_of_timepoint): 
-	""" compute the merge core x between current timepoint and next timepoint 
-		* return x value, if not None 
+def ExtendTransitionGraphFuzzy(transition_graph, timepoint, clustering, approximate=False, num_perm=128, lsh_bands=64): 
+	""" add the clusters of a new timepoint after the last timepoint of the graph, with the intersecting edges and fuzzy cores 
+		from the last timepoint, the graph is the same as MakeTransitionGraphFuzzy on all the timepoints 
 	"""
-	# determine previous timepoint, if any 
-	current_timepoint_idx = list_of_timepoint.index(timepoint)
-	if current_timepoint_idx > 0:
-		previous_timepoint = list_of_timepoint[current_timepoint_idx - 1]
-	else: return
-	
-	# check the number of intersecting neighbors 
-	num_intersecting_neighbors = node.GetNumOfIntersectingNeighbors()
-	if num_intersecting_neighbors <= 1: 
-		return 
-	
-	# find the mapping between each merged cluster and the x 
-	cluster_elements = node.GetElements()
-	intersection_union = set() 
-	union_all = set(cluster_elements) 
-	num_intersecting_neighbors = 0
-	for neighbor_id, intersection in node.GetIntersectingNeighborsAndElements():
-		if neighbor_id.startswith(previous_timepoint): 
-			num_intersecting_neighbors += 1
-			neighbor_elements = transition_graph.GetNodeByID(neighbor_id).GetElements()
-			intersection_union.update(intersection)
-			union_all.update(set(neighbor_elements))
-	
-	if num_intersecting_neighbors <= 1:
-		return 
+	previous_timepoints = transition_graph.GetTimepoints()
+	assert timepoint not in previous_timepoints, 'timepoint already in graph'
+	transition_graph.AddTimepoint(timepoint)
+	for cl_idx in range(len(clustering)): 
+		transition_graph.AddNode(clustering[cl_idx], timepoint, cl_idx)
+		
+	if len(previous_timepoints) > 0: 
+		minhash_params = MakeMinHashParams(num_perm) if approximate else None 
+		AddFuzzyEdgesForPair(transition_graph, previous_timepoints[-1], timepoint, minhash_params, lsh_bands)
+		SetFuzzyTransitionCoresForPair(transition_graph, previous_timepoints[-1], timepoint)
 	
-	x = len(intersection_union) / len(union_all)
-	return x 
+	# nothing is passed on from the last timepoint 
+	for node in transition_graph.GetNodesAtTimepoint(timepoint): 
+		node.SetDisappearStrength(0)
 	
+	return transition_graph 
+
+
+def BuildTimepointPostings(transition_graph, list_of_timepoint): 
+	""" make the element to node postings across all timepoints, each posting list is ordered by timepoint 
+		* element_to_postings - {element id: ([timepoint_idx, ...], [node, ...])}
+	"""
+	element_to_postings = dict() 
 	
-def SetFuzzyNodeDisappear(transition_graph, list_of_timepoint): 
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint: 
+	for timepoint_idx, timepoint in enumerate(list_of_timepoint): 
 		for node in transition_graph.GetNodesAtTimepoint(timepoint): 
-			x = XDisappear(node, transition_graph, timepoint, list_of_timepoint)
-			node.SetDisappearStrength(x)
-
-def SetFuzzyEdgeUnchanged(transition_graph, list_of_timepoint): 
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint[:-1]:
-		for node in transition_graph.GetNodesAtTimepoint(timepoint):
-			current_node_id = node.GetID()
-			node_id_to_x_mapping = XUnchange(node, transition_graph, timepoint, list_of_timepoint)
-			if node_id_to_x_mapping: 
-				for neighbor_id, x in node_id_to_x_mapping.items(): 
-					transition_graph.GetEdge(current_node_id, neighbor_id).AddFuzzyType('unchanged', x)
-				
-def SetFuzzyEdgeAbsorbed(transition_graph, list_of_timepoint): 
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint[:-1]:
-		for node in transition_graph.GetNodesAtTimepoint(timepoint):
-			current_node_id = node.GetID()
-			node_id_to_x_mapping = XAbsorb(node, transition_graph, timepoint, list_of_timepoint)
-			if node_id_to_x_mapping: 
-				for neighbor_id, x in node_id_to_x_mapping.items(): 
-					transition_graph.GetEdge(current_node_id, neighbor_id).AddFuzzyType('absorbed', x)
+			for element in node.GetElementIDs().tolist(): 
+				if element not in element_to_postings: 
+					element_to_postings[element] = (list(), list())
+				timepoint_idxs, nodes = element_to_postings[element]
+				timepoint_idxs.append(timepoint_idx)
+				nodes.append(node)
 				
-def SetFuzzyEdgeDissolve(transition_graph, list_of_timepoint): 
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint[:-1]:
-		for node in transition_graph.GetNodesAtTimepoint(timepoint):
-			current_node_id = node.GetID()
-			node_id_to_x_mapping = XDissolve(node, transition_graph, timepoint, list_of_timepoint)
-			if node_id_to_x_mapping: 
-				for neighbor_id, x in node_id_to_x_mapping.items(): 
-					transition_graph.GetEdge(current_node_id, neighbor_id).AddFuzzyType('dissolved', x)
-				
-def SetFuzzyEdgeSplit(transition_graph, list_of_timepoint):
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint[:-1]:
-		for node in transition_graph.GetNodesAtTimepoint(timepoint):
-			x = XSplit(node, transition_graph, timepoint, list_of_timepoint)
-			if x:
-				for neighbor_id, edge in node.GetOutgoingNeighborsAndEdges(): 
-					edge.AddFuzzyType('split', x)
+	return element_to_postings 
+
 
-def SetFuzzyEdgeMerge(transition_graph, list_of_timepoint): 
-	""" add the fuzzy edges and set type to transition graph """
-	for timepoint in list_of_timepoint[1:]:
-		for node in transition_graph.GetNodesAtTimepoint(timepoint):
-			x = XMerge(node, transition_graph, timepoint, list_of_timepoint)
-			if x:
-				for neighbor_id, edge in node.GetIncomingNeighborsAndEdges(): 
-					edge.AddFuzzyType('merged', x)
+@ProfileStage('fuzzy_reappear')
+def SetFuzzyReappear(transition_graph, list_of_timepoint, max_gap=7, approximate=False, num_perm=128, lsh_bands=64): 
+	""" add fuzzy reappear edges between nodes of non-adjacent timepoints 
+		reappear core x = disappear x of node a * |A n B| / |A U B|, for node b 2 to max_gap timepoints after node a 
+		only the node pairs sharing elements in the postings index are compared 
+		* max_gap - largest number of timepoints between the two nodes, None for no limit 
+		* approximate - only compare the candidate pairs found by MinHash/LSH 
+		** need to run after the disappear x is set 
+	"""
+	if approximate: 
+		node_id_to_candidates = FindReappearCandidatesLSH(transition_graph, list_of_timepoint, MakeMinHashParams(num_perm), lsh_bands, max_gap)
+	else: 
+		element_to_postings = BuildTimepointPostings(transition_graph, list_of_timepoint)
+	
+	for i in range(len(list_of_timepoint) - 2): 
+		first_idx = i + 2 
+		last_idx = len(list_of_timepoint) - 1 
+		if max_gap is not None: 
+			last_idx = min(last_idx, i + max_gap)
+		
+		for node_a in transition_graph.GetNodesAtTimepoint(list_of_timepoint[i]): 
+			x_disappear = node_a.GetDisappearStrength() 
+			if not x_disappear: 
+				continue 
+			
+			# count the intersection with every node in the gap window sharing an element 
+			node_key_to_num_intersection = dict() # {(timepoint_idx, cluster_idx): num}
+			node_key_to_node = dict() 
+			if approximate: 
+				for timepoint_idx, node_b in node_id_to_candidates.get(node_a.GetID(), ()): 
+					num_intersection = len(np.intersect1d(node_a.GetElementIDs(), node_b.GetElementIDs(), assume_unique=True))
+					if num_intersection > 0: 
+						node_key = (timepoint_idx, node_b.GetIndex())
+						node_key_to_num_intersection[node_key] = num_intersection 
+						node_key_to_node[node_key] = node_b 
+			else: 
+				for element in node_a.GetElementIDs().tolist(): 
+					timepoint_idxs, nodes = element_to_postings[element]
+					start = bisect.bisect_left(timepoint_idxs, first_idx)
+					end = bisect.bisect_right(timepoint_idxs, last_idx)
+					for j in range(start, end): 
+						node_key = (timepoint_idxs[j], nodes[j].GetIndex())
+						node_key_to_num_intersection[node_key] = node_key_to_num_intersection.get(node_key, 0) + 1 
+						node_key_to_node[node_key] = nodes[j]
+					
+			for node_key in sorted(node_key_to_num_intersection): 
+				node_b = node_key_to_node[node_key]
+				num_intersection = node_key_to_num_intersection[node_key]
+				union_size = node_a.GetSize() + node_b.GetSize() - num_intersection 
+				x = x_disappear * num_intersection / union_size 
 				
+				transition_graph.AddReappearEdge(node_a, node_b)
+				transition_graph.GetEdge(node_a.GetID(), node_b.GetID(), include_reappear=True).AddFuzzyType('reappear', x)
+				transition_graph.GetEdge(node_b.GetID(), node_a.GetID(), include_reappear=True).AddFuzzyType('reappear', x)
+
+
+def SetFuzzyReappearToLastTimepoint(transition_graph, max_gap=7): 
+	""" add the fuzzy reappear edges ending at the last timepoint of the graph, after ExtendTransitionGraphFuzzy 
+		the disappear x of the earlier nodes does not change, so together with the edges already in the graph 
+		this gives the same edges as SetFuzzyReappear on all the timepoints, with exact intersections 
+	"""
+	timepoints = transition_graph.GetTimepoints()
+	last_idx = len(timepoints) - 1 
+	first_idx = 0 if max_gap is None else max(0, last_idx - max_gap)
+	last_nodes = list(transition_graph.GetNodesAtTimepointIndex(last_idx))
+	element_to_positions = BuildElementPostings(last_nodes)
+	
+	for i in range(first_idx, last_idx - 1): 
+		for node_a in transition_graph.GetNodesAtTimepointIndex(i): 
+			x_disappear = node_a.GetDisappearStrength() 
+			if not x_disappear: 
+				continue 
+			
+			position_to_num_intersection = dict() 
+			for element in node_a.GetElementIDs().tolist(): 
+				for pos in element_to_positions.get(element, ()): 
+					position_to_num_intersection[pos] = position_to_num_intersection.get(pos, 0) + 1 
+			
+			for pos in sorted(position_to_num_intersection): 
+				node_b = last_nodes[pos]
+				num_intersection = position_to_num_intersection[pos]
+				union_size = node_a.GetSize() + node_b.GetSize() - num_intersection 
+				x = x_disappear * num_intersection / union_size 
 				
-def MakeTransitionGraphFuzzy(list_of_timepoint, clustering_by_timepoint): 
-	""" main function to create and setup fuzzy transition graph """
-	transition_graph = MakeTransitionGraphRaw(list_of_timepoint, clustering_by_timepoint)
-	SetFuzzyNodeDisappear(transition_graph, list_of_timepoint)
-	SetFuzzyEdgeUnchanged(transition_graph, list_of_timepoint)
-	SetFuzzyEdgeAbsorbed(transition_graph, list_of_timepoint)
-	SetFuzzyEdgeDissolve(transition_graph, list_of_timepoint)
-	SetFuzzyEdgeSplit(transition_graph, list_of_timepoint)
-	SetFuzzyEdgeMerge(transition_graph, list_of_timepoint)
+				transition_graph.AddReappearEdge(node_a, node_b)
+				transition_graph.GetEdge(node_a.GetID(), node_b.GetID(), include_reappear=True).AddFuzzyType('reappear', x)
+				transition_graph.GetEdge(node_b.GetID(), node_a.GetID(), include_reappear=True).AddFuzzyType('reappear', x)
 	
-	return transition_graph 
-
 
 def ComputeWeakMiu(x, a, b, c, d): 
 	""" compute strong fuzzy sets given core x and limiter a, b, c, d"""
@@ -321,4 +381,52 @@ def ComputeFuzzySets(x, a, b, c, d):
 	if strong_x: 
 		fuzzy_sets.append(('strong', strong_x))
 		
-	return fuzzy_sets
\ No newline at end of file
+	return fuzzy_sets
+
+
+def ComputeFuzzySetsBatch(x_values, fuzzy_limiter): 
+	""" vectorized version of the Compute*Miu functions for an array of cores 
+		* fuzzy_limiter - [a, b, c, d], or an array of shape (num_settings, 4) to evaluate several limiter settings at once 
+		* return weak_miu, medium_miu, strong_miu - arrays of len(x_values), or of shape (num_settings, len(x_values)) 
+			-- membership is 0 where x is not in the fuzzy set 
+	"""
+	x = np.asarray(x_values, dtype=float)
+	limiter = np.asarray(fuzzy_limiter, dtype=float)
+	assert limiter.shape[-1] == 4 and limiter.ndim in [1, 2], 'fuzzy_limiter needs to have 4 values per setting!'
+	
+	if limiter.ndim == 2: 
+		x = x[np.newaxis, :]
+		a, b, c, d = [limiter[:, i, np.newaxis] for i in range(4)]
+	else: 
+		a, b, c, d = limiter
+	
+	# the slopes are only taken where the limiters are strictly increasing 
+	with np.errstate(divide='ignore', invalid='ignore'): 
+		rising_ab = (x - a) / (b - a)
+		falling_ab = (b - x) / (b - a)
+		rising_cd = (x - c) / (d - c)
+		falling_cd = (d - x) / (d - c)
+	
+	in_ab = (a < x) & (x < b)
+	in_cd = (c < x) & (x < d)
+	
+	weak_miu = np.where((0 <= x) & (x <= a), 1.0, np.where(in_ab, falling_ab, 0.0))
+	medium_miu = np.where(in_ab, rising_ab, np.where((b <= x) & (x <= c), 1.0, np.where(in_cd, falling_cd, 0.0)))
+	strong_miu = np.where(in_cd, rising_cd, np.where(x >= d, 1.0, 0.0))
+	
+	return weak_miu, medium_miu, strong_miu 
+	
+
+def IterFuzzySetsBatch(x_values, fuzzy_limiter): 
+	""" same output as calling ComputeFuzzySets on each x, computed with ComputeFuzzySetsBatch 
+		* yield [(strength, miu), ...] for each x in x_values 
+	"""
+	weak_miu, medium_miu, strong_miu = ComputeFuzzySetsBatch(x_values, fuzzy_limiter)
+	
+	for memberships in zip(weak_miu.tolist(), medium_miu.tolist(), strong_miu.tolist()): 
+		fuzzy_sets = list() 
+		for strength, miu in zip(['weak', 'medium', 'strong'], memberships): 
+			if miu: 
+				# full membership is 1 as in ComputeFuzzySets 
+				fuzzy_sets.append((strength, 1 if miu == 1 else miu))
+		yield fuzzy_sets 
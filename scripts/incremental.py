@@ -0,0 +1,250 @@
+# bash: python incremental.py --dates 0903 0904 --include_removed_nodes --fuzzy_reappear
+# append new days to the results one day at a time: only the new day is ingested, weighted and clustered,
+# the saved crisp and fuzzy transition graphs are extended with the transitions to the new day
+# AppendDay, LoadCorpusStats, GetStaleDays
+#
+# the NPMI weights of RunClusteringMain are normalized by the number of tweets of all the days, here a new day is weighted
+# with the running total at the time it is appended. the earlier days keep the weights of their own total, they are
+# listed in result_dir/stale_artifacts.json until they are reclustered, e.g. with main_run_clustering.py or pipeline.py
+#
+# the transition graphs, tuples and stale_artifacts.json of a day are written to result_dir/append_staged/ first, the day
+# counts as appended once corpus_stats.json is written, and only then are the staged outputs moved into place. a run that
+# dies before corpus_stats.json is written leaves the outputs of the earlier days, the next run drops the staged ones. a
+# run that dies after it is finished by the next run, which moves the rest of the staged outputs into place
+
+import os
+import sys
+import json
+import shutil
+import argparse
+
+from main_run_clustering import MakeTokenGraphsForDay, ComputeEdgeWeights, MakeClusteringResults
+from main_trace_transition import ExtendCrispTransitionGraph, GetCrispTransitionTuplesFromGraph, ExtendFuzzyTransitionGraph, GetFuzzyTransitionTuplesFromGraph
+from cluster_transition_graph_config import Graph
+from transition_graph_io import SaveTransitionGraph, LoadTransitionGraph, ReplaceDirectory
+from instrumentation import Stage, EnableProfiling, WriteReport
+from time_buckets import GetBucketLabels
+
+CORPUS_STATS_FILENAME = 'corpus_stats.json'
+STALE_ARTIFACTS_FILENAME = 'stale_artifacts.json'
+STAGED_DIRNAME = 'append_staged'
+# written last to the staged directory, the timepoints of the staged outputs
+STAGED_TIMEPOINTS_FILENAME = 'timepoints.json'
+# outputs replaced by every appended day, moved into place in this order
+STAGED_OUTPUTS = ['crisp_transition_graph', 'fuzzy_transition_graph', 'crisp_graph_tuples.json', 'fuzzy_graph_tuples.json', STALE_ARTIFACTS_FILENAME]
+
+
+def _writeJSONAtomic(file_path, obj):
+	tmp_path = file_path + '.tmp'
+	with open(tmp_path, 'w', encoding='utf-8') as textfile:
+		json.dump(obj, textfile, indent=2)
+	os.replace(tmp_path, file_path)
+
+
+def GetResultsFilename(date, include_removed_nodes=False):
+	""" file name of the clustering results of RunClusteringMain """
+	if include_removed_nodes:
+		return date + '_results_meta_removed_included.json'
+	return date + '_results_meta.json'
+
+
+def LoadCorpusStats(result_dir):
+	""" * corpus_stats - running statistics of the appended days, None if no day was appended yet
+			-- {'timepoints': [date, ...] in the order they were appended,
+				'daily_tweet_counts': {date: number of tweets with a keyword},
+				'total_num_tweets': sum of daily_tweet_counts,
+				'weights_num_tweets': {date: total_num_tweets the NPMI weights of date were normalized with},
+				'keywords': [...], 'include_removed_nodes': bool, 'bucket_hours': int}
+			with bucket_hours < 24 the dates are the bucket labels
+	"""
+	stats_path = os.path.join(result_dir, CORPUS_STATS_FILENAME)
+	if not os.path.isfile(stats_path):
+		return None
+	with open(stats_path, 'r', encoding='utf-8') as textfile:
+		return json.load(textfile)
+
+
+def GetStaleDays(corpus_stats):
+	""" the days weighted with a smaller running total than the current one, their clustering and the transitions
+		from and to their clusters can differ from a run of RunClusteringMain over all the days
+		* stale_days - {date: {'weights_num_tweets', 'num_tweets_ratio'}}, num_tweets_ratio = weights_num_tweets / total_num_tweets
+	"""
+	total_num_tweets = corpus_stats['total_num_tweets']
+	stale_days = dict()
+	for date in corpus_stats['timepoints']:
+		weights_num_tweets = corpus_stats['weights_num_tweets'][date]
+		if weights_num_tweets != total_num_tweets:
+			stale_days[date] = {'weights_num_tweets': weights_num_tweets, 'num_tweets_ratio': weights_num_tweets / total_num_tweets if total_num_tweets > 0 else 1}
+	return stale_days
+
+
+def _moveStagedOutputs(result_dir):
+	""" move the staged outputs into result_dir, an output already moved by an earlier call is skipped """
+	staged_dir = os.path.join(result_dir, STAGED_DIRNAME)
+	for name in STAGED_OUTPUTS:
+		staged_path = os.path.join(staged_dir, name)
+		if os.path.isdir(staged_path):
+			ReplaceDirectory(staged_path, os.path.join(result_dir, name))
+		elif os.path.isfile(staged_path):
+			os.replace(staged_path, os.path.join(result_dir, name))
+	shutil.rmtree(staged_dir)
+
+
+def _finishStagedOutputs(result_dir, corpus_stats):
+	""" move the staged outputs of a day appended by a run that died before it moved them, drop the staged outputs
+		of a day that was not appended
+	"""
+	staged_dir = os.path.join(result_dir, STAGED_DIRNAME)
+	if not os.path.isdir(staged_dir):
+		return
+	timepoints_path = os.path.join(staged_dir, STAGED_TIMEPOINTS_FILENAME)
+	staged_timepoints = None
+	if os.path.isfile(timepoints_path):
+		with open(timepoints_path, 'r', encoding='utf-8') as textfile:
+			staged_timepoints = json.load(textfile)
+	if corpus_stats is not None and staged_timepoints == corpus_stats['timepoints']:
+		_moveStagedOutputs(result_dir)
+	else:
+		shutil.rmtree(staged_dir)
+
+
+def _loadOrMakeGraph(graph_dir, store_intersections):
+	if os.path.isdir(graph_dir):
+		# not memory mapped, graph_dir is replaced when the extended graph is moved into place
+		return LoadTransitionGraph(graph_dir, mmap=False)
+	return Graph(store_intersections=store_intersections)
+
+
+def _appendTimepoint(timepoint, graph, count, result_dir, corpus_stats, transition_graphs, include_removed_nodes, removal_fraction, crisp_reappear, crisp_reappear_threshold,
+					 fuzzy_reappear, reappear_max_gap):
+	""" weight, cluster and trace the token graph of one new timepoint, extends transition_graphs {mode: Graph} and
+		updates corpus_stats but does not write them
+	"""
+	# the new timepoint is weighted with the running total, including itself
+	total_num_tweets = corpus_stats['total_num_tweets'] + count
+	with Stage('append_edge_weights', day=timepoint):
+		ComputeEdgeWeights(graph, total_num_tweets)
+
+	with Stage('append_cluster', day=timepoint):
+		output_json = MakeClusteringResults(graph, include_removed_nodes, removal_fraction)
+	with open(os.path.join(result_dir, GetResultsFilename(timepoint, include_removed_nodes)), 'w', encoding='utf-8') as textfile:
+		json.dump(output_json, textfile, indent=2, ensure_ascii=True)
+	clustering = output_json['best_clustering']
+
+	# the clustering of the previous timepoint as it was clustered, for the crisp pairwise matching
+	previous_clustering = None
+	if len(corpus_stats['timepoints']) > 0:
+		with open(os.path.join(result_dir, GetResultsFilename(corpus_stats['timepoints'][-1], include_removed_nodes)), 'r', encoding='utf-8') as textfile:
+			previous_clustering = json.load(textfile)['best_clustering']
+
+	for mode in ['crisp', 'fuzzy']:
+		with Stage('append_trace_' + mode, day=timepoint):
+			if mode == 'crisp':
+				ExtendCrispTransitionGraph(transition_graphs[mode], timepoint, clustering, previous_clustering, crisp_reappear, crisp_reappear_threshold)
+			else:
+				ExtendFuzzyTransitionGraph(transition_graphs[mode], timepoint, clustering, fuzzy_reappear, reappear_max_gap)
+
+	corpus_stats['timepoints'].append(timepoint)
+	corpus_stats['daily_tweet_counts'][timepoint] = count
+	corpus_stats['total_num_tweets'] = total_num_tweets
+	corpus_stats['weights_num_tweets'][timepoint] = total_num_tweets
+
+
+def AppendDay(date, data_dir, result_dir, keywords, include_removed_nodes=False, removal_fraction=0.2, crisp_reappear=True, crisp_reappear_threshold=2/3,
+			  fuzzy_reappear=False, reappear_max_gap=7, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7], bucket_hours=24, stream=False):
+	""" ingest, weight and cluster one new day, extend the transition graphs in result_dir and update the running statistics
+		the outputs have the names main_run_clustering.py and main_trace_transition.py use: <date>_results_meta*.json,
+		<mode>_transition_graph/ and <mode>_graph_tuples.json, so they can also be loaded with --load_graph
+		* bucket_hours - append the day as 24 / bucket_hours timepoints labeled by GetBucketLabels, the same for every appended day
+		* stream - read the files of the day one tweet at a time, see main_run_clustering.IterDayTweets
+		* corpus_stats - see LoadCorpusStats, with 'stale_days' of GetStaleDays
+	"""
+	if not os.path.isdir(result_dir):
+		os.makedirs(result_dir)
+
+	corpus_stats = LoadCorpusStats(result_dir)
+	_finishStagedOutputs(result_dir, corpus_stats)
+	if corpus_stats is None:
+		corpus_stats = {'timepoints': list(), 'daily_tweet_counts': dict(), 'total_num_tweets': 0, 'weights_num_tweets': dict(),
+						'keywords': list(keywords), 'include_removed_nodes': include_removed_nodes, 'bucket_hours': bucket_hours}
+	timepoints = GetBucketLabels(date, bucket_hours)
+	assert not any(timepoint in corpus_stats['daily_tweet_counts'] for timepoint in timepoints), 'day ' + date + ' was already appended'
+	assert corpus_stats['keywords'] == list(keywords), 'keywords differ from the ones of the appended days'
+	assert corpus_stats['include_removed_nodes'] == include_removed_nodes, 'include_removed_nodes differs from the one of the appended days'
+	assert corpus_stats.get('bucket_hours', 24) == bucket_hours, 'bucket_hours differs from the one of the appended days'
+
+	# the files of the day are read once for all its buckets
+	with Stage('append_ingest', day=date):
+		graphs, tweet_counts = MakeTokenGraphsForDay(date, data_dir, keywords, bucket_hours, stream)
+
+	transition_graphs = dict()
+	for mode in ['crisp', 'fuzzy']:
+		transition_graphs[mode] = _loadOrMakeGraph(os.path.join(result_dir, mode + '_transition_graph'), store_intersections=(mode == 'crisp'))
+		assert transition_graphs[mode].GetTimepoints() == corpus_stats['timepoints'], mode + ' transition graph does not match the appended days in ' + CORPUS_STATS_FILENAME
+
+	for timepoint, graph, count in zip(timepoints, graphs, tweet_counts):
+		_appendTimepoint(timepoint, graph, count, result_dir, corpus_stats, transition_graphs, include_removed_nodes, removal_fraction, crisp_reappear, crisp_reappear_threshold,
+						 fuzzy_reappear, reappear_max_gap)
+
+	total_num_tweets = corpus_stats['total_num_tweets']
+	corpus_stats['stale_days'] = GetStaleDays(corpus_stats)
+
+	# every transition from or to a cluster of a stale day may change when the stale days are reclustered
+	stale_artifacts = {'total_num_tweets': total_num_tweets,
+					   'stale_results': {GetResultsFilename(stale_date, include_removed_nodes): stale for stale_date, stale in corpus_stats['stale_days'].items()},
+					   'stale_transition_graphs': ['crisp_transition_graph', 'fuzzy_transition_graph', 'crisp_graph_tuples.json', 'fuzzy_graph_tuples.json'] if len(corpus_stats['stale_days']) > 0 else list()}
+
+	staged_dir = os.path.join(result_dir, STAGED_DIRNAME)
+	os.makedirs(staged_dir)
+	with Stage('append_save', day=date):
+		for mode, transition_graph in transition_graphs.items():
+			if mode == 'crisp':
+				list_of_node_tuples = GetCrispTransitionTuplesFromGraph(transition_graph, transition_graph.GetTimepoints())
+			else:
+				list_of_node_tuples = GetFuzzyTransitionTuplesFromGraph(transition_graph, transition_graph.GetTimepoints(), fuzzy_limiter)
+			SaveTransitionGraph(transition_graph, os.path.join(staged_dir, mode + '_transition_graph'))
+			with open(os.path.join(staged_dir, mode + '_graph_tuples.json'), 'w', encoding='utf-8') as textfile:
+				json.dump(list_of_node_tuples, textfile, indent=2)
+		_writeJSONAtomic(os.path.join(staged_dir, STALE_ARTIFACTS_FILENAME), stale_artifacts)
+		_writeJSONAtomic(os.path.join(staged_dir, STAGED_TIMEPOINTS_FILENAME), corpus_stats['timepoints'])
+
+	# the day counts as appended once corpus_stats.json is written, the staged outputs are moved into place after
+	_writeJSONAtomic(os.path.join(result_dir, CORPUS_STATS_FILENAME), corpus_stats)
+	_moveStagedOutputs(result_dir)
+
+	return corpus_stats
+
+
+if __name__=='__main__':
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='incremental clustering parameters')
+	parser.add_argument('--dates', type=str, nargs='+', required=True, help='MMDD days to append, in order')
+	parser.add_argument('--data_dir', type=str, default='../data/processed/', help='directory of the processed, POS and NER files')
+	parser.add_argument('--result_dir', type=str, default='../data/results/', help='directory of the results, transition graphs and running statistics')
+	parser.add_argument('--include_removed_nodes', action='store_true', help='add the removed nodes back to the clusters')
+	parser.add_argument('--fuzzy_reappear', action='store_true', help='add reappear transitions in fuzzy mode')
+	parser.add_argument('--reappear_max_gap', type=int, default=7, help='largest number of timepoints between fuzzy reappearing clusters')
+	parser.add_argument('--bucket_hours', type=int, default=24, help='hours per timepoint, a divisor of 24, the tweet times are read from time_pu_<MMDD>.json')
+	parser.add_argument('--stream', action='store_true', help='read the input files one tweet at a time, for days larger than the memory')
+	parser.add_argument('--profile', type=str, default=None, help='write a json report of the time and memory of each stage and day to this path')
+	args = parser.parse_args()
+
+	# same keywords as main_run_clustering.py
+	keywords = ['#protectpurdue', '#covid19', '#coronavirus', '#inthistogether', '#covid', '#maskup', '#flu', '#pandemic', '#healthforall', '#masks']
+
+	if args.profile is not None:
+		EnableProfiling()
+
+	for date in args.dates:
+		corpus_stats = AppendDay(date, args.data_dir, args.result_dir, keywords, include_removed_nodes=args.include_removed_nodes,
+								 fuzzy_reappear=args.fuzzy_reappear, reappear_max_gap=args.reappear_max_gap, bucket_hours=args.bucket_hours, stream=args.stream)
+		day_tweet_count = sum(corpus_stats['daily_tweet_counts'][timepoint] for timepoint in GetBucketLabels(date, args.bucket_hours))
+		print(date, 'appended,', day_tweet_count, 'tweets,', corpus_stats['total_num_tweets'], 'in total')
+
+	if args.profile is not None:
+		WriteReport(args.profile)
+
+	if len(corpus_stats['stale_days']) > 0:
+		print('WARNING:', len(corpus_stats['stale_days']), 'earlier days were weighted with fewer tweets than the current total, see',
+			  os.path.join(args.result_dir, STALE_ARTIFACTS_FILENAME), file=sys.stderr)
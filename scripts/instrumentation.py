@@ -0,0 +1,197 @@
+# per stage and per day timing and memory of a run, written as a json report
+# EnableProfiling, DisableProfiling, ProfileStage, Stage, RecordSizes, MergeRecords, WriteReport
+#
+# disabled by default: Stage returns a shared no-op context and ProfileStage wrappers make one extra check per call,
+# nothing is recorded or allocated until EnableProfiling is called
+
+import json
+import time
+import functools
+import tracemalloc
+
+try:
+	import resource
+except ImportError: # not available on windows, peak RSS is then not reported
+	resource = None
+
+_profiler = None
+
+
+class _NoStage(object):
+	""" shared context used while profiling is disabled """
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+_NO_STAGE = _NoStage()
+
+
+class _StageFrame(object):
+	__slots__ = ('key', 'start', 'traced_peak')
+
+	def __init__(self, key):
+		self.key = key
+		self.start = time.perf_counter()
+		self.traced_peak = 0
+
+
+class RunProfiler(object):
+	""" records, for each (stage, day): number of calls, wall time, peak RSS, peak traced memory and sizes
+		a stage without a day takes the day of the stage it runs in
+	"""
+	def __init__(self, track_memory=False):
+		self.track_memory = track_memory
+		self.records = dict() # {(stage, day): record}
+		self.stack = list() # open _StageFrames, innermost last
+		self.start = time.perf_counter()
+		if track_memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+
+	def _getRecord(self, key):
+		if key not in self.records:
+			self.records[key] = {'stage': key[0], 'day': key[1], 'calls': 0, 'seconds': 0.0, 'peak_rss_kb': None, 'peak_traced_bytes': None, 'sizes': dict()}
+		return self.records[key]
+
+	def Start(self, stage, day=None):
+		if day is None and len(self.stack) > 0:
+			day = self.stack[-1].key[1]
+		if self.track_memory:
+			# the peak so far belongs to the open stages, the new stage starts from the current usage
+			traced_peak = tracemalloc.get_traced_memory()[1]
+			for frame in self.stack:
+				frame.traced_peak = max(frame.traced_peak, traced_peak)
+			tracemalloc.reset_peak()
+		self.stack.append(_StageFrame((stage, day)))
+
+	def End(self):
+		frame = self.stack.pop()
+		record = self._getRecord(frame.key)
+		record['calls'] += 1
+		record['seconds'] += time.perf_counter() - frame.start
+		if resource is not None:
+			record['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if self.track_memory:
+			frame.traced_peak = max(frame.traced_peak, tracemalloc.get_traced_memory()[1])
+			record['peak_traced_bytes'] = max(record['peak_traced_bytes'] or 0, frame.traced_peak)
+			if len(self.stack) > 0:
+				self.stack[-1].traced_peak = max(self.stack[-1].traced_peak, frame.traced_peak)
+
+	def RecordSizes(self, sizes):
+		""" add sizes to the innermost open stage, sizes of repeated calls are summed """
+		if len(self.stack) == 0:
+			return
+		record_sizes = self._getRecord(self.stack[-1].key)['sizes']
+		for name, value in sizes.items():
+			record_sizes[name] = record_sizes.get(name, 0) + value
+
+	def MergeRecords(self, records):
+		""" add the records of another profiler, e.g. of a worker process, calls, seconds and sizes are summed """
+		for other in records:
+			record = self._getRecord((other['stage'], other['day']))
+			record['calls'] += other['calls']
+			record['seconds'] += other['seconds']
+			for name in ['peak_rss_kb', 'peak_traced_bytes']:
+				if other[name] is not None:
+					record[name] = max(record[name] or 0, other[name])
+			for name, value in other['sizes'].items():
+				record['sizes'][name] = record['sizes'].get(name, 0) + value
+
+	def Stage(self, stage, day=None):
+		return _ProfiledStage(self, stage, day)
+
+	def GetReport(self):
+		""" * report - {'wall_seconds', 'stages': [record, ...] in order of first use, 'totals': {stage: {'calls', 'seconds', 'sizes'}}} """
+		totals = dict()
+		for record in self.records.values():
+			if record['stage'] not in totals:
+				totals[record['stage']] = {'calls': 0, 'seconds': 0.0, 'sizes': dict()}
+			total = totals[record['stage']]
+			total['calls'] += record['calls']
+			total['seconds'] += record['seconds']
+			for name, value in record['sizes'].items():
+				total['sizes'][name] = total['sizes'].get(name, 0) + value
+		return {'wall_seconds': time.perf_counter() - self.start, 'stages': list(self.records.values()), 'totals': totals}
+
+
+class _ProfiledStage(object):
+	__slots__ = ('profiler', 'stage', 'day')
+
+	def __init__(self, profiler, stage, day):
+		self.profiler = profiler
+		self.stage = stage
+		self.day = day
+
+	def __enter__(self):
+		self.profiler.Start(self.stage, self.day)
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.profiler.End()
+		return False
+
+
+def EnableProfiling(track_memory=False):
+	""" start recording, track_memory also traces python allocations with tracemalloc, which slows the run down """
+	global _profiler
+	_profiler = RunProfiler(track_memory)
+	return _profiler
+
+
+def DisableProfiling():
+	""" stop recording and return the profiler with the records so far """
+	global _profiler
+	profiler = _profiler
+	_profiler = None
+	if profiler is not None and profiler.track_memory and tracemalloc.is_tracing():
+		tracemalloc.stop()
+	return profiler
+
+
+def IsProfiling():
+	return _profiler is not None
+
+
+def IsTrackingMemory():
+	return _profiler is not None and _profiler.track_memory
+
+
+def Stage(stage, day=None):
+	""" context for one stage, e.g. with Stage('build_graph', day=date): ... """
+	if _profiler is None:
+		return _NO_STAGE
+	return _profiler.Stage(stage, day)
+
+
+def RecordSizes(**sizes):
+	""" record sizes, e.g. number of nodes, for the innermost open stage """
+	if _profiler is not None:
+		_profiler.RecordSizes(sizes)
+
+
+def MergeRecords(records):
+	""" add the records of a worker profiler, the list of DisableProfiling().records.values(), to the active profiler """
+	if _profiler is not None:
+		_profiler.MergeRecords(records)
+
+
+def ProfileStage(stage):
+	""" decorator recording every call of the function as stage """
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			if _profiler is None:
+				return function(*args, **kwargs)
+			with _profiler.Stage(stage):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorator
+
+
+def WriteReport(report_path, profiler=None):
+	""" write the report of profiler, or of the active profiler, as json """
+	profiler = profiler if profiler is not None else _profiler
+	assert profiler is not None, 'profiling is not enabled!'
+	with open(report_path, 'w', encoding='utf-8') as textfile:
+		json.dump(profiler.GetReport(), textfile, indent=2)
@@ -0,0 +1,89 @@
+# read the elements of a large top level json array one by one without loading the whole file
+# IterJSONArray, IterJSONLines, IterJSONFile, LoadJSONFile
+
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+
+def IterJSONArray(file_path, chunk_size=1 << 20):
+	""" yield the elements of the top level json array in file_path, reading chunk_size characters at a time
+		memory is bounded by the largest element plus one chunk
+	"""
+	decoder = json.JSONDecoder()
+	with open(file_path, 'r', encoding='utf-8') as textfile:
+		buffer = ''
+		pos = 0
+		eof = False
+		started = False
+
+		while True:
+			# skip whitespace and separators, read more if the buffer runs out
+			while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ',')):
+				pos += 1
+			if pos == len(buffer):
+				if eof:
+					assert False, 'unexpected end of json array in ' + file_path
+				buffer = textfile.read(chunk_size)
+				pos = 0
+				eof = len(buffer) < chunk_size
+				continue
+
+			if not started:
+				assert buffer[pos] == '[', 'file does not contain a json array: ' + file_path
+				started = True
+				pos += 1
+				continue
+
+			if buffer[pos] == ']':
+				return
+
+			try:
+				element, end = decoder.raw_decode(buffer, pos)
+				# an element is complete once the separator after it is in the buffer, numbers cut by the chunk boundary decode too early
+				next_pos = end
+				while next_pos < len(buffer) and buffer[next_pos] in _WHITESPACE:
+					next_pos += 1
+				if next_pos == len(buffer) or buffer[next_pos] not in ',]':
+					end = None
+			except ValueError:
+				element, end = None, None
+			if end is None:
+				assert not eof, 'invalid json element in ' + file_path
+				chunk = textfile.read(chunk_size)
+				eof = len(chunk) < chunk_size
+				buffer = buffer[pos:] + chunk
+				pos = 0
+				continue
+
+			yield element
+			pos = end
+
+
+def IterJSONLines(file_path):
+	""" yield the json value on each non empty line of a line delimited (.jsonl) file, memory is bounded by the longest line """
+	with open(file_path, 'r', encoding='utf-8') as textfile:
+		for line in textfile:
+			if line.strip():
+				yield json.loads(line)
+
+
+def IterJSONFile(file_path, chunk_size=1 << 20):
+	""" elements of a .jsonl file or of the top level array of a .json file, one at a time """
+	if file_path.endswith('.jsonl'):
+		return IterJSONLines(file_path)
+	return IterJSONArray(file_path, chunk_size)
+
+
+def LoadJSONFile(file_path, content=None):
+	""" the whole top level array of a .json file, or the list of the values of a .jsonl file
+		* content - the bytes of the file if they were already read, e.g. by prefetch.PrefetchDays
+	"""
+	if content is not None:
+		if file_path.endswith('.jsonl'):
+			return [json.loads(line) for line in content.splitlines() if line.strip()]
+		return json.loads(content)
+	if file_path.endswith('.jsonl'):
+		return list(IterJSONLines(file_path))
+	with open(file_path, 'r', encoding='utf-8') as textfile:
+		return json.load(textfile)
@@ -0,0 +1,97 @@
+# per day inverted index from token to the positions of the tweets containing it, cached next to the runs
+# LoadOrBuildTweetIndex, BuildTweetIndex, GetMatchingPositions, IterJSONLinesAt
+#
+# a run with other keywords reuses the index and only reads the matching tweets: for line delimited (.jsonl) files the
+# index also has the byte offset of every line, so the lines of the other tweets are never read or decoded
+
+import os
+import json
+
+from json_stream import IterJSONFile
+
+# bump when the layout of the index changes
+TWEET_INDEX_VERSION = 1
+
+
+def _getFileStats(file_paths):
+	""" [[file name, size, mtime], ...] identifying the version of the files the index was built from """
+	file_stats = list()
+	for file_path in file_paths:
+		stat = os.stat(file_path)
+		file_stats.append([os.path.basename(file_path), stat.st_size, stat.st_mtime_ns])
+	return file_stats
+
+
+def _getLineOffsets(file_path):
+	""" byte offset of each non empty line, the lines IterJSONLines decodes """
+	line_offsets = list()
+	offset = 0
+	with open(file_path, 'rb') as binfile:
+		for line in binfile:
+			if line.strip():
+				line_offsets.append(offset)
+			offset += len(line)
+	return line_offsets
+
+
+def BuildTweetIndex(tokens_path, parallel_paths=()):
+	""" index the tweets of one day
+		* tokens_path - file with the token list of each tweet, e.g. processed_pu_<date>.json(l)
+		* parallel_paths - files with one value per tweet in the same order, e.g. the POS and NER files
+		* tweet_index - {'version', 'files': see _getFileStats, 'num_tweets',
+						 'postings': {token: [position of each tweet containing token, ...]},
+						 'line_offsets': {file name: [byte offset of each tweet, ...]} for the .jsonl files}
+	"""
+	postings = dict()
+	num_tweets = 0
+	for position, tweet in enumerate(IterJSONFile(tokens_path)):
+		num_tweets += 1
+		for token in set(tweet):
+			if token not in postings:
+				postings[token] = list()
+			postings[token].append(position)
+
+	line_offsets = dict()
+	for file_path in [tokens_path] + list(parallel_paths):
+		if file_path.endswith('.jsonl'):
+			line_offsets[os.path.basename(file_path)] = _getLineOffsets(file_path)
+			assert len(line_offsets[os.path.basename(file_path)]) == num_tweets, 'the input files of ' + tokens_path + ' have different numbers of tweets!'
+
+	return {'version': TWEET_INDEX_VERSION, 'files': _getFileStats([tokens_path] + list(parallel_paths)), 'num_tweets': num_tweets,
+			'postings': postings, 'line_offsets': line_offsets}
+
+
+def LoadOrBuildTweetIndex(index_path, tokens_path, parallel_paths=()):
+	""" the index at index_path if it was built from the current version of the files, otherwise build and save it """
+	file_stats = _getFileStats([tokens_path] + list(parallel_paths))
+	if os.path.isfile(index_path):
+		with open(index_path, 'r', encoding='utf-8') as textfile:
+			tweet_index = json.load(textfile)
+		if tweet_index['version'] == TWEET_INDEX_VERSION and tweet_index['files'] == file_stats:
+			return tweet_index
+
+	tweet_index = BuildTweetIndex(tokens_path, parallel_paths)
+	index_dir = os.path.dirname(index_path)
+	if index_dir and not os.path.isdir(index_dir):
+		os.makedirs(index_dir)
+	tmp_path = index_path + '.tmp' + str(os.getpid())
+	with open(tmp_path, 'w', encoding='utf-8') as textfile:
+		json.dump(tweet_index, textfile)
+	os.replace(tmp_path, index_path)
+	return tweet_index
+
+
+def GetMatchingPositions(tweet_index, keywords):
+	""" sorted positions of the tweets containing at least one of the keywords """
+	positions = set()
+	for keyword in keywords:
+		positions.update(tweet_index['postings'].get(keyword, ()))
+	return sorted(positions)
+
+
+def IterJSONLinesAt(file_path, line_offsets, positions):
+	""" decode only the lines at positions of a .jsonl file, positions in increasing order """
+	with open(file_path, 'rb') as binfile:
+		for position in positions:
+			binfile.seek(line_offsets[position])
+			yield json.loads(binfile.readline())
@@ -0,0 +1,260 @@
+# bash: python lineage_index.py --mode crisp/fuzzy --node 0820_03 --token vaccine --min_strength medium
+# lineage queries over a transition graph: where did a cluster come from and where did it go
+# LineageIndex
+
+import os
+import json
+import argparse
+import numpy as np
+from collections import deque
+
+from fuzzy_transition import IterFuzzySetsBatch
+
+# fuzzy strength classes from the weakest, as in the tuples of main_trace_transition.GetFuzzyTransitionTuplesFromGraph
+STRENGTHS = ['weak', 'medium', 'strong']
+
+
+class LineageIndex(object):
+	""" index over the transitions of a Graph, built once, the graph should not be modified afterwards
+		* component ids - weakly connected components of the transitions
+		* levels - longest chain of transitions leading to a node, transitions always go forward in time
+		* token postings - the nodes containing each token, in time order
+		transitions are filtered by type and fuzzy strength: a transition passes if one of its types is in
+		transition_types (all types if None) with a membership above min_miu in the min_strength class or a
+		stronger one (any class if None). the memberships of the cores are computed with fuzzy_limiter as for the
+		fuzzy tuples, crisp transitions are strong with membership 1
+	"""
+	def __init__(self, graph, include_reappear=True, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7]):
+		self.graph = graph
+		self.include_reappear = include_reappear
+		self.nodes = list(graph.GetAllNodes())
+		self.node_id_to_idx = dict((node.GetID(), i) for i, node in enumerate(self.nodes))
+		self.timepoint_idx = np.array([node.GetTimepointIndex() for node in self.nodes], dtype=np.int32)
+
+		edges = list() # [(node_idx, neighbor_idx, edge_obj), ...]
+		for i, node in enumerate(self.nodes):
+			for neighbor_id, edge in node.GetOutgoingNeighborsAndEdges():
+				edges.append((i, self.node_id_to_idx[neighbor_id], edge))
+			if include_reappear:
+				# reappear edges are stored on both nodes, only take the forward ones
+				for neighbor_id, edge in node.GetReappearNeighborsAndEdges():
+					j = self.node_id_to_idx[neighbor_id]
+					if self.timepoint_idx[i] < self.timepoint_idx[j]:
+						edges.append((i, j, edge))
+		self._makeTransitions(edges, fuzzy_limiter)
+
+		self._makeComponents()
+		self._makeLevels()
+		self._makeTokenPostings()
+
+	def _makeTransitions(self, edges, fuzzy_limiter):
+		""" transitions as [(neighbor_idx, ((type, (weak miu, medium miu, strong miu)), ...)), ...] per node, in both directions
+			the fuzzy sets of all the cores are computed in one batch
+		"""
+		x_values = [x for _, _, edge in edges for x in edge.GetFuzzytypes().values()]
+		fuzzy_sets = IterFuzzySetsBatch(x_values, fuzzy_limiter)
+
+		self.out_transitions = [list() for _ in self.nodes]
+		self.in_transitions = [list() for _ in self.nodes]
+		for i, j, edge in edges:
+			fuzzy_types = edge.GetFuzzytypes()
+			if len(fuzzy_types) > 0:
+				labels = list()
+				for type in fuzzy_types:
+					memberships = dict(next(fuzzy_sets))
+					labels.append((type, tuple(memberships.get(strength, 0) for strength in STRENGTHS)))
+				labels = tuple(labels)
+			else:
+				labels = ((edge.GetEdgeType(), (0, 0, 1)),)
+			self.out_transitions[i].append((j, labels))
+			self.in_transitions[j].append((i, labels))
+
+	def _makeComponents(self):
+		""" union find over all the transitions, component ids are numbered in node order """
+		parent = list(range(len(self.nodes)))
+
+		def find(i):
+			while parent[i] != i:
+				parent[i] = parent[parent[i]]
+				i = parent[i]
+			return i
+
+		for i, transitions in enumerate(self.out_transitions):
+			for j, _ in transitions:
+				root_i, root_j = find(i), find(j)
+				if root_i != root_j:
+					parent[max(root_i, root_j)] = min(root_i, root_j)
+
+		roots = np.array([find(i) for i in range(len(self.nodes))], dtype=np.int64)
+		_, self.component_ids = np.unique(roots, return_inverse=True)
+		self.component_ids = self.component_ids.astype(np.int32)
+
+		# nodes of each component in node order
+		self.component_order = np.argsort(self.component_ids, kind='stable')
+		self.component_indptr = np.zeros(self.GetNumOfComponents() + 1, dtype=np.int64)
+		np.cumsum(np.bincount(self.component_ids, minlength=self.GetNumOfComponents()), out=self.component_indptr[1:])
+
+	def _makeLevels(self):
+		""" nodes are in time order, which is a topological order of the transitions """
+		levels = np.zeros(len(self.nodes), dtype=np.int32)
+		for i, transitions in enumerate(self.out_transitions):
+			for j, _ in transitions:
+				assert self.timepoint_idx[i] < self.timepoint_idx[j], 'transitions need to go forward in time!'
+				if levels[j] < levels[i] + 1:
+					levels[j] = levels[i] + 1
+		self.levels = levels
+
+	def _makeTokenPostings(self):
+		""" CSR of token id to node indices, the stable sort keeps the nodes of a token in time order """
+		vocabulary = self.graph.vocabulary
+		element_ids = [node.GetElementIDs() for node in self.nodes]
+		sizes = np.array([len(ids) for ids in element_ids], dtype=np.int64)
+		if sizes.sum() == 0:
+			all_ids = np.zeros(0, dtype=np.int64)
+		else:
+			all_ids = np.concatenate(element_ids).astype(np.int64)
+		node_of_entry = np.repeat(np.arange(len(self.nodes), dtype=np.int32), sizes)
+		order = np.argsort(all_ids, kind='stable')
+		self.token_nodes = node_of_entry[order]
+		self.token_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+		np.cumsum(np.bincount(all_ids, minlength=len(vocabulary)), out=self.token_indptr[1:])
+
+	def _getNodeIndex(self, node_id):
+		assert node_id in self.node_id_to_idx, 'node ' + str(node_id) + ' not in graph'
+		return self.node_id_to_idx[node_id]
+
+	def _toNodeIDs(self, indices):
+		return [self.nodes[i].GetID() for i in sorted(indices)]
+
+	@staticmethod
+	def _strengthIndex(min_strength):
+		if min_strength is None:
+			return 0
+		assert min_strength in STRENGTHS, 'min_strength needs to be one of ' + ', '.join(STRENGTHS)
+		return STRENGTHS.index(min_strength)
+
+	@staticmethod
+	def _passes(labels, transition_types, strength_idx, min_miu):
+		for type, memberships in labels:
+			if (transition_types is None or type in transition_types) and max(memberships[strength_idx:]) > min_miu:
+				return True
+		return False
+
+	def _traverse(self, start, transitions_by_node, transition_types, min_strength, min_miu, max_depth=None):
+		""" breadth first search from start, return the set of reached node indices without start """
+		strength_idx = self._strengthIndex(min_strength)
+		reached = set()
+		frontier = [start]
+		depth = 0
+		while len(frontier) > 0 and (max_depth is None or depth < max_depth):
+			next_frontier = list()
+			for i in frontier:
+				for j, labels in transitions_by_node[i]:
+					if j not in reached and self._passes(labels, transition_types, strength_idx, min_miu):
+						reached.add(j)
+						next_frontier.append(j)
+			frontier = next_frontier
+			depth += 1
+		reached.discard(start)
+		return reached
+
+	def GetNumOfComponents(self):
+		return int(self.component_ids.max()) + 1 if len(self.nodes) > 0 else 0
+
+	def GetComponentID(self, node_id):
+		return int(self.component_ids[self._getNodeIndex(node_id)])
+
+	def GetComponentNodes(self, component_id):
+		""" node ids of one component in time order """
+		start, end = self.component_indptr[component_id], self.component_indptr[component_id + 1]
+		return [self.nodes[i].GetID() for i in self.component_order[start:end].tolist()]
+
+	def GetLevel(self, node_id):
+		return int(self.levels[self._getNodeIndex(node_id)])
+
+	def GetDescendants(self, node_id, transition_types=None, min_strength=None, min_miu=0, max_depth=None):
+		""" node ids reachable from node_id with transitions passing the filter, in time order """
+		return self._toNodeIDs(self._traverse(self._getNodeIndex(node_id), self.out_transitions, transition_types, min_strength, min_miu, max_depth))
+
+	def GetAncestors(self, node_id, transition_types=None, min_strength=None, min_miu=0, max_depth=None):
+		""" node ids reaching node_id with transitions passing the filter, in time order """
+		return self._toNodeIDs(self._traverse(self._getNodeIndex(node_id), self.in_transitions, transition_types, min_strength, min_miu, max_depth))
+
+	def FindPaths(self, node_id_1, node_id_2, transition_types=None, min_strength=None, min_miu=0, max_paths=1000):
+		""" paths of transitions passing the filter from node_id_1 to node_id_2, shortest first
+			the search only visits nodes that are both descendants of node_id_1 and ancestors of node_id_2
+			* paths - [[node_id_1, ..., node_id_2], ...], at most max_paths (all if None)
+		"""
+		start, end = self._getNodeIndex(node_id_1), self._getNodeIndex(node_id_2)
+		if self.component_ids[start] != self.component_ids[end] or self.levels[start] >= self.levels[end]:
+			return list()
+
+		ancestors_of_end = self._traverse(end, self.in_transitions, transition_types, min_strength, min_miu)
+		if start not in ancestors_of_end:
+			return list()
+		allowed = ancestors_of_end
+		allowed.add(end)
+
+		# breadth first, so the paths come out shortest first 
+		strength_idx = self._strengthIndex(min_strength)
+		paths = list()
+		queue = deque([[start]])
+		while len(queue) > 0 and (max_paths is None or len(paths) < max_paths):
+			path = queue.popleft()
+			i = path[-1]
+			if i == end:
+				paths.append(path)
+				continue
+			for j, labels in self.out_transitions[i]:
+				if j in allowed and self._passes(labels, transition_types, strength_idx, min_miu):
+					queue.append(path + [j])
+
+		return [[self.nodes[i].GetID() for i in path] for path in paths]
+
+	def GetClustersWithToken(self, token):
+		""" all clusters containing token over time
+			* clusters - [(timepoint, node_id), ...] in time order, empty if the token is unknown
+		"""
+		token_id = self.graph.vocabulary.GetTokenID(token)
+		if token_id is None:
+			return list()
+		node_indices = self.token_nodes[self.token_indptr[token_id]:self.token_indptr[token_id + 1]].tolist()
+		return [(self.nodes[i].GetTimepoint(), self.nodes[i].GetID()) for i in node_indices]
+
+
+if __name__=='__main__':
+
+	from transition_graph_io import LoadTransitionGraph
+
+	# constants
+	result_dir = '../data/results/'
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='lineage queries over a transition graph saved by main_trace_transition.py --save_graph')
+	parser.add_argument('--mode', type=str, default='crisp', help='choose whether transition mode is crisp or fuzzy')
+	parser.add_argument('--node', type=str, default=None, help='cluster id to list the ancestors and descendants of')
+	parser.add_argument('--path_to', type=str, default=None, help='cluster id to find the paths to from --node')
+	parser.add_argument('--token', type=str, default=None, help='token to list the clusters containing it over time')
+	parser.add_argument('--transition_types', type=str, nargs='*', default=None, help='only follow these transition types')
+	parser.add_argument('--min_strength', type=str, default=None, choices=STRENGTHS, help='only follow transitions that are at least this strong, all if not set')
+	parser.add_argument('--min_miu', type=float, default=0, help='only follow transitions with a membership above this in the --min_strength class or a stronger one')
+	parser.add_argument('--fuzzy_limiter', type=float, nargs=4, default=[0.3, 0.4, 0.6, 0.7], help='limiters a, b, c, d of the fuzzy strength classes, as used for the fuzzy tuples')
+	parser.add_argument('--exclude_reappear', action='store_true', help='do not follow reappear transitions')
+	args = parser.parse_args()
+	assert args.mode in ['crisp', 'fuzzy'], 'mode needs to be either "crisp" or "fuzzy"!'
+
+	transition_graph = LoadTransitionGraph(os.path.join(result_dir, args.mode + '_transition_graph'))
+	lineage_index = LineageIndex(transition_graph, include_reappear=not args.exclude_reappear, fuzzy_limiter=args.fuzzy_limiter)
+
+	result = dict()
+	if args.node is not None:
+		result['component'] = lineage_index.GetComponentID(args.node)
+		result['level'] = lineage_index.GetLevel(args.node)
+		result['ancestors'] = lineage_index.GetAncestors(args.node, args.transition_types, args.min_strength, args.min_miu)
+		result['descendants'] = lineage_index.GetDescendants(args.node, args.transition_types, args.min_strength, args.min_miu)
+		if args.path_to is not None:
+			result['paths'] = lineage_index.FindPaths(args.node, args.path_to, args.transition_types, args.min_strength, args.min_miu)
+	if args.token is not None:
+		result['clusters_with_token'] = lineage_index.GetClustersWithToken(args.token)
+
+	print(json.dumps(result, indent=2))
@@ -3,11 +3,24 @@
 import os 
 import json 
 import argparse
-import datetime 
+import itertools
+import multiprocessing 
 import numpy as np 
 import networkx as nx 
+import scipy.sparse as sp 
 
 from mcl_with_removal import FindOptimClustering 
+from instrumentation import Stage, RecordSizes, EnableProfiling, DisableProfiling, IsProfiling, IsTrackingMemory, MergeRecords, WriteReport 
+from time_buckets import ParseHour, AddTimeRangeArguments, TimeBucketsFromArgs 
+from json_stream import IterJSONFile, LoadJSONFile 
+from prefetch import PrefetchDays, ReadFileBytes 
+from keyword_index import LoadOrBuildTweetIndex, GetMatchingPositions, IterJSONLinesAt 
+from sampling import BottomKSample, SamplePriority, ScaleSampledGraph, SAMPLING_DEFAULTS, AddSamplingArguments, SamplingFromArgs 
+from shared_graphs import SharedGraphs, AttachSharedGraphs 
+
+DAY_FILE_PREFIXES = ['processed_pu_', 'pos_pu_', 'ner_pu_'] 
+# pruning rules of WeightAndPruneTokenGraph, the defaults keep the whole graph 
+PRUNING_DEFAULTS = {'min_token_freq': 1, 'min_pair_freq': 1, 'top_k': None, 'min_npmi': None} 
 
 
 def ComputeEdgeWeights(graph, num_tweets): 
@@ -29,100 +42,413 @@ def ComputeEdgeWeights(graph, num_tweets):
 		
 		weights_mapping[(token1, token2)] = w
 		
-		nx.set_edge_attributes(graph, weights_mapping, 'weight')
+	nx.set_edge_attributes(graph, weights_mapping, 'weight')
 
 
-def MakeTokenGraphsRaw():
-	""" make graphs only with NN, NNS, NNP, NNPS, keep hashtags, NER
-		nodes: the tokens 
-		edges: the NPMI values
-		make a graph for each day 
+def _removeNodes(graph, nodes): 
+	""" remove nodes and their edges, * removed - {'nodes': n, 'edges': m} """
+	num_edges = graph.number_of_edges() 
+	graph.remove_nodes_from(nodes) 
+	return {'nodes': len(nodes), 'edges': num_edges - graph.number_of_edges()}
+
+
+def _removeEdges(graph, edges): 
+	""" remove edges and the nodes left without edges by them, * removed - {'nodes': n, 'edges': m} """
+	graph.remove_edges_from(edges) 
+	isolated_nodes = list(dict.fromkeys(token for edge in edges for token in edge if graph.degree(token) == 0))
+	graph.remove_nodes_from(isolated_nodes) 
+	return {'nodes': len(isolated_nodes), 'edges': len(edges)}
+
+
+def PruneTokenGraph(graph, min_token_freq=1, min_pair_freq=1, top_k=None): 
+	""" remove the rare tokens and token pairs of a graph of MakeTokenGraphRaw in place, before ComputeEdgeWeights 
+		the weights of the kept edges do not change, they only depend on the freq of the edge and of its two tokens 
+		* min_token_freq - remove the tokens in fewer tweets 
+		* top_k - then keep only the top_k most frequent tokens, ties in the order the tokens were added 
+		* min_pair_freq - then remove the token pairs in fewer tweets, and the tokens left without any pair 
+		* removed - {rule: {'nodes': n, 'edges': m}} removed by each rule that was applied 
 	"""
-	graphs = list()
-	daily_tweet_counts = list()
+	removed = dict() 
+	if min_token_freq > 1: 
+		removed['min_token_freq'] = _removeNodes(graph, [token for token, freq in graph.nodes(data='freq') if freq < min_token_freq])
+	if top_k is not None: 
+		tokens_by_freq = sorted(graph.nodes(data='freq'), key=lambda item: -item[1]) 
+		removed['top_k'] = _removeNodes(graph, [token for token, freq in tokens_by_freq[top_k:]])
+	if min_pair_freq > 1: 
+		removed['min_pair_freq'] = _removeEdges(graph, [(token1, token2) for token1, token2, freq in graph.edges(data='freq') if freq < min_pair_freq])
+	return removed 
 
-	for date in date_range: 
+
+def PruneEdgesByWeight(graph, min_npmi): 
+	""" remove the edges with a NPMI weight below min_npmi, and the tokens left without any edge, after ComputeEdgeWeights 
+		* removed - {'min_npmi': {'nodes': n, 'edges': m}} 
+	"""
+	return {'min_npmi': _removeEdges(graph, [(token1, token2) for token1, token2, w in graph.edges(data='weight') if w < min_npmi])}
+
+
+def WeightAndPruneTokenGraph(graph, num_tweets, pruning=None): 
+	""" PruneTokenGraph, ComputeEdgeWeights and PruneEdgesByWeight with the rules of pruning, 
+		a dict with some of the keys of PRUNING_DEFAULTS, None keeps the whole graph as ComputeEdgeWeights alone 
+		the nodes and edges removed by each rule are recorded as sizes of the prune stage, e.g. top_k_nodes 
+		* removed - see PruneTokenGraph 
+	"""
+	pruning = dict(PRUNING_DEFAULTS, **(pruning or dict())) 
+	with Stage('prune'): 
+		removed = PruneTokenGraph(graph, pruning['min_token_freq'], pruning['min_pair_freq'], pruning['top_k'])
+	ComputeEdgeWeights(graph, num_tweets)
+	with Stage('prune'): 
+		if pruning['min_npmi'] is not None: 
+			removed.update(PruneEdgesByWeight(graph, pruning['min_npmi']))
+		RecordSizes(**{rule + '_' + kind: count for rule, rule_removed in removed.items() for kind, count in rule_removed.items()})
+	return removed 
+
+
+def AddPruningArguments(parser): 
+	""" add --min_token_freq, --min_pair_freq, --top_k and --min_npmi to an argparse parser """
+	parser.add_argument('--min_token_freq', type=int, default=1, help='remove the tokens in fewer tweets of a timepoint before clustering')
+	parser.add_argument('--min_pair_freq', type=int, default=1, help='remove the token pairs in fewer tweets of a timepoint before clustering')
+	parser.add_argument('--top_k', type=int, default=None, help='keep only the top_k most frequent tokens of each timepoint')
+	parser.add_argument('--min_npmi', type=float, default=None, help='remove the edges with a lower NPMI weight')
+
+
+def PruningFromArgs(args): 
+	""" pruning rules of the arguments added by AddPruningArguments, see WeightAndPruneTokenGraph """
+	return {name: getattr(args, name) for name in PRUNING_DEFAULTS}
+
+
+def GetDayFilePath(data_dir, prefix, date): 
+	""" input file of one day: the line delimited <prefix><date>.jsonl, one value per tweet and line, if it exists, 
+		otherwise the json array <prefix><date>.json 
+	"""
+	jsonl_path = os.path.join(data_dir, prefix + date + '.jsonl')
+	if os.path.isfile(jsonl_path): 
+		return jsonl_path 
+	return os.path.join(data_dir, prefix + date + '.json')
+	
+	
+def GetDayFilePrefixes(with_hours=False): 
+	return DAY_FILE_PREFIXES + (['time_pu_'] if with_hours else [])
+	
+	
+def ReadDayFiles(date, data_dir, with_hours=False): 
+	""" the bytes of the input files of one day, in the order of GetDayFilePrefixes, for PrefetchDays """
+	return [ReadFileBytes(GetDayFilePath(data_dir, prefix, date)) for prefix in GetDayFilePrefixes(with_hours)]
+	
+	
+def LoadDayFiles(date, data_dir, with_hours=False, day_files=None): 
+	""" load the processed tweets of one day with their POS and NER tags, and the timestamps if with_hours 
+		* day_files - the bytes of ReadDayFiles, decoded instead of reading the files 
+	"""
+	with Stage('load_files', day=date): 
+		file_paths = [GetDayFilePath(data_dir, prefix, date) for prefix in GetDayFilePrefixes(with_hours)]
+		if day_files is None: 
+			day_files = [None] * len(file_paths)
+		columns = [LoadJSONFile(file_path, content) for file_path, content in zip(file_paths, day_files)]
+			
+	return columns 
+	
+	
+def _iterDayColumns(date, columns, with_hours): 
+	missing = object()
+	for values in itertools.zip_longest(*columns, fillvalue=missing): 
+		assert not any(value is missing for value in values), 'the input files of ' + date + ' have different numbers of tweets!'
+		yield values[0], values[1], values[2], ParseHour(values[3]) if with_hours else None 
 		
-		graph = nx.Graph()
-		count = 0 
 		
-		filepath = os.path.join(data_dir, 'processed_pu_' + date + '.json')
-		pos_filepath = os.path.join(data_dir, 'pos_pu_' + date + '.json')
-		ner_filepath = os.path.join(data_dir, 'ner_pu_' + date + '.json')
+def IterDayTweets(date, data_dir, with_hours=False, stream=False, day_files=None): 
+	""" iterator over the (tweet, pos, ner, hour) of each tweet of one day, hour is None unless with_hours, 
+		with_hours reads the hour of each tweet from the timestamps in time_pu_<date>.json(l) 
+		* stream - walk the files in parallel one tweet at a time instead of loading them first, 
+				   memory is then bounded by one chunk or line per file, for days larger than the memory 
+		* day_files - the prefetched bytes of ReadDayFiles, not streamed 
+	"""
+	if stream and day_files is None: 
+		columns = [IterJSONFile(GetDayFilePath(data_dir, prefix, date)) for prefix in GetDayFilePrefixes(with_hours)]
+	else: 
+		columns = LoadDayFiles(date, data_dir, with_hours, day_files)
 		
-		with open(filepath, 'r', encoding='utf-8') as textfile:
-			tweets_text = json.load(textfile)
+	return _iterDayColumns(date, columns, with_hours)
+		
+		
+def GetDayIndexPath(index_dir, date): 
+	return os.path.join(index_dir, 'tweet_index_' + date + '.json')
+	
+	
+def _selectPositions(values, positions): 
+	positions = iter(positions)
+	next_position = next(positions, None)
+	for position, value in enumerate(values): 
+		if next_position is None: 
+			return 
+		if position == next_position: 
+			yield value 
+			next_position = next(positions, None)
+			
 			
-		with open(pos_filepath, 'r', encoding='utf-8') as textfile:
-			tweets_pos = json.load(textfile)
+def IterKeywordTweets(date, data_dir, keywords, index_dir, with_hours=False, stream=False, day_files=None): 
+	""" IterDayTweets of only the tweets containing one of the keywords, found with the index of the day cached in index_dir 
+		the index covers every input file of the day, so runs with and without hours and with other keywords share it 
+		for .jsonl files only the lines of the matching tweets are read 
+	"""
+	index_paths = [GetDayFilePath(data_dir, prefix, date) for prefix in GetDayFilePrefixes(with_hours=True)]
+	if not with_hours and not os.path.isfile(index_paths[-1]): 
+		index_paths = index_paths[:-1]
+	file_paths = index_paths[:len(GetDayFilePrefixes(with_hours))]
+	
+	with Stage('keyword_index', day=date): 
+		tweet_index = LoadOrBuildTweetIndex(GetDayIndexPath(index_dir, date), index_paths[0], index_paths[1:])
+		positions = GetMatchingPositions(tweet_index, keywords)
+		RecordSizes(tweets_indexed=tweet_index['num_tweets'], tweets_matched=len(positions))
+		
+	line_offsets = tweet_index['line_offsets']
+	if day_files is None and all(os.path.basename(file_path) in line_offsets for file_path in file_paths): 
+		columns = [IterJSONLinesAt(file_path, line_offsets[os.path.basename(file_path)], positions) for file_path in file_paths]
+	elif stream and day_files is None: 
+		columns = [_selectPositions(IterJSONFile(file_path), positions) for file_path in file_paths]
+	else: 
+		columns = LoadDayFiles(date, data_dir, with_hours, day_files)
+		assert all(len(column) == tweet_index['num_tweets'] for column in columns), 'the input files of ' + date + ' have different numbers of tweets!'
+		columns = [[column[position] for position in positions] for column in columns]
+		
+	return _iterDayColumns(date, columns, with_hours)
+	
+	
+def GetTweetTokens(tweet, pos, ner): 
+	""" the unique NN, NNS, NNP, NNPS and named entity tokens of a tweet """
+	unique_tokens = set()
+
+	for j in range(len(tweet)): 
+		current_token = tweet[j]
+		current_pos = pos[j]
+		current_ner = ner[j]
+
+		if current_pos in ['NN', 'NNS', 'NNP', 'NNPS'] or current_ner != 'O': 
+			unique_tokens.add(current_token)
+
+	return list(unique_tokens)
+	
+	
+def AddTokensToGraph(graph, unique_tokens): 
+	""" count the unique tokens of a tweet and their pairs in the graph """
+	for token in unique_tokens: # add unique tokens in tweet to graph
+		if not graph.has_node(token):
+			graph.add_node(token, freq=0)
+	
+		# update frequency of token, this frequency is number of tweet token appeared in 
+		graph.nodes[token]['freq'] += 1
+	
+	if len(unique_tokens) > 1:
+		for x in range(len(unique_tokens) - 1):
+			for y in range(x+1, len(unique_tokens)):
 			
-		with open(ner_filepath, 'r', encoding='utf-8') as textfile:
-			tweets_ner = json.load(textfile)
-	 
-		for i in range(len(tweets_text)):
-			# get unique tokens and compute weight between edges 
-			tweet = tweets_text[i]
-			pos = tweets_pos[i]
-			ner = tweets_ner[i]
+				if not graph.has_edge(unique_tokens[x], unique_tokens[y]): 
+					graph.add_edge(unique_tokens[x], unique_tokens[y], freq=0 )
 			
-			# check if keywords in tweet, take only the tweets that have the keywords inside 
-			if any(kw in tweet for kw in keywords):
+				# update the frequency of the edges
+				graph.edges[unique_tokens[x], unique_tokens[y]]['freq'] += 1
+
+
+def AddTweetToGraph(graph, tweet, pos, ner): 
+	""" add the NN, NNS, NNP, NNPS and named entity tokens of a tweet to the graph and count them with their pairs """
+	AddTokensToGraph(graph, GetTweetTokens(tweet, pos, ner))
+
+
+def MakeTokenGraphRaw(date, data_dir, keywords, stream=False, day_files=None, index_dir=None, sampling=None): 
+	""" make the graph of one day for MakeTokenGraphsRaw 
+		* count - number of tweets containing one of the keywords 
+	"""
+	graphs, tweet_counts = MakeTokenGraphsForDay(date, data_dir, keywords, 24, stream, day_files, index_dir, sampling)
+	return graphs[0], tweet_counts[0]
+
 
-				count += 1
-				unique_tokens = set()
+def MakeTokenGraphsForDay(date, data_dir, keywords, bucket_hours=24, stream=False, day_files=None, index_dir=None, sampling=None): 
+	""" make one graph per bucket of bucket_hours hours of one day, see IterDayTweets for the hours, stream and day_files 
+		* index_dir - directory of the cached keyword indexes, only the tweets with a keyword are read, see IterKeywordTweets 
+		* sampling - count only a sample of the keyword tweets of each bucket, see MakeEventTokenGraphsForDay 
+		* graphs, tweet_counts - one per bucket of the day, starting at hour 0 
+	"""
+	return MakeEventTokenGraphsForDay(date, data_dir, {None: keywords}, bucket_hours, stream, day_files, index_dir, sampling)[None]
+	
+	
+def MakeEventTokenGraphsForDay(date, data_dir, event_keywords, bucket_hours=24, stream=False, day_files=None, index_dir=None, sampling=None): 
+	""" MakeTokenGraphsForDay for several events in one pass over the tweets of the day, 
+		a tweet with the keywords of several events is tokenized once and added to the graphs of each of them 
+		* event_keywords - {event: keywords} 
+		* sampling - {'max_tweets', 'seed'}, with max_tweets only that many keyword tweets of each bucket and event are counted, 
+					 a deterministic sample, and the counts are scaled to the number of keyword tweets, see sampling.py 
+		* event_graphs - {event: (graphs, tweet_counts)}, tweet_counts of all keyword tweets, also when sampled 
+	"""
+	sampling = dict(SAMPLING_DEFAULTS, **(sampling or dict())) 
+	events = list(event_keywords.keys())
+	event_graphs = {event: [nx.Graph() for _ in range(24 // bucket_hours)] for event in events}
+	event_tweet_counts = {event: [0] * (24 // bucket_hours) for event in events}
+	if sampling['max_tweets'] is not None: 
+		event_samples = {event: [BottomKSample(sampling['max_tweets']) for _ in range(24 // bucket_hours)] for event in events}
+	num_tweets = 0 
+	
+	if index_dir is None: 
+		tweets = IterDayTweets(date, data_dir, with_hours=(bucket_hours < 24), stream=stream, day_files=day_files)
+	else: 
+		all_keywords = list(dict.fromkeys(kw for keywords in event_keywords.values() for kw in keywords))
+		tweets = IterKeywordTweets(date, data_dir, all_keywords, index_dir, with_hours=(bucket_hours < 24), stream=stream, day_files=day_files)
+	# with one event the index already did the keyword check 
+	prefiltered = index_dir is not None and len(events) == 1 
+	
+	with Stage('build_graph', day=date): 
+		for tweet, pos, ner, hour in tweets:
+			num_tweets += 1
+			bucket_idx = 0 if hour is None else hour // bucket_hours 
+			unique_tokens = None 
+			
+			for event in events: 
+				# check if keywords in tweet, take only the tweets that have the keywords inside 
+				if prefiltered or any(kw in tweet for kw in event_keywords[event]):
+					if sampling['max_tweets'] is not None: 
+						# the priority only depends on the position among the keyword tweets of the bucket 
+						priority = SamplePriority(sampling['seed'], date, bucket_idx, event_tweet_counts[event][bucket_idx])
+						event_tweet_counts[event][bucket_idx] += 1
+						if event_samples[event][bucket_idx].Accepts(priority): 
+							if unique_tokens is None: 
+								unique_tokens = GetTweetTokens(tweet, pos, ner)
+							event_samples[event][bucket_idx].Add(priority, unique_tokens)
+						continue 
+					if unique_tokens is None: 
+						unique_tokens = GetTweetTokens(tweet, pos, ner)
+					event_tweet_counts[event][bucket_idx] += 1
+					AddTokensToGraph(event_graphs[event][bucket_idx], unique_tokens)
+		
+		num_sampled = 0 
+		if sampling['max_tweets'] is not None: 
+			# the sampled tweets are counted in their original order, a bucket under max_tweets gives the unsampled graph 
+			for event in events: 
+				for graph, sample, tweet_count in zip(event_graphs[event], event_samples[event], event_tweet_counts[event]): 
+					for unique_tokens in sample.GetItems(): 
+						AddTokensToGraph(graph, unique_tokens)
+					ScaleSampledGraph(graph, tweet_count, len(sample))
+					num_sampled += len(sample)
 				
-				for j in range(len(tweet)): 
-					current_token = tweet[j]
-					current_pos = pos[j]
-					current_ner = ner[j]
-
-					if current_pos in ['NN', 'NNS', 'NNP', 'NNPS'] or current_ner != 'O': 
-						unique_tokens.add(current_token)
-
-				unique_tokens = list(unique_tokens)
-
-				for token in unique_tokens: # add unique tokens in tweet to graph
-					if not graph.has_node(token):
-						graph.add_node(token, freq=0)
-					
-					# update frequency of token, this frequency is number of tweet token appeared in 
-					graph.nodes[token]['freq'] += 1
-					
-				if len(unique_tokens) > 1:
-					for x in range(len(unique_tokens) - 1):
-						for y in range(x+1, len(unique_tokens)):
-							
-							if not graph.has_edge(unique_tokens[x], unique_tokens[y]): 
-								graph.add_edge(unique_tokens[x], unique_tokens[y], freq=0 )
-							
-							# update the frequency of the edges
-							graph.edges[unique_tokens[x], unique_tokens[y]]['freq'] += 1
-							
-		graphs.append(graph)
-		daily_tweet_counts.append(count)
-		
-	return graphs, daily_tweet_counts 
+		RecordSizes(tweets=num_tweets, tweets_with_keywords=sum(sum(tweet_counts) for tweet_counts in event_tweet_counts.values()), tweets_sampled=num_sampled, 
+					nodes=sum(g.number_of_nodes() for graphs in event_graphs.values() for g in graphs), 
+					edges=sum(g.number_of_edges() for graphs in event_graphs.values() for g in graphs))
+		
+	return {event: (event_graphs[event], event_tweet_counts[event]) for event in events}
+	
+
+def MakeTokenGraphsRaw(date_range, data_dir, keywords, time_buckets=None, stream=False, prefetch=0, index_dir=None, sampling=None):
+	""" make graphs only with NN, NNS, NNP, NNPS, keep hashtags, NER
+		nodes: the tokens 
+		edges: the NPMI values
+		make a graph for each day 
+		* keywords - only the tweets containing one of the keywords are used 
+		* time_buckets - TimeBuckets of date_range, a graph for each of its buckets instead, the files of each day are read once 
+		* stream - read the files of each day one tweet at a time, see IterDayTweets 
+		* prefetch - number of days whose files are read ahead on a background thread while a day is counted, 
+					 0 reads each day when it is needed, not used with stream 
+		* index_dir - directory of the cached per day keyword indexes, see IterKeywordTweets 
+		* sampling - {'max_tweets', 'seed'} to count a sample of at most max_tweets keyword tweets per timepoint, 
+					 see MakeEventTokenGraphsForDay 
+	"""
+	return MakeEventTokenGraphsRaw(date_range, data_dir, {None: keywords}, time_buckets, stream, prefetch, index_dir, sampling)[None]
+	
+	
+def MakeEventTokenGraphsRaw(date_range, data_dir, event_keywords, time_buckets=None, stream=False, prefetch=0, index_dir=None, sampling=None): 
+	""" MakeTokenGraphsRaw for several events in one pass over the files, see MakeEventTokenGraphsForDay 
+		* event_keywords - {event: keywords} 
+		* event_graphs - {event: (graphs, daily_tweet_counts)} 
+	"""
+	event_graphs = {event: (list(), list()) for event in event_keywords}
+	
+	if time_buckets is None: 
+		day_buckets = [(date, [(0, date)]) for date in date_range]
+		bucket_hours = 24 
+	else: 
+		assert list(date_range) == time_buckets.GetTimepoints(), 'date_range needs to be the timepoints of time_buckets!'
+		day_buckets = time_buckets.GetDayBuckets()
+		bucket_hours = time_buckets.bucket_hours 
+		
+	if stream or prefetch <= 0: 
+		# each day is read by MakeEventTokenGraphsForDay 
+		read_function, prefetch = (lambda date: None), 0 
+	else: 
+		# indexed .jsonl days only read the lines of the matching tweets, there is nothing to read ahead 
+		read_function = lambda date: None if index_dir is not None and GetDayFilePath(data_dir, DAY_FILE_PREFIXES[0], date).endswith('.jsonl') \
+			else ReadDayFiles(date, data_dir, with_hours=(bucket_hours < 24))
+
+	for (date, day_files), (_, buckets) in zip(PrefetchDays([date for date, _ in day_buckets], read_function, prefetch), day_buckets): 
+		event_graphs_of_day = MakeEventTokenGraphsForDay(date, data_dir, event_keywords, bucket_hours, stream, day_files, index_dir, sampling)
+		for event, (graphs_of_day, counts_of_day) in event_graphs_of_day.items(): 
+			graphs, daily_tweet_counts = event_graphs[event]
+			for bucket_idx, timepoint in buckets: 
+				graphs.append(graphs_of_day[bucket_idx])
+				daily_tweet_counts.append(counts_of_day[bucket_idx])
+		
+	return event_graphs 
 
 
 def AddRemovedNodesToClusters(graph, nodes_removed, clustering): 
 	""" check if the removed tokens are connected with existing clusters and add them back 
-		* modified_clustering - list of lists 
+		the clusters a removed token connects to are the nonzeros of its column in the cluster indicator matrix times 
+		the adjacency, restricted to the columns of the removed tokens 
+		* modified_clustering - list of lists, the tokens of each cluster followed by the removed tokens connected to it 
 	"""
-	modified_clustering = list() 
+	removed_tokens = list(dict.fromkeys(nodes_removed))
+	
+	# cluster indicator, clusters x clustered tokens 
+	token_to_idx = dict() 
+	indicator_rows = list() 
+	indicator_cols = list() 
+	for cluster_idx, cluster in enumerate(clustering): 
+		for token in cluster: 
+			indicator_rows.append(cluster_idx)
+			indicator_cols.append(token_to_idx.setdefault(token, len(token_to_idx)))
+	indicator = sp.csr_matrix((np.ones(len(indicator_rows)), (indicator_rows, indicator_cols)), shape=(len(clustering), len(token_to_idx)))
 	
-	for cluster in clustering: 
-		new_cluster = set()
-		for node in cluster: 
-			neighbors = set(graph.neighbors(node)) 
-			new_cluster.update(neighbors.intersection(nodes_removed))
+	# adjacency between the clustered tokens and the removed tokens, only the neighbors of the removed tokens are visited, 
+	# -1 for the neighbors in no cluster 
+	num_neighbors = [len(graph.adj[token]) for token in removed_tokens]
+	neighbor_idx = np.fromiter((token_to_idx.get(neighbor, -1) for token in removed_tokens for neighbor in graph.adj[token]), dtype=np.int64, count=sum(num_neighbors))
+	removed_idx = np.repeat(np.arange(len(removed_tokens)), num_neighbors)
+	clustered = neighbor_idx >= 0 
+	adjacency = sp.csr_matrix((np.ones(np.count_nonzero(clustered)), (neighbor_idx[clustered], removed_idx[clustered])), shape=(len(token_to_idx), len(removed_tokens)))
+	
+	connected = (indicator @ adjacency).tocsr() 
+	connected.sort_indices() 
+	removed_tokens = np.array(removed_tokens + [None], dtype=object)[:-1] # [None] keeps tuple tokens as elements 
+	modified_clustering = list() 
+	for cluster_idx, cluster in enumerate(clustering): 
+		connected_removed = removed_tokens[connected.indices[connected.indptr[cluster_idx]:connected.indptr[cluster_idx + 1]]].tolist()
+		modified_clustering.append(list(dict.fromkeys(list(cluster) + connected_removed)))
 		
-		new_cluster.update(cluster)
-		modified_clustering.append(list(new_cluster))
-
 	return modified_clustering 
 
 
-def RunClusteringMain(include_removed_nodes=False): 
+def MakeClusteringResults(g, include_removed_nodes=False, removal_fraction=0.2): 
+	""" cluster one weighted graph, output the metadata json of RunClusteringMain for that day 
+		* removal_fraction - largest fraction of the nodes removed while searching for the best clustering 
+	"""
+	# try 20% nodes removel 
+	num_nodes_20 = int(g.number_of_nodes() * removal_fraction) 
+	with Stage('find_optim_clustering'): 
+		modularity_vals, highest_modularity, best_nodes_removed, best_subgraph, best_clustering = FindOptimClustering(g, iteration=num_nodes_20)
+		RecordSizes(nodes=g.number_of_nodes(), edges=g.number_of_edges(), clusters=len(best_clustering), nodes_removed=len(best_nodes_removed))
+	
+	if include_removed_nodes: 
+		with Stage('add_removed_nodes'): 
+			best_clustering = AddRemovedNodesToClusters(g, best_nodes_removed, best_clustering)
+		
+	output_json = {'graph_nodes': dict(g.nodes.data()),
+				   'graph_edges': list(g.edges.data()),
+				   'best_subgraph': list(best_subgraph.nodes()), 
+				   'best_clustering': best_clustering, 
+				   'modularity_values': modularity_vals, 
+				   'modularity_best': highest_modularity, 
+				   'nodes_removed_best': best_nodes_removed, 
+				  }
+	return output_json 
+
+
+def RunClusteringMain(date_range, data_dir, result_dir, keywords, include_removed_nodes=False, time_buckets=None, stream=False, prefetch=0, index_dir=None, pruning=None, sampling=None, 
+					  processes=1): 
 	""" main function for running all the processes of clustering used in paper 
 		try running for 20% of the total nodes for removal, and find best among 20% tried 
 		dump metadata json output to result_dir
@@ -132,43 +458,101 @@ def RunClusteringMain(include_removed_nodes=False):
 			* best_clustering: list of lists with the best clustering 
 			* modularity_vluaes: a list of modularity values for all runs 
 			* nodes_removed_best: the list of removed nodes when model achieves best 
+		* time_buckets - TimeBuckets of date_range to cluster buckets shorter than a day, see MakeTokenGraphsRaw 
+		* stream - read the input files one tweet at a time instead of loading them 
+		* prefetch - number of days read ahead while a day is counted, see MakeTokenGraphsRaw 
+		* index_dir - directory of the cached keyword indexes, see MakeTokenGraphsRaw 
+		* pruning - rules removing rare tokens and pairs before clustering, see WeightAndPruneTokenGraph 
+		* sampling - count only a sample of the keyword tweets of each timepoint, see MakeTokenGraphsRaw 
+		* processes - number of worker processes clustering the timepoints, see ClusterTokenGraphs 
 	"""
 	# construct and load graph 
-	graphs, daily_tweet_counts = MakeTokenGraphsRaw()
+	graphs, daily_tweet_counts = MakeTokenGraphsRaw(date_range, data_dir, keywords, time_buckets, stream, prefetch, index_dir, sampling)
+	ClusterTokenGraphs(date_range, graphs, daily_tweet_counts, result_dir, include_removed_nodes, pruning, processes)
+	
+	
+def RunEventsClusteringMain(date_range, data_dir, result_dir, event_keywords, include_removed_nodes=False, time_buckets=None, stream=False, prefetch=0, index_dir=None, pruning=None, sampling=None, 
+							processes=1): 
+	""" RunClusteringMain for several events, the files are read once and the results of each event are written to result_dir/<event>/ 
+		* event_keywords - {event: keywords}, see LoadEventKeywords 
+	"""
+	event_graphs = MakeEventTokenGraphsRaw(date_range, data_dir, event_keywords, time_buckets, stream, prefetch, index_dir, sampling)
+	for event, (graphs, daily_tweet_counts) in event_graphs.items(): 
+		ClusterTokenGraphs(date_range, graphs, daily_tweet_counts, os.path.join(result_dir, event), include_removed_nodes, pruning, processes)
+		
+		
+def LoadEventKeywords(events_path): 
+	""" * event_keywords - {event: keywords} of a json file, the event names are used as directory names """
+	with open(events_path, 'r', encoding='utf-8') as textfile: 
+		event_keywords = json.load(textfile)
+	for event, keywords in event_keywords.items(): 
+		assert event and os.path.basename(event) == event and event not in ['.', '..'], 'event names need to be valid directory names: ' + event 
+		assert isinstance(keywords, list) and len(keywords) > 0, 'event ' + event + ' needs a list of keywords!'
+	return event_keywords 
+	
+	
+def _clusterSharedGraph(handle, graph_idx, date, output_path, include_removed_nodes, profile=None): 
+	""" worker of ClusterTokenGraphs, cluster one graph of a SharedGraphs block and write its results 
+		* profile - None, or {'track_memory'} to profile the stages of the worker as when clustering in the main process 
+		* records - the profiler records of the worker for MergeRecords, an empty list without profile 
+	"""
+	if profile is not None: 
+		EnableProfiling(track_memory=profile['track_memory'])
+	try: 
+		with Stage('cluster', day=date): 
+			output_json = MakeClusteringResults(AttachSharedGraphs(handle).GetGraph(graph_idx), include_removed_nodes)
+		with Stage('write_results', day=date): 
+			with open(output_path, 'w', encoding='utf-8') as textfile: 
+				json.dump(output_json, textfile, indent=2, ensure_ascii=True) 
+	finally: 
+		profiler = DisableProfiling() if profile is not None else None 
+	return list(profiler.records.values()) if profiler is not None else list()
+	
 	
+def ClusterTokenGraphs(date_range, graphs, daily_tweet_counts, result_dir, include_removed_nodes=False, pruning=None, processes=1): 
+	""" weight and cluster the token graphs of MakeTokenGraphsRaw, write the results of each timepoint to result_dir 
+		* pruning - rules removing rare tokens and pairs before clustering, see WeightAndPruneTokenGraph 
+		* processes - with more than 1, the timepoints are clustered by that many worker processes, the weighted graphs are put 
+					  in shared memory once and each worker rebuilds only the graphs it clusters, the results are the same. 
+					  the stages of the workers are merged into the report, their seconds add up to more than the wall time 
+					  of cluster_parallel, and the peak memory is the largest of a single worker 
+	"""
 	# add PMI edge weights to graph edges
 	total_num_tweets = sum(daily_tweet_counts)
-	for graph in graphs: 
-		ComputeEdgeWeights(graph, total_num_tweets)
+	for date, graph in zip(date_range, graphs): 
+		with Stage('edge_weights', day=date): 
+			WeightAndPruneTokenGraph(graph, total_num_tweets, pruning)
+			RecordSizes(nodes=graph.number_of_nodes(), edges=graph.number_of_edges())
 		
 	if not os.path.isdir(result_dir): 
-		os.mkdir(result_dir) 
+		os.makedirs(result_dir) 
+		
+	if processes > 1: 
+		suffix = '_results_meta_removed_included.json' if include_removed_nodes else '_results_meta.json'
+		profile = {'track_memory': IsTrackingMemory()} if IsProfiling() else None 
+		with Stage('cluster_parallel'): 
+			with SharedGraphs(graphs) as shared_graphs, multiprocessing.Pool(processes) as pool: 
+				tasks = [(shared_graphs.GetHandle(), i, date_range[i], os.path.join(result_dir, date_range[i] + suffix), include_removed_nodes, profile) for i in range(len(date_range))]
+				worker_records = pool.starmap(_clusterSharedGraph, tasks, chunksize=1)
+			RecordSizes(timepoints=len(date_range))
+		for records in worker_records: 
+			MergeRecords(records)
+		return 
 		
 	for i in range(len(date_range)): 
 		date = date_range[i] 
 		g = graphs[i] 
 		output_filename = date + '_results_meta.json'
-		
-		# try 20% nodes removel 
-		num_nodes_20 = int(g.number_of_nodes() * 0.2) 
-		modularity_vals, highest_modularity, best_nodes_removed, best_subgraph, best_clustering = FindOptimClustering(g, iteration=num_nodes_20)
-		
 		if include_removed_nodes: 
 			output_filename = date + '_results_meta_removed_included.json'
-			best_clustering = AddRemovedNodesToClusters(g, best_nodes_removed, best_clustering)
-			
-		output_json = {'graph_nodes': dict(g.nodes.data()),
-					   'graph_edges': list(g.edges.data()),
-					   'best_subgraph': list(best_subgraph.nodes()), 
-					   'best_clustering': best_clustering, 
-					   'modularity_values': modularity_vals, 
-					   'modularity_best': highest_modularity, 
-					   'nodes_removed_best': best_nodes_removed, 
-					  }
+		
+		with Stage('cluster', day=date): 
+			output_json = MakeClusteringResults(g, include_removed_nodes)
 
 		# save to disk 
-		with open(os.path.join(result_dir, output_filename), 'w', encoding='utf-8') as textfile: 
-			json.dump(output_json, textfile, indent=2, ensure_ascii=True) 
+		with Stage('write_results', day=date): 
+			with open(os.path.join(result_dir, output_filename), 'w', encoding='utf-8') as textfile: 
+				json.dump(output_json, textfile, indent=2, ensure_ascii=True) 
 
 
 def LoadClusteringResults(date_range, result_dir, include_removed_nodes=False):
@@ -211,15 +595,6 @@ if __name__=="__main__":
 	result_dir = '../data/results/'
 	figures_dir = '../data/figures/'
 	
-	# initialize date range for [0819, 0902]
-	date_range = list()
-	start = datetime.datetime.strptime("19-08-2020", "%d-%m-%Y")
-	end = datetime.datetime.strptime("03-09-2020", "%d-%m-%Y")
-	date_range_dt = [start + datetime.timedelta(days=x) for x in range(0, (end-start).days)]
-	for dt in date_range_dt:
-		str_date = str(dt.month).zfill(2) + str(dt.day).zfill(2) # pad casted string to 2 digit with leading 0s
-		date_range.append(str_date)
-		
 	# top hashtags selected (freq >= 5 across whole dataset) that are related to the covid event 
 	# refer to hashtag_freq.json
 	# note that fetching keyword purdue related contents are not included 
@@ -228,10 +603,36 @@ if __name__=="__main__":
 	# argument from commandline 
 	parser = argparse.ArgumentParser(description='clustering parameters')
 	parser.add_argument('--include_removed_nodes', type=bool, default=False, help='boolean to choose whether to include removed nodes in cluster results')
+	parser.add_argument('--stream', action='store_true', help='read the input files one tweet at a time, for days larger than the memory')
+	parser.add_argument('--prefetch', type=int, default=1, help='number of days read ahead on a background thread, 0 to disable')
+	parser.add_argument('--events', type=str, default=None, help='json file with {event: [keywords]}, cluster every event in one pass, the results go to result_dir/<event>/')
+	parser.add_argument('--index_dir', type=str, default=None, help='cache a token index of each day in this directory and only read the tweets with a keyword')
+	parser.add_argument('--processes', type=int, default=1, help='number of worker processes clustering the timepoints')
+	parser.add_argument('--profile', type=str, default=None, help='write a json report of the time and memory of each stage and day to this path')
+	parser.add_argument('--profile_memory', action='store_true', help='also trace python allocations in the report, slows the run down')
+	AddPruningArguments(parser)
+	AddSamplingArguments(parser)
+	AddTimeRangeArguments(parser)
 	args = parser.parse_args() 
 	
+	# date range [0819, 0902] by default, one timepoint per day or per --bucket_hours 
+	time_buckets = TimeBucketsFromArgs(args)
+	date_range = time_buckets.GetTimepoints()
+	
+	if args.profile is not None: 
+		EnableProfiling(track_memory=args.profile_memory)
+	
 	# run clusters 
-	RunClusteringMain(include_removed_nodes=args.include_removed_nodes)
+	if args.events is not None: 
+		RunEventsClusteringMain(date_range, data_dir, result_dir, LoadEventKeywords(args.events), include_removed_nodes=args.include_removed_nodes, time_buckets=time_buckets, 
+								stream=args.stream, prefetch=args.prefetch, index_dir=args.index_dir, pruning=PruningFromArgs(args), 
+								sampling=SamplingFromArgs(args), processes=args.processes)
+	else: 
+		RunClusteringMain(date_range, data_dir, result_dir, keywords, include_removed_nodes=args.include_removed_nodes, time_buckets=time_buckets, stream=args.stream, prefetch=args.prefetch, index_dir=args.index_dir, 
+						  pruning=PruningFromArgs(args), sampling=SamplingFromArgs(args), processes=args.processes)
+	
+	if args.profile is not None: 
+		WriteReport(args.profile)
 
 	# LoadClusteringResults(date_range, result_dir) 
 	
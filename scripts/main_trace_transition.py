@@ -3,14 +3,17 @@
 import os 
 import json
 import argparse
-import datetime
 import numpy as np
 import networkx as nx
 
 from main_run_clustering import LoadClusteringResults
 from cluster_transition_graph_config import ClusterNode, GraphEdge, Graph
 from pairwise_cluster_transition import FindMatchingClustersMain, MatchReappearingClusters
-from fuzzy_transition import MakeTransitionGraphFuzzy, ComputeFuzzySets
+from minhash_lsh import MakeMinHashParams, FindReappearCandidatesLSH
+from fuzzy_transition import MakeTransitionGraphFuzzy, SetFuzzyReappear, IterFuzzySetsBatch, ExtendTransitionGraphFuzzy, SetFuzzyReappearToLastTimepoint
+from transition_graph_io import SaveTransitionGraph, LoadTransitionGraph
+from instrumentation import Stage, RecordSizes, ProfileStage, EnableProfiling, WriteReport
+from time_buckets import AddTimeRangeArguments, TimeBucketsFromArgs
 
 
 # cluster id functions 
@@ -18,10 +21,12 @@ def GetClusterID(timepoint, cluster_idx):
 	return str(timepoint) + '_' + str(cluster_idx).zfill(2)
 
 def GetTimepointAndClusterIdx(node_id): 
-	node_id = node_id.split('_')
-	return node_id[0], int(node_id[1])
+	# split at the last '_', the timepoint labels may contain one 
+	timepoint, _, cluster_idx = node_id.rpartition('_')
+	return timepoint, int(cluster_idx)
 	
 	
+@ProfileStage('pairwise_crisp')
 def FindPairwiseTransitionsCrisp(date_range, clustering_by_timepoint, threshold_passed=2/3, threshold_criteria=2/3):
 	""" for each day's clustering, return the pairwise transition mapping 
 		* pairwise_date_to_transition_mapping - a dict: {timepoint_tuple: transition_dict}
@@ -49,6 +54,48 @@ def FindPairwiseTransitionsCrisp(date_range, clustering_by_timepoint, threshold_
 	return pairwise_date_to_transition_mapping
 
 
+def AddPairwiseTransitionEdges(transition_graph, timepoint1, timepoint2, transition_meta): 
+	""" add the edges of one pairwise transition mapping of FindPairwiseTransitionsCrisp to the transition graph """
+	unchanged_matching = transition_meta['unchanged'] 
+	absorbed_matching = transition_meta['absorbed']
+	split_matching = transition_meta['split']
+	dissolved_matching = transition_meta['dissolved']
+	merged_matching = transition_meta['merged']
+	
+	if len(unchanged_matching) > 0: 
+		for cl_a_idx, cl_b_idx in unchanged_matching.items(): 
+			cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
+			cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
+			transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='unchanged')
+
+	if len(absorbed_matching) > 0: 
+		for cl_a_idx, cl_b_idx in absorbed_matching.items(): 
+			cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
+			cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
+			transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='absorbed')
+
+	if len(split_matching) > 0: 
+		for cl_a_idx, cl_b_idxs in split_matching.items(): 
+			for cl_b_idx in cl_b_idxs:
+				cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
+				cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
+				transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='split')
+
+	if len(dissolved_matching) > 0: 
+		for cl_a_idx, cl_b_idx in dissolved_matching.items(): 
+			cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
+			cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
+			transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='dissolved')			
+
+	if len(merged_matching) > 0: 
+		for cl_a_idxs, cl_b_idx in merged_matching.items(): 
+			for cl_a_idx in cl_a_idxs:
+				cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
+				cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
+				transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='merged')
+
+
+@ProfileStage('make_transition_graph')
 def MakeTransitionGraph(date_range, clustering_by_timepoint, pairwise_date_to_transition_mapping):
 	""" make transition graph for 5 basic types of pairwise transitions: 
 			- unchanged, absorbed, split, dissplved, merged
@@ -66,51 +113,24 @@ def MakeTransitionGraph(date_range, clustering_by_timepoint, pairwise_date_to_tr
 			transition_graph.AddNode(cluster_elements, timepoint, cl_idx)
 
 	for (timepoint1, timepoint2), transition_meta in pairwise_date_to_transition_mapping.items(): 
-		unchanged_matching = transition_meta['unchanged'] 
-		absorbed_matching = transition_meta['absorbed']
-		split_matching = transition_meta['split']
-		dissolved_matching = transition_meta['dissolved']
-		merged_matching = transition_meta['merged']
-		
-		if len(unchanged_matching) > 0: 
-			for cl_a_idx, cl_b_idx in unchanged_matching.items(): 
-				cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
-				cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
-				transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='unchanged')
+		AddPairwiseTransitionEdges(transition_graph, timepoint1, timepoint2, transition_meta)
 
-		if len(absorbed_matching) > 0: 
-			for cl_a_idx, cl_b_idx in absorbed_matching.items(): 
-				cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
-				cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
-				transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='absorbed')
-
-		if len(split_matching) > 0: 
-			for cl_a_idx, cl_b_idxs in split_matching.items(): 
-				for cl_b_idx in cl_b_idxs:
-					cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
-					cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
-					transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='split')
-
-		if len(dissolved_matching) > 0: 
-			for cl_a_idx, cl_b_idx in dissolved_matching.items(): 
-				cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
-				cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
-				transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='dissolved')			
-
-		if len(merged_matching) > 0: 
-			for cl_a_idxs, cl_b_idx in merged_matching.items(): 
-				for cl_a_idx in cl_a_idxs:
-					cluster_1 = transition_graph.GetNodeByTimepointAndIndex(timepoint1, cl_a_idx)
-					cluster_2 = transition_graph.GetNodeByTimepointAndIndex(timepoint2, cl_b_idx)
-					transition_graph.AddDirectedEdge(cluster_1, cluster_2, type='merged')
-				
 	return transition_graph
 
 
-def AddReappearClusters(graph, timepoint_to_idx_mapping, threshold=1/2): 
+@ProfileStage('reappear_matching')
+def AddReappearClusters(graph, timepoint_to_idx_mapping, threshold=1/2, approximate=False, num_perm=128, lsh_bands=64): 
 	""" add reappearing clusters to the base pairwise transition graph 
 		reappear clusters are matched through the last cluster in pairwise sequence 
+		* approximate - only try matching at the timepoints where MinHash/LSH finds a candidate 
 	"""
+	if approximate: 
+		node_id_to_candidates = FindReappearCandidatesLSH(graph, list(timepoint_to_idx_mapping.keys()), MakeMinHashParams(num_perm), lsh_bands)
+	
+	# made once instead of for every unmatched node 
+	list_of_timepoint = list(timepoint_to_idx_mapping.keys())
+	timepoint_to_clustering = dict() # clustering of each timepoint b, made when first matched against 
+		
 	for current_timepoint, current_timepoint_idx in timepoint_to_idx_mapping.items():
 		for current_node in graph.GetNodesAtTimepoint(current_timepoint):
 			# if a node has outgoing neighbors, continue 
@@ -118,15 +138,25 @@ def AddReappearClusters(graph, timepoint_to_idx_mapping, threshold=1/2):
 				continue 
 			# if a node does not have outgoing neighbors, try to find a match 
 			else: 
-				current_cluster = current_node.GetElements() 
+				# clusters are compared by their vocabulary ids, the tokens are never decoded 
+				current_cluster = current_node.GetElementIDs().tolist() 
 				if current_timepoint_idx < len(timepoint_to_idx_mapping) - 3:
-					timepoints_after_current = list(timepoint_to_idx_mapping.keys())[current_timepoint_idx + 2:]
+					timepoints_after_current = list_of_timepoint[current_timepoint_idx + 2:]
 				
+					if approximate: 
+						candidate_timepoints = set(node.GetTimepoint() for _, node in node_id_to_candidates.get(current_node.GetID(), ()))
+					
 					for timepoint_b in timepoints_after_current:
-						clustering_b = list() # clustering b of the timepoint b
+						if approximate and timepoint_b not in candidate_timepoints: 
+							continue 
+						
+						if timepoint_b not in timepoint_to_clustering: 
+							clustering_b = list() # clustering b of the timepoint b
 
-						for clustering_b_node in graph.GetSortedNodesAtTimepoint(timepoint_b): 
-							clustering_b.append(clustering_b_node.GetElements())
+							for clustering_b_node in graph.GetSortedNodesAtTimepoint(timepoint_b): 
+								clustering_b.append(clustering_b_node.GetElementIDs().tolist())
+							timepoint_to_clustering[timepoint_b] = clustering_b 
+						clustering_b = timepoint_to_clustering[timepoint_b]
 
 						matching_idx = MatchReappearingClusters(current_cluster, clustering_b, threshold)
 
@@ -136,6 +166,46 @@ def AddReappearClusters(graph, timepoint_to_idx_mapping, threshold=1/2):
 							break
 
 
+def _hasLaterReappearNeighbor(node): 
+	for neighbor_id, edge in node.GetReappearNeighborsAndEdges(): 
+		if edge.GetNodeEnd().GetTimepointIndex() > node.GetTimepointIndex(): 
+			return True 
+	return False 
+	
+
+def AddReappearClustersToLastTimepoint(graph, threshold=1/2): 
+	""" AddReappearClusters after a new last timepoint is added to a graph that already has its reappear edges 
+		the nodes without a match were already compared with every earlier timepoint, so they are only matched 
+		to the last one, except for the timepoint that only now has enough timepoints after it 
+	"""
+	timepoints = graph.GetTimepoints()
+	last_idx = len(timepoints) - 1 
+	timepoint_to_clustering = dict() # clustering of each timepoint b as vocabulary ids, made when first matched against 
+	
+	# same condition as current_timepoint_idx < len(timepoint_to_idx_mapping) - 3 in AddReappearClusters 
+	for current_timepoint_idx in range(last_idx - 2): 
+		if current_timepoint_idx == last_idx - 3: 
+			timepoints_after_current = timepoints[current_timepoint_idx + 2:]
+		else: 
+			timepoints_after_current = timepoints[last_idx:]
+			
+		for current_node in graph.GetNodesAtTimepointIndex(current_timepoint_idx): 
+			if current_node.HasOutgoingNeighbors() or _hasLaterReappearNeighbor(current_node): 
+				continue 
+			
+			current_cluster = current_node.GetElementIDs().tolist() 
+			for timepoint_b in timepoints_after_current: 
+				if timepoint_b not in timepoint_to_clustering: 
+					timepoint_to_clustering[timepoint_b] = [clustering_b_node.GetElementIDs().tolist() for clustering_b_node in graph.GetSortedNodesAtTimepoint(timepoint_b)]
+				clustering_b = timepoint_to_clustering[timepoint_b]
+				matching_idx = MatchReappearingClusters(current_cluster, clustering_b, threshold)
+				
+				if matching_idx: 
+					matched_node = graph.GetNodeByTimepointAndIndex(timepoint_b, matching_idx)
+					graph.AddReappearEdge(current_node, matched_node)
+					break
+
+
 def MakeTransitionSubgraph(graph, clustering_by_timepoint, date_range, include_reappear=False, include_single_node_subgraph=False): 
 	""" Get all transition subgraphs from the transition grpah 
 		* all_transition_subgraphs - [Graph obj, ...]
@@ -158,7 +228,7 @@ def MakeTransitionSubgraph(graph, clustering_by_timepoint, date_range, include_r
 	return all_transition_subgraphs 
 
 
-def GetCrispTransitionSubgraphs(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=1/2, include_single_node_subgraph=False): 
+def GetCrispTransitionSubgraphs(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=1/2, include_single_node_subgraph=False, approximate=False): 
 	""" Similar to GetCrispTransitionTuples() but output different forms
 		Get all crisp transition subgraphs from the transition grpah 
 		* all_transition_subgraphs - [Graph obj, ...]
@@ -171,7 +241,7 @@ def GetCrispTransitionSubgraphs(clustering_by_timepoint, date_range, include_rea
 
 	if include_reappear: 
 		# add reappear clusters to base transition graph 
-		AddReappearClusters(transition_graph, timepoint_to_idx_mapping, threshold=reappear_threshold) 
+		AddReappearClusters(transition_graph, dict(zip(date_range, range(len(date_range)))), threshold=reappear_threshold, approximate=approximate) 
 		
 	# get all transition subgraphs with transition sequence length > 1
 	all_transition_subgraphs = MakeTransitionSubgraph(transition_graph, clustering_by_timepoint, date_range, include_reappear=include_reappear, include_single_node_subgraph=include_single_node_subgraph)
@@ -179,14 +249,8 @@ def GetCrispTransitionSubgraphs(clustering_by_timepoint, date_range, include_rea
 	return all_transition_subgraphs
 	
 	
-def GetCrispTransitionTuples(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=1/2): 
-	""" Similar to GetCrispTransitionSubgraphs but output different forms, cannot include single node
-		Find all crisp transitions, output a file containing tuples 
-		* list_of_node_tuples - to be consistent with fuzzy transition, tuple is in the following format: 
-			(cl_idx_1, cl_idx_2, transition_type, 'strong', 1) 
-	"""
-	list_of_node_tuples = list() 
-	
+def MakeCrispTransitionGraph(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=1/2, approximate=False): 
+	""" make the crisp transition graph used by GetCrispTransitionTuples, can be saved with transition_graph_io.SaveTransitionGraph """
 	# find pairwise transitions 
 	pairwise_date_to_transition_mapping = FindPairwiseTransitionsCrisp(date_range, clustering_by_timepoint)
 
@@ -195,8 +259,39 @@ def GetCrispTransitionTuples(clustering_by_timepoint, date_range, include_reappe
 
 	if include_reappear: 
 		# add reappear clusters to base transition graph 
-		AddReappearClusters(transition_graph, timepoint_to_idx_mapping, threshold=reappear_threshold) 
+		AddReappearClusters(transition_graph, dict(zip(date_range, range(len(date_range)))), threshold=reappear_threshold, approximate=approximate) 
+		
+	return transition_graph 
+	
+	
+def ExtendCrispTransitionGraph(transition_graph, timepoint, clustering, previous_clustering=None, include_reappear=True, reappear_threshold=1/2): 
+	""" add the clusters of a new timepoint after the last timepoint of a graph made by MakeCrispTransitionGraph, 
+		with the pairwise transitions from the last timepoint and the reappear transitions to the new one 
+		* previous_clustering - clustering of the last timepoint as it was clustered, taken from the graph if None 
+	"""
+	previous_timepoints = transition_graph.GetTimepoints()
+	assert timepoint not in previous_timepoints, 'timepoint already in graph'
+	transition_graph.AddTimepoint(timepoint)
+	for cl_idx in range(len(clustering)): 
+		transition_graph.AddNode(clustering[cl_idx], timepoint, cl_idx)
+		
+	if len(previous_timepoints) > 0: 
+		if previous_clustering is None: 
+			previous_clustering = [node.GetElements() for node in transition_graph.GetSortedNodesAtTimepoint(previous_timepoints[-1])]
+		transition_meta = FindMatchingClustersMain(previous_clustering, clustering)
+		AddPairwiseTransitionEdges(transition_graph, previous_timepoints[-1], timepoint, transition_meta)
+		
+	if include_reappear: 
+		AddReappearClustersToLastTimepoint(transition_graph, threshold=reappear_threshold)
 		
+	return transition_graph 
+	
+	
+@ProfileStage('crisp_tuples')
+def GetCrispTransitionTuplesFromGraph(transition_graph, date_range): 
+	""" output the tuples of GetCrispTransitionTuples from a crisp transition graph """
+	list_of_node_tuples = list() 
+	
 	for timepoint in date_range: 
 		for node in transition_graph.GetNodesAtTimepoint(timepoint): 
 			current_node_id = node.GetID() 
@@ -205,33 +300,84 @@ def GetCrispTransitionTuples(clustering_by_timepoint, date_range, include_reappe
 				transition_type = edge.GetEdgeType()
 				list_of_node_tuples.append((current_node_id, neighbor_id, transition_type, 'strong', 1))
 	
+	RecordSizes(tuples=len(list_of_node_tuples))
 	return list_of_node_tuples
 	
 	
-def GetFuzzyTransitionTuples(clustering_by_timepoint, date_range, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7]): 
-	"""	Find all fuzzy transitions, output a file containing tuples 
-		reappear transitions are not currently supported 
-		* list_of_node_tuples - tuple is in the following format: 
-			(cl_idx_1, cl_idx_2, transition_type, strength, membership_miu) 
+def GetCrispTransitionTuples(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=1/2, approximate=False): 
+	""" Similar to GetCrispTransitionSubgraphs but output different forms, cannot include single node
+		Find all crisp transitions, output a file containing tuples 
+		* list_of_node_tuples - to be consistent with fuzzy transition, tuple is in the following format: 
+			(cl_idx_1, cl_idx_2, transition_type, 'strong', 1) 
 	"""
+	transition_graph = MakeCrispTransitionGraph(clustering_by_timepoint, date_range, include_reappear, reappear_threshold, approximate)
+	return GetCrispTransitionTuplesFromGraph(transition_graph, date_range)
+	
+	
+def MakeFuzzyTransitionGraph(clustering_by_timepoint, date_range, include_reappear=False, reappear_max_gap=7, approximate=False): 
+	""" make the fuzzy transition graph used by GetFuzzyTransitionTuples, can be saved with transition_graph_io.SaveTransitionGraph 
+		the cores only need the number of intersecting elements, so the intersecting elements are not kept 
+	"""
+	transition_graph_fuzzy = MakeTransitionGraphFuzzy(date_range, clustering_by_timepoint, approximate=approximate, store_intersections=False)
+	
+	if include_reappear: 
+		SetFuzzyReappear(transition_graph_fuzzy, date_range, max_gap=reappear_max_gap, approximate=approximate)
+		
+	return transition_graph_fuzzy 
+	
+	
+def ExtendFuzzyTransitionGraph(transition_graph_fuzzy, timepoint, clustering, include_reappear=False, reappear_max_gap=7): 
+	""" add the clusters of a new timepoint after the last timepoint of a graph made by MakeFuzzyTransitionGraph """
+	ExtendTransitionGraphFuzzy(transition_graph_fuzzy, timepoint, clustering)
+	if include_reappear: 
+		SetFuzzyReappearToLastTimepoint(transition_graph_fuzzy, max_gap=reappear_max_gap)
+	return transition_graph_fuzzy 
+	
+	
+@ProfileStage('fuzzy_tuples')
+def GetFuzzyTransitionTuplesFromGraph(transition_graph_fuzzy, date_range, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7]): 
+	""" output the tuples of GetFuzzyTransitionTuples from a fuzzy transition graph """
 	assert len(fuzzy_limiter) == 4 and any(type(i) in [float, int] for i in fuzzy_limiter), 'fuzzy_limiter needs to be length 4 iterable with float!'
 	
 	list_of_node_tuples = list() 
 	
-	# make fuzzy transition graph 
-	transition_graph_fuzzy = MakeTransitionGraphFuzzy(date_range, clustering_by_timepoint)
-	
-	for timepoint in date_range: 
+	# collect all the cores first, then compute the fuzzy sets in one batch 
+	timepoint_to_idx_mapping = dict(zip(date_range, range(len(date_range))))
+	edge_keys = list() 
+	x_values = list() 
+	for timepoint_idx, timepoint in enumerate(date_range): 
 		for node in transition_graph_fuzzy.GetNodesAtTimepoint(timepoint): 
 			current_node_id = node.GetID() 
 			for neighbor_id, edge in node.GetOutgoingNeighborsAndEdges(): 
 				fuzzy_type_to_x_mapping = edge.GetFuzzytypes()
 				for fuzzy_type, x in fuzzy_type_to_x_mapping.items(): 
-					fuzzy_sets = ComputeFuzzySets(x, fuzzy_limiter[0], fuzzy_limiter[1], fuzzy_limiter[2], fuzzy_limiter[3])
-					for strength, miu in fuzzy_sets: 
-						list_of_node_tuples.append((current_node_id, neighbor_id, fuzzy_type, strength, miu))
+					edge_keys.append((current_node_id, neighbor_id, fuzzy_type))
+					x_values.append(x)
+			
+			# reappear edges are stored on both nodes, only take the forward ones 
+			for neighbor_id, edge in node.GetReappearNeighborsAndEdges(): 
+				if timepoint_idx < timepoint_to_idx_mapping[edge.GetNodeEnd().GetTimepoint()]: 
+					for fuzzy_type, x in edge.GetFuzzytypes().items(): 
+						edge_keys.append((current_node_id, neighbor_id, fuzzy_type))
+						x_values.append(x)
 	
+	for (current_node_id, neighbor_id, fuzzy_type), fuzzy_sets in zip(edge_keys, IterFuzzySetsBatch(x_values, fuzzy_limiter)): 
+		for strength, miu in fuzzy_sets: 
+			list_of_node_tuples.append((current_node_id, neighbor_id, fuzzy_type, strength, miu))
+	
+	RecordSizes(tuples=len(list_of_node_tuples))
 	return list_of_node_tuples 
+	
+	
+def GetFuzzyTransitionTuples(clustering_by_timepoint, date_range, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7], include_reappear=False, reappear_max_gap=7, approximate=False): 
+	"""	Find all fuzzy transitions, output a file containing tuples 
+		reappear transitions are added for timepoints 2 to reappear_max_gap apart if include_reappear 
+		approximate uses MinHash/LSH candidate pairs instead of the exact overlaps, see minhash_lsh.MeasureRecall 
+		* list_of_node_tuples - tuple is in the following format: 
+			(cl_idx_1, cl_idx_2, transition_type, strength, membership_miu) 
+	"""
+	transition_graph_fuzzy = MakeFuzzyTransitionGraph(clustering_by_timepoint, date_range, include_reappear, reappear_max_gap, approximate)
+	return GetFuzzyTransitionTuplesFromGraph(transition_graph_fuzzy, date_range, fuzzy_limiter)
 
 	
 if __name__=='__main__': 
@@ -242,47 +388,76 @@ if __name__=='__main__':
 	result_dir = '../data/results/'
 	figures_dir = '../data/figures/'
 
-	# initialize date range for [0819, 0902]
-	date_range = list()
-	start = datetime.datetime.strptime("19-08-2020", "%d-%m-%Y")
-	end = datetime.datetime.strptime("03-09-2020", "%d-%m-%Y")
-	date_range_dt = [start + datetime.timedelta(days=x) for x in range(0, (end-start).days)]
-	for dt in date_range_dt:
-		str_date = str(dt.month).zfill(2) + str(dt.day).zfill(2) # pad casted string to 2 digit with leading 0s
-		date_range.append(str_date)
-
 	# argument from commandline 
 	parser = argparse.ArgumentParser(description='cluster transition parameters')
 	parser.add_argument('--mode', type=str, default='crisp', help='choose whether transition mode is crisp or fuzzy')
 	parser.add_argument('--data', type=str, default='computer', help='choose whether computer generated data or human labeled data')
+	parser.add_argument('--fuzzy_reappear', action='store_true', help='add reappear transitions in fuzzy mode')
+	parser.add_argument('--reappear_max_gap', type=int, default=7, help='largest number of timepoints between fuzzy reappearing clusters')
+	parser.add_argument('--approximate', action='store_true', help='use MinHash/LSH candidate pairs instead of exact cluster overlaps')
+	parser.add_argument('--save_graph', action='store_true', help='save the transition graph to result_dir/<mode>_transition_graph')
+	parser.add_argument('--load_graph', action='store_true', help='load the transition graph saved with --save_graph instead of rebuilding it')
+	parser.add_argument('--event', type=str, default=None, help='trace the clustering results of this event of main_run_clustering.py --events, in result_dir/<event>/')
+	parser.add_argument('--profile', type=str, default=None, help='write a json report of the time and memory of each stage to this path')
+	parser.add_argument('--profile_memory', action='store_true', help='also trace python allocations in the report, slows the run down')
+	AddTimeRangeArguments(parser)
 	args = parser.parse_args() 
 	assert args.mode in ['crisp', 'fuzzy'], 'mode needs to be either "crisp" or "fuzzy"!'
 	assert args.data in ['computer', 'human'], 'data needs to be either "computer" or "human"!'
 
-	# timepoint to index mapping for date range 
-	timepoint_to_idx_mapping = dict(zip(date_range, range(len(date_range))))
+	# date range [0819, 0902] by default, the same arguments as main_run_clustering.py 
+	time_buckets = TimeBucketsFromArgs(args)
+	date_range = time_buckets.GetTimepoints()
+	
+	# the results and outputs of each event are in their own directory 
+	if args.event is not None: 
+		result_dir = os.path.join(result_dir, args.event)
+	
+	transition_graph_dir = os.path.join(result_dir, args.mode + '_transition_graph')
+	output_filename = args.mode + '_graph_tuples.json'
 	
-	# load graph and clustering results by day, choose to load either computer or human generated clusters 
-	if args.data == 'computer': 
-		graphs, clustering_by_timepoint, graphs_metadata = LoadClusteringResults(date_range, result_dir, include_removed_nodes=True)
-	
-	elif args.data == 'human': 
-		human_label_path = os.path.join(result_dir, 'tweet_label_sets.txt')
-		with open(human_label_path, 'r', encoding='utf-8') as textfile: 
-			date_to_labels_mapping = json.load(textfile)
-		clustering_by_timepoint = list(date_to_labels_mapping.values())
-	
-	# choose mode 
-	if args.mode == 'crisp':
-		# get all transition subgraphs with transition sequence length > 1
-		output_filename = 'crisp_graph_tuples.json'
-		list_of_node_tuples = GetCrispTransitionTuples(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=2/3)
+	if args.profile is not None: 
+		EnableProfiling(track_memory=args.profile_memory)
+	
+	if args.load_graph: 
+		# the saved graph already contains the transitions, no clustering results needed 
+		with Stage('load_graph'): 
+			transition_graph = LoadTransitionGraph(transition_graph_dir)
+		
+	else: 
+		# load graph and clustering results by day, choose to load either computer or human generated clusters 
+		if args.data == 'computer': 
+			with Stage('load_clustering_results'): 
+				graphs, clustering_by_timepoint, graphs_metadata = LoadClusteringResults(date_range, result_dir, include_removed_nodes=True)
+		
+		elif args.data == 'human': 
+			human_label_path = os.path.join(result_dir, 'tweet_label_sets.txt')
+			with open(human_label_path, 'r', encoding='utf-8') as textfile: 
+				date_to_labels_mapping = json.load(textfile)
+			clustering_by_timepoint = list(date_to_labels_mapping.values())
+		
+		# choose mode 
+		if args.mode == 'crisp':
+			# get all transition subgraphs with transition sequence length > 1
+			transition_graph = MakeCrispTransitionGraph(clustering_by_timepoint, date_range, include_reappear=True, reappear_threshold=2/3, approximate=args.approximate)
+				
+		elif args.mode == 'fuzzy': 
+			transition_graph = MakeFuzzyTransitionGraph(clustering_by_timepoint, date_range, include_reappear=args.fuzzy_reappear, reappear_max_gap=args.reappear_max_gap, approximate=args.approximate)
+			
+		if args.save_graph: 
+			with Stage('save_graph'): 
+				SaveTransitionGraph(transition_graph, transition_graph_dir)
 			
+	if args.mode == 'crisp': 
+		list_of_node_tuples = GetCrispTransitionTuplesFromGraph(transition_graph, date_range)
+		
 	elif args.mode == 'fuzzy': 
-		output_filename = 'fuzzy_graph_tuples.json'
-		list_of_node_tuples = GetFuzzyTransitionTuples(clustering_by_timepoint, date_range, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7])
+		list_of_node_tuples = GetFuzzyTransitionTuplesFromGraph(transition_graph, date_range, fuzzy_limiter=[0.3, 0.4, 0.6, 0.7])
 		
 	# output the transition tuples to file 
 	with open(os.path.join(result_dir, output_filename), 'w', encoding='utf-8') as textfile: 
 		json.dump(list_of_node_tuples, textfile, indent=2) 
+		
+	if args.profile is not None: 
+		WriteReport(args.profile)
 
@@ -4,6 +4,8 @@
 import networkx as nx 
 from networkx.algorithms.community import modularity as Modularity
 
+from instrumentation import Stage, RecordSizes, ProfileStage 
+
 # markov clustering github implementation 
 # https://github.com/GuyAllard/markov_clustering
 import markov_clustering as mc
@@ -20,7 +22,9 @@ def AdjacencyMatrix(graph):
 		
 def GetSortedClusteringCoeff(graph): 
 	""" sort tokens by lower to higher clustering coefficient"""
-	for token, coeff in sorted(nx.clustering(graph).items(), key=lambda x: x[1]):
+	with Stage('clustering_coefficients'): 
+		sorted_coeffs = sorted(nx.clustering(graph).items(), key=lambda x: x[1])
+	for token, coeff in sorted_coeffs:
 		yield token, coeff
 
 
@@ -47,6 +51,7 @@ def MakePermutationDict(input_dict, keys, current_key_idx, current_permutation,
 		MakePermutationDict(input_dict, keys, current_key_idx + 1, updated_permutation, output_permutations)
 		
 
+@ProfileStage('enforce_one_to_one')
 def EnforceOneToOneMapping(graph, token_clusters):
 	""" for isomophic clusters in MCL, try out all combinations 
 		find the best combination to enforce element with 1to1 cluster mapping 
@@ -74,6 +79,7 @@ def EnforceOneToOneMapping(graph, token_clusters):
 	# make permutations for the repeating tokens to get all combinations of the isomorphic clusters 
 	all_combinations = list()
 	MakePermutationDict(repeating_token_to_cluster, list(repeating_token_to_cluster.keys()), 0, {}, all_combinations)
+	RecordSizes(repeating_tokens=len(repeating_token_to_cluster), permutations=len(all_combinations))
 	
 	# update on the combination so none repeating dict remains unchanged 
 	for comb_dict in all_combinations: 
@@ -93,6 +99,7 @@ def EnforceOneToOneMapping(graph, token_clusters):
 	return best_clustering, max_modularity
 
 
+@ProfileStage('run_mcl')
 def RunMCL(graph): 
 	""" run markove clustering once """
 	# get adjacency matrix and mapping, then run mcl
@@ -116,6 +123,7 @@ def RunMCL(graph):
 	else: 
 		modularity = Modularity(graph, token_clusters)
 		
+	RecordSizes(nodes=graph.number_of_nodes(), clusters=len(token_clusters))
 	return token_clusters, modularity
 	
 
@@ -147,4 +155,5 @@ def FindOptimClustering(graph, iteration=100):
 		if num_nodes_removed > iteration: 
 			break 
 
+	RecordSizes(mcl_runs=len(modularity_vals))
 	return modularity_vals, highest_modularity, best_nodes_removed, best_subgraph, best_clustering
@@ -0,0 +1,210 @@
+# bash: python minhash_lsh.py --data computer/human --max_gap 7
+# approximate cluster similarity with MinHash sketches and LSH banding
+# MinHashSignatures, FindCandidatePairsLSH, FindReappearCandidatesLSH, ComputeCandidateRecall
+
+import os
+import json
+import argparse
+import numpy as np
+
+from cluster_transition_graph_config import Graph
+
+# mersenne prime for the universal hash functions (a * x + b) mod p, products stay inside uint64
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def MakeMinHashParams(num_perm=128, seed=0):
+	""" draw the parameters a, b of num_perm universal hash functions """
+	rng = np.random.RandomState(seed)
+	a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+	b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+	return a, b
+
+
+def MinHashSignature(element_ids, minhash_params):
+	""" compute the MinHash signature of one set of integer element ids, e.g. the vocabulary ids of ClusterNode.GetElementIDs
+		* signature - np array of num_perm values, all MERSENNE_PRIME for an empty set
+	"""
+	a, b = minhash_params
+	if len(element_ids) == 0:
+		return np.full(len(a), MERSENNE_PRIME, dtype=np.uint64)
+
+	hashes = np.asarray(element_ids).astype(np.uint64) % np.uint64(MERSENNE_PRIME)
+	permuted = (a[:, np.newaxis] * hashes[np.newaxis, :] + b[:, np.newaxis]) % np.uint64(MERSENNE_PRIME)
+	return permuted.min(axis=1)
+
+
+def MinHashSignatures(nodes, minhash_params):
+	""" compute the MinHash signatures of the element ids of ClusterNodes, the nodes need to share one vocabulary
+		* signatures - np array of shape (len(nodes), num_perm)
+	"""
+	signatures = np.empty((len(nodes), len(minhash_params[0])), dtype=np.uint64)
+	for i, node in enumerate(nodes):
+		signatures[i] = MinHashSignature(node.GetElementIDs(), minhash_params)
+	return signatures
+
+
+def _iterBandKeys(signature, bands):
+	""" split a signature into bands, yield hashable (band_idx, band_bytes) keys """
+	rows = len(signature) // bands
+	for band_idx in range(bands):
+		yield band_idx, signature[band_idx * rows:(band_idx + 1) * rows].tobytes()
+
+
+def MakeLSHBuckets(signatures, bands=64):
+	""" put each signature into one bucket per band
+		* buckets - {(band_idx, band_bytes): [row in signatures, ...]}
+	"""
+	assert signatures.shape[1] % bands == 0, 'number of permutations needs to be a multiple of bands!'
+	buckets = dict()
+
+	for row, signature in enumerate(signatures):
+		for band_key in _iterBandKeys(signature, bands):
+			if band_key not in buckets:
+				buckets[band_key] = list()
+			buckets[band_key].append(row)
+
+	return buckets
+
+
+def QueryLSHBuckets(buckets, signature, bands=64):
+	""" return the set of rows sharing at least one band with signature """
+	candidates = set()
+	for band_key in _iterBandKeys(signature, bands):
+		candidates.update(buckets.get(band_key, ()))
+	return candidates
+
+
+def FindCandidatePairsLSH(nodes_a, nodes_b, minhash_params, bands=64):
+	""" find candidate pairs between two lists of ClusterNodes with LSH banding
+		* position_to_candidates - {position in nodes_a: sorted [position in nodes_b, ...]}
+	"""
+	signatures_a = MinHashSignatures(nodes_a, minhash_params)
+	signatures_b = MinHashSignatures(nodes_b, minhash_params)
+	buckets = MakeLSHBuckets(signatures_b, bands)
+
+	position_to_candidates = dict()
+	for pos_a in range(len(nodes_a)):
+		candidates = QueryLSHBuckets(buckets, signatures_a[pos_a], bands)
+		if len(candidates) > 0:
+			position_to_candidates[pos_a] = sorted(candidates)
+
+	return position_to_candidates
+
+
+def FindReappearCandidatesLSH(transition_graph, list_of_timepoint, minhash_params, bands=64, max_gap=None):
+	""" find candidate pairs of nodes 2 to max_gap timepoints apart with one LSH index over all timepoints
+		* node_id_to_candidates - {node_id: [(timepoint_idx, node), ...] ordered by timepoint and cluster index}
+	"""
+	all_nodes = list() # [(timepoint_idx, node), ...]
+	for timepoint_idx, timepoint in enumerate(list_of_timepoint):
+		for node in transition_graph.GetNodesAtTimepoint(timepoint):
+			all_nodes.append((timepoint_idx, node))
+
+	signatures = MinHashSignatures([node for _, node in all_nodes], minhash_params)
+	buckets = MakeLSHBuckets(signatures, bands)
+
+	node_id_to_candidates = dict()
+	for row, (timepoint_idx, node) in enumerate(all_nodes):
+		candidates = list()
+		for candidate_row in QueryLSHBuckets(buckets, signatures[row], bands):
+			candidate_timepoint_idx, candidate_node = all_nodes[candidate_row]
+			gap = candidate_timepoint_idx - timepoint_idx
+			if gap >= 2 and (max_gap is None or gap <= max_gap):
+				candidates.append((candidate_timepoint_idx, candidate_node))
+
+		if len(candidates) > 0:
+			node_id_to_candidates[node.GetID()] = sorted(candidates, key=lambda c: (c[0], c[1].GetIndex()))
+
+	return node_id_to_candidates
+
+
+def ComputeCandidateRecall(exact_pairs, approximate_pairs):
+	""" recall of the approximate pairs against the exact pairs, 1 if there is no exact pair """
+	exact_pairs = set(exact_pairs)
+	if len(exact_pairs) == 0:
+		return 1
+	return len(exact_pairs.intersection(approximate_pairs)) / len(exact_pairs)
+
+
+def MeasureRecall(list_of_timepoint, clustering_by_timepoint, num_perm=128, bands=64, max_gap=7, jaccard_thresholds=[0, 0.1, 0.2, 1/3, 0.5]):
+	""" compare the approximate mode against the exact mode on one clustering sequence
+		pairs are the overlapping clusters of adjacent timepoints and of timepoints 2 to max_gap apart
+		* recall_report - {'adjacent': {threshold: recall, ...}, 'reappear': {...}, 'num_pairs': {...}}
+			-- recall at threshold t only counts the exact pairs with jaccard >= t
+	"""
+	transition_graph = Graph()
+	for i, timepoint in enumerate(list_of_timepoint):
+		for cl_idx, cluster_elements in enumerate(clustering_by_timepoint[i]):
+			transition_graph.AddNode(cluster_elements, timepoint, cl_idx)
+
+	minhash_params = MakeMinHashParams(num_perm)
+
+	exact_pairs = {'adjacent': dict(), 'reappear': dict()} # {kind: {(node_id_1, node_id_2): jaccard}}
+	approximate_pairs = {'adjacent': set(), 'reappear': set()}
+
+	# exact pairs, by brute force so that the reference does not depend on any index
+	all_nodes = [list(transition_graph.GetNodesAtTimepoint(timepoint)) for timepoint in list_of_timepoint]
+	for i in range(len(list_of_timepoint)):
+		last_idx = len(list_of_timepoint) - 1 if max_gap is None else min(len(list_of_timepoint) - 1, i + max_gap)
+		for j in range(i + 1, last_idx + 1):
+			kind = 'adjacent' if j == i + 1 else 'reappear'
+			for node_a in all_nodes[i]:
+				for node_b in all_nodes[j]:
+					num_intersection = len(np.intersect1d(node_a.GetElementIDs(), node_b.GetElementIDs(), assume_unique=True))
+					if num_intersection > 0:
+						jaccard = num_intersection / (node_a.GetSize() + node_b.GetSize() - num_intersection)
+						exact_pairs[kind][(node_a.GetID(), node_b.GetID())] = jaccard
+
+	for i in range(len(list_of_timepoint) - 1):
+		candidates = FindCandidatePairsLSH(all_nodes[i], all_nodes[i + 1], minhash_params, bands)
+		for pos_a, positions_b in candidates.items():
+			for pos_b in positions_b:
+				approximate_pairs['adjacent'].add((all_nodes[i][pos_a].GetID(), all_nodes[i + 1][pos_b].GetID()))
+
+	for node_id, candidates in FindReappearCandidatesLSH(transition_graph, list_of_timepoint, minhash_params, bands, max_gap).items():
+		for _, candidate_node in candidates:
+			approximate_pairs['reappear'].add((node_id, candidate_node.GetID()))
+
+	recall_report = {'adjacent': dict(), 'reappear': dict(), 'num_pairs': dict()}
+	for kind in ['adjacent', 'reappear']:
+		recall_report['num_pairs'][kind] = {'exact': len(exact_pairs[kind]), 'approximate': len(approximate_pairs[kind])}
+		for threshold in jaccard_thresholds:
+			pairs_above = [pair for pair, jaccard in exact_pairs[kind].items() if jaccard >= threshold]
+			recall_report[kind][threshold] = ComputeCandidateRecall(pairs_above, approximate_pairs[kind])
+
+	return recall_report
+
+
+if __name__=='__main__':
+
+	from main_run_clustering import LoadClusteringResults
+	from time_buckets import AddTimeRangeArguments, TimeBucketsFromArgs
+
+	# constants
+	result_dir = '../data/results/'
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='recall of the approximate MinHash/LSH mode against the exact mode')
+	parser.add_argument('--data', type=str, default='computer', help='choose whether computer generated data or human labeled data')
+	parser.add_argument('--num_perm', type=int, default=128, help='number of MinHash permutations')
+	parser.add_argument('--lsh_bands', type=int, default=64, help='number of LSH bands, needs to divide num_perm')
+	parser.add_argument('--max_gap', type=int, default=7, help='largest number of timepoints between reappearing clusters')
+	AddTimeRangeArguments(parser)
+	args = parser.parse_args()
+	assert args.data in ['computer', 'human'], 'data needs to be either "computer" or "human"!'
+
+	# date range [0819, 0902] by default
+	date_range = TimeBucketsFromArgs(args).GetTimepoints()
+
+	if args.data == 'computer':
+		graphs, clustering_by_timepoint, graphs_metadata = LoadClusteringResults(date_range, result_dir, include_removed_nodes=True)
+
+	elif args.data == 'human':
+		human_label_path = os.path.join(result_dir, 'tweet_label_sets.txt')
+		with open(human_label_path, 'r', encoding='utf-8') as textfile:
+			date_to_labels_mapping = json.load(textfile)
+		clustering_by_timepoint = list(date_to_labels_mapping.values())
+
+	recall_report = MeasureRecall(date_range, clustering_by_timepoint, num_perm=args.num_perm, bands=args.lsh_bands, max_gap=args.max_gap)
+	print(json.dumps(recall_report, indent=2))
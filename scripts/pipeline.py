@@ -0,0 +1,424 @@
+# bash: python pipeline.py --targets render_crisp render_fuzzy --include_removed_nodes
+# run the workflow as a DAG of cached stages: ingest -> weights -> cluster -> trace_crisp/trace_fuzzy -> render_crisp/render_fuzzy
+# every artifact is stored under cache_dir/<stage>/<key>/, key hashes the stage code, its parameters and the content of its inputs,
+# so a rerun only recomputes the stages and days whose inputs changed. the outputs are then copied to result_dir and figures_dir
+# under the names main_run_clustering.py, main_trace_transition.py and the notebook use
+# RunPipeline, ArtifactCache, STAGE_DEPENDENCIES
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import networkx as nx
+
+from main_run_clustering import MakeTokenGraphsForDay, WeightAndPruneTokenGraph, MakeClusteringResults, GetDayFilePath, DAY_FILE_PREFIXES, PRUNING_DEFAULTS, AddPruningArguments, PruningFromArgs
+from main_trace_transition import MakeCrispTransitionGraph, GetCrispTransitionTuplesFromGraph, MakeFuzzyTransitionGraph, GetFuzzyTransitionTuplesFromGraph
+from transition_visualization import TransitionViz
+from instrumentation import Stage, EnableProfiling, WriteReport
+from time_buckets import AddTimeRangeArguments, TimeBucketsFromArgs
+from sampling import SAMPLING_DEFAULTS, AddSamplingArguments, SamplingFromArgs
+from shared_graphs import EdgesInNeighborOrder
+
+# bump when the layout of the artifacts changes, invalidates the whole cache
+PIPELINE_FORMAT_VERSION = 2
+
+STAGE_DEPENDENCIES = {'ingest': [],
+					  'weights': ['ingest'],
+					  'cluster': ['weights'],
+					  'trace_crisp': ['cluster'],
+					  'trace_fuzzy': ['cluster'],
+					  'render_crisp': ['trace_crisp'],
+					  'render_fuzzy': ['trace_fuzzy']}
+STAGE_ORDER = ['ingest', 'weights', 'cluster', 'trace_crisp', 'trace_fuzzy', 'render_crisp', 'render_fuzzy']
+
+# source files whose code decides the output of each stage, a change in any of them invalidates the stage
+STAGE_SOURCES = {'ingest': ['main_run_clustering.py', 'shared_graphs.py', 'time_buckets.py', 'json_stream.py', 'keyword_index.py', 'sampling.py'],
+				 'weights': ['main_run_clustering.py', 'shared_graphs.py'],
+				 'cluster': ['main_run_clustering.py', 'mcl_with_removal.py'],
+				 'trace_crisp': ['main_trace_transition.py', 'pairwise_cluster_transition.py', 'cluster_transition_graph_config.py', 'minhash_lsh.py'],
+				 'trace_fuzzy': ['main_trace_transition.py', 'fuzzy_transition.py', 'cluster_transition_graph_config.py', 'minhash_lsh.py'],
+				 'render_crisp': ['transition_visualization.py', 'json_stream.py'],
+				 'render_fuzzy': ['transition_visualization.py', 'json_stream.py']}
+
+DEFAULT_PARAMS = {'ingest': {'keywords': ['#protectpurdue', '#covid19', '#coronavirus', '#inthistogether', '#covid', '#maskup', '#flu', '#pandemic', '#healthforall', '#masks'],
+							'sampling': dict(SAMPLING_DEFAULTS)},
+				  'weights': dict(PRUNING_DEFAULTS),
+				  'cluster': {'removal_fraction': 0.2, 'include_removed_nodes': False},
+				  'trace_crisp': {'include_reappear': True, 'reappear_threshold': 2/3, 'approximate': False},
+				  'trace_fuzzy': {'include_reappear': False, 'reappear_max_gap': 7, 'approximate': False, 'fuzzy_limiter': [0.3, 0.4, 0.6, 0.7]},
+				  'render_crisp': {'format': None, 'pages': 'all', 'window_size': 7, 'max_nodes': None, 'min_membership': 0},
+				  'render_fuzzy': {'format': None, 'pages': 'all', 'window_size': 7, 'max_nodes': None, 'min_membership': 0}}
+
+ARTIFACT_MARKER = '_artifact.json'
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def HashBytes(*chunks):
+	hasher = hashlib.sha256()
+	for chunk in chunks:
+		hasher.update(chunk)
+	return hasher.hexdigest()
+
+
+def HashJSON(obj):
+	""" hash of a json serializable object, independent of the order of dict keys """
+	return HashBytes(json.dumps(obj, sort_keys=True).encode('utf-8'))
+
+
+def HashFile(file_path, chunk_size=1 << 20):
+	hasher = hashlib.sha256()
+	with open(file_path, 'rb') as binfile:
+		for chunk in iter(lambda: binfile.read(chunk_size), b''):
+			hasher.update(chunk)
+	return hasher.hexdigest()
+
+
+class ArtifactCache(object):
+	""" content addressed store of stage artifacts, each artifact is a directory cache_dir/<stage>/<key>/
+		the marker file is written last and the directory is moved into place in one rename, so an interrupted
+		stage never leaves a partial artifact behind
+	"""
+	def __init__(self, cache_dir):
+		self.cache_dir = cache_dir
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		# hashes of the input files by (size, mtime), so unchanged raw files are not read again
+		self.file_hashes_path = os.path.join(cache_dir, 'file_hashes.json')
+		self.file_hashes = dict()
+		if os.path.isfile(self.file_hashes_path):
+			with open(self.file_hashes_path, 'r', encoding='utf-8') as textfile:
+				self.file_hashes = json.load(textfile)
+		self.code_hashes = dict()
+
+	def GetFileHash(self, file_path):
+		file_path = os.path.abspath(file_path)
+		stat = os.stat(file_path)
+		memo = self.file_hashes.get(file_path)
+		if memo is not None and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+			return memo[2]
+		file_hash = HashFile(file_path)
+		self.file_hashes[file_path] = [stat.st_size, stat.st_mtime_ns, file_hash]
+		return file_hash
+
+	def GetCodeHash(self, stage):
+		if stage not in self.code_hashes:
+			self.code_hashes[stage] = HashJSON([self.GetFileHash(os.path.join(SCRIPTS_DIR, filename)) for filename in STAGE_SOURCES[stage]])
+		return self.code_hashes[stage]
+
+	def MakeKey(self, stage, params, inputs):
+		""" * key - hash of the pipeline format, library versions, stage code, params and the hashes of the inputs """
+		return HashJSON({'format': PIPELINE_FORMAT_VERSION,
+						 'environment': [np.__version__, nx.__version__],
+						 'stage': stage,
+						 'code': self.GetCodeHash(stage),
+						 'params': params,
+						 'inputs': inputs})
+
+	def GetArtifactDir(self, stage, key):
+		return os.path.join(self.cache_dir, stage, key)
+
+	def GetArtifact(self, stage, key):
+		""" * marker - {'key', 'output_hash', 'info', 'files'} of a complete artifact, None if there is none """
+		marker_path = os.path.join(self.GetArtifactDir(stage, key), ARTIFACT_MARKER)
+		if not os.path.isfile(marker_path):
+			return None
+		with open(marker_path, 'r', encoding='utf-8') as textfile:
+			return json.load(textfile)
+
+	def PutArtifact(self, stage, key, write_function):
+		""" write_function(artifact_dir) writes the output files and returns a json serializable info dict
+			* marker - see GetArtifact, output_hash hashes the content of every output file
+		"""
+		artifact_dir = self.GetArtifactDir(stage, key)
+		tmp_dir = artifact_dir + '.tmp' + str(os.getpid())
+		if os.path.isdir(tmp_dir):
+			shutil.rmtree(tmp_dir)
+		os.makedirs(tmp_dir)
+
+		info = write_function(tmp_dir)
+		filenames = sorted(os.listdir(tmp_dir))
+		file_hashes = [HashFile(os.path.join(tmp_dir, filename)) for filename in filenames]
+		marker = {'key': key, 'output_hash': HashJSON([filenames, file_hashes]), 'info': info, 'files': filenames}
+		with open(os.path.join(tmp_dir, ARTIFACT_MARKER), 'w', encoding='utf-8') as textfile:
+			json.dump(marker, textfile, indent=2)
+
+		if os.path.isdir(artifact_dir): # left over without a marker, or written by a concurrent run
+			shutil.rmtree(artifact_dir)
+		os.replace(tmp_dir, artifact_dir)
+		return marker
+
+	def Prune(self, stage, keep_keys):
+		""" remove the artifacts of stage that are not in keep_keys, returns the number removed """
+		stage_dir = os.path.join(self.cache_dir, stage)
+		if not os.path.isdir(stage_dir):
+			return 0
+		num_removed = 0
+		for key in os.listdir(stage_dir):
+			if key not in keep_keys:
+				shutil.rmtree(os.path.join(stage_dir, key), ignore_errors=True)
+				num_removed += 1
+		return num_removed
+
+	def Save(self):
+		with open(self.file_hashes_path, 'w', encoding='utf-8') as textfile:
+			json.dump(self.file_hashes, textfile)
+
+
+def GetStagesToRun(targets):
+	""" the targets and all the stages they depend on, in execution order """
+	needed = set()
+	stack = list(targets)
+	while len(stack) > 0:
+		stage = stack.pop()
+		assert stage in STAGE_DEPENDENCIES, 'unknown stage: ' + str(stage)
+		if stage not in needed:
+			needed.add(stage)
+			stack.extend(STAGE_DEPENDENCIES[stage])
+	return [stage for stage in STAGE_ORDER if stage in needed]
+
+
+def _edgesInAdjacencyOrder(graph):
+	""" the edges with their data in an order that, added one by one to a graph with the same nodes, gives every node its
+		neighbors in the same order as in graph, see shared_graphs.EdgesInNeighborOrder
+	"""
+	return [(u, v, graph.edges[u, v]) for u, v, _ in EdgesInNeighborOrder(graph.adjacency())]
+
+
+def _writeTokenGraph(file_path, graph, **extra):
+	""" same graph_nodes/graph_edges layout as the results of RunClusteringMain, with the edges in adjacency order """
+	with open(file_path, 'w', encoding='utf-8') as textfile:
+		json.dump(dict(graph_nodes=dict(graph.nodes.data()), graph_edges=_edgesInAdjacencyOrder(graph), **extra), textfile)
+
+
+def _loadTokenGraph(file_path):
+	with open(file_path, 'r', encoding='utf-8') as textfile:
+		content = json.load(textfile)
+	graph = nx.Graph()
+	graph.add_nodes_from(content['graph_nodes'].items())
+	graph.add_edges_from(content['graph_edges'])
+	return graph
+
+
+def _loadBestClustering(file_path):
+	with open(file_path, 'r', encoding='utf-8') as textfile:
+		return json.load(textfile)['best_clustering']
+
+
+class _PipelineRun(object):
+	""" state of one RunPipeline call """
+	def __init__(self, cache, date_range, data_dir, params, force, time_buckets=None, stream=False):
+		self.cache = cache
+		self.date_range = date_range
+		self.stream = stream # only changes how the inputs are read, not part of the keys
+		# token index of each day, a change of the keywords reingests every day but only reads the matching tweets
+		self.index_dir = os.path.join(cache.cache_dir, 'tweet_index')
+		self.bucket_hours = 24 if time_buckets is None else time_buckets.bucket_hours
+		# ingest runs once per day of the input files, the later stages once per timepoint
+		if time_buckets is None:
+			self.day_buckets = [(date, [(0, date)]) for date in date_range]
+		else:
+			assert list(date_range) == time_buckets.GetTimepoints(), 'date_range needs to be the timepoints of time_buckets!'
+			self.day_buckets = time_buckets.GetDayBuckets()
+		self.timepoint_to_day = {timepoint: day for day, buckets in self.day_buckets for _, timepoint in buckets}
+		self.data_dir = data_dir
+		self.params = params
+		self.force = set(force)
+		self.artifacts = dict() # {stage: {unit: marker}}, unit is a day or 'all'
+		self.records = dict() # {stage: {unit: {'key', 'status', 'seconds'}}}
+
+	def RunUnit(self, stage, unit, inputs, write_function):
+		""" reuse the artifact of (stage, unit) if its key is in the cache, otherwise compute it """
+		key = self.cache.MakeKey(stage, self.params[stage], inputs)
+		marker = None if stage in self.force else self.cache.GetArtifact(stage, key)
+		start = time.perf_counter()
+		status = 'cached'
+		if marker is None:
+			with Stage('pipeline_' + stage, day=unit if unit != 'all' else None):
+				marker = self.cache.PutArtifact(stage, key, write_function)
+			status = 'computed'
+		self.artifacts.setdefault(stage, dict())[unit] = marker
+		self.records.setdefault(stage, dict())[unit] = {'key': key, 'status': status, 'seconds': time.perf_counter() - start}
+		return marker
+
+	def GetPath(self, stage, unit, filename):
+		return os.path.join(self.cache.GetArtifactDir(stage, self.artifacts[stage][unit]['key']), filename)
+
+	def RunIngest(self):
+		prefixes = DAY_FILE_PREFIXES + (['time_pu_'] if self.bucket_hours < 24 else [])
+		for day, buckets in self.day_buckets:
+			inputs = [self.bucket_hours, buckets, [self.cache.GetFileHash(GetDayFilePath(self.data_dir, prefix, day)) for prefix in prefixes]]
+			def writeIngest(artifact_dir, day=day, buckets=buckets):
+				graphs, tweet_counts = MakeTokenGraphsForDay(day, self.data_dir, self.params['ingest']['keywords'], self.bucket_hours, self.stream, index_dir=self.index_dir,
+													   sampling=self.params['ingest']['sampling'])
+				for bucket_idx, timepoint in buckets:
+					_writeTokenGraph(os.path.join(artifact_dir, 'token_graph_' + timepoint + '.json'), graphs[bucket_idx])
+				return {'num_tweets': {timepoint: tweet_counts[bucket_idx] for bucket_idx, timepoint in buckets}}
+			self.RunUnit('ingest', day, inputs, writeIngest)
+
+	def RunWeights(self):
+		# the NPMI weights are normalized by the number of tweets of the whole date range
+		ingest_artifacts = self.artifacts['ingest']
+		total_num_tweets = sum(ingest_artifacts[self.timepoint_to_day[date]]['info']['num_tweets'][date] for date in self.date_range)
+		for date in self.date_range:
+			day = self.timepoint_to_day[date]
+			inputs = [ingest_artifacts[day]['output_hash'], date, total_num_tweets]
+			def writeWeights(artifact_dir, date=date, day=day):
+				graph = _loadTokenGraph(self.GetPath('ingest', day, 'token_graph_' + date + '.json'))
+				removed = WeightAndPruneTokenGraph(graph, total_num_tweets, self.params['weights'])
+				_writeTokenGraph(os.path.join(artifact_dir, 'token_graph.json'), graph)
+				return {'num_nodes': graph.number_of_nodes(), 'num_edges': graph.number_of_edges(), 'removed': removed}
+			self.RunUnit('weights', date, inputs, writeWeights)
+
+	def RunCluster(self):
+		for date in self.date_range:
+			inputs = [self.artifacts['weights'][date]['output_hash']]
+			def writeCluster(artifact_dir, date=date):
+				graph = _loadTokenGraph(self.GetPath('weights', date, 'token_graph.json'))
+				output_json = MakeClusteringResults(graph, self.params['cluster']['include_removed_nodes'], self.params['cluster']['removal_fraction'])
+				with open(os.path.join(artifact_dir, 'results_meta.json'), 'w', encoding='utf-8') as textfile:
+					json.dump(output_json, textfile, indent=2, ensure_ascii=True)
+				return {'num_clusters': len(output_json['best_clustering'])}
+			self.RunUnit('cluster', date, inputs, writeCluster)
+
+	def RunTrace(self, mode):
+		stage = 'trace_' + mode
+		inputs = [self.date_range, [self.artifacts['cluster'][date]['output_hash'] for date in self.date_range]]
+		def writeTrace(artifact_dir):
+			clustering_by_timepoint = [_loadBestClustering(self.GetPath('cluster', date, 'results_meta.json')) for date in self.date_range]
+			params = self.params[stage]
+			if mode == 'crisp':
+				transition_graph = MakeCrispTransitionGraph(clustering_by_timepoint, self.date_range, params['include_reappear'], params['reappear_threshold'], params['approximate'])
+				list_of_node_tuples = GetCrispTransitionTuplesFromGraph(transition_graph, self.date_range)
+			else:
+				transition_graph = MakeFuzzyTransitionGraph(clustering_by_timepoint, self.date_range, params['include_reappear'], params['reappear_max_gap'], params['approximate'])
+				list_of_node_tuples = GetFuzzyTransitionTuplesFromGraph(transition_graph, self.date_range, params['fuzzy_limiter'])
+			with open(os.path.join(artifact_dir, mode + '_graph_tuples.json'), 'w', encoding='utf-8') as textfile:
+				json.dump(list_of_node_tuples, textfile, indent=2)
+			return {'num_tuples': len(list_of_node_tuples)}
+		self.RunUnit(stage, 'all', inputs, writeTrace)
+
+	def RunRender(self, mode):
+		stage = 'render_' + mode
+		inputs = [self.date_range, self.artifacts['trace_' + mode]['all']['output_hash']]
+		def writeRender(artifact_dir):
+			params = self.params[stage]
+			TransitionViz(self.GetPath('trace_' + mode, 'all', mode + '_graph_tuples.json'), os.path.join(artifact_dir, mode + '_graph_tuples.dot'), self.date_range,
+						  format=params['format'], pages=params['pages'], window_size=params['window_size'], max_nodes=params['max_nodes'], min_membership=params['min_membership'])
+			return {}
+		self.RunUnit(stage, 'all', inputs, writeRender)
+
+	def Publish(self, result_dir, figures_dir):
+		""" copy the outputs to the file names the other scripts and the notebook read """
+		for stage, unit_to_marker in self.artifacts.items():
+			for unit, marker in unit_to_marker.items():
+				if stage == 'cluster' and result_dir is not None:
+					suffix = '_results_meta_removed_included.json' if self.params['cluster']['include_removed_nodes'] else '_results_meta.json'
+					destinations = [(self.GetPath(stage, unit, 'results_meta.json'), os.path.join(result_dir, unit + suffix))]
+				elif stage.startswith('trace_') and result_dir is not None:
+					filename = stage[len('trace_'):] + '_graph_tuples.json'
+					destinations = [(self.GetPath(stage, unit, filename), os.path.join(result_dir, filename))]
+				elif stage.startswith('render_') and figures_dir is not None:
+					destinations = [(self.GetPath(stage, unit, filename), os.path.join(figures_dir, filename)) for filename in marker['files']]
+				else:
+					continue
+				for src, dst in destinations:
+					if not os.path.isdir(os.path.dirname(dst)):
+						os.makedirs(os.path.dirname(dst))
+					shutil.copyfile(src, dst)
+
+
+def RunPipeline(date_range, data_dir, cache_dir, result_dir=None, figures_dir=None, targets=('render_crisp', 'render_fuzzy'), params=None, force=(), prune=False, time_buckets=None, stream=False):
+	""" run the stages needed for targets, reusing every cached artifact whose inputs did not change
+		* time_buckets - TimeBuckets with the timepoints date_range, for buckets shorter than a day, see main_run_clustering.MakeTokenGraphsRaw
+		* params - {stage: {param: value}} overriding DEFAULT_PARAMS
+		* force - stages recomputed even if cached, their downstream stages are only recomputed if the output changes
+		* prune - remove the cached artifacts of the run stages that this run did not use
+		* stream - ingest the input files one tweet at a time, see main_run_clustering.IterDayTweets
+		* summary - {'stages': {stage: {unit: {'key', 'status', 'seconds'}}}, 'computed': n, 'cached': n}
+	"""
+	stage_params = {stage: dict(stage_defaults) for stage, stage_defaults in DEFAULT_PARAMS.items()}
+	for stage, overrides in (params or dict()).items():
+		assert stage in stage_params, 'unknown stage: ' + str(stage)
+		stage_params[stage].update(overrides)
+
+	cache = ArtifactCache(cache_dir)
+	run = _PipelineRun(cache, date_range, data_dir, stage_params, force, time_buckets, stream)
+	stages = GetStagesToRun(targets)
+	try:
+		for stage in stages:
+			if stage == 'ingest':
+				run.RunIngest()
+			elif stage == 'weights':
+				run.RunWeights()
+			elif stage == 'cluster':
+				run.RunCluster()
+			elif stage.startswith('trace_'):
+				run.RunTrace(stage[len('trace_'):])
+			elif stage.startswith('render_'):
+				run.RunRender(stage[len('render_'):])
+	finally:
+		cache.Save()
+
+	run.Publish(result_dir, figures_dir)
+	if prune:
+		for stage in stages:
+			cache.Prune(stage, set(record['key'] for record in run.records[stage].values()))
+
+	summary = {'stages': run.records,
+			   'computed': sum(record['status'] == 'computed' for records in run.records.values() for record in records.values()),
+			   'cached': sum(record['status'] == 'cached' for records in run.records.values() for record in records.values())}
+	with open(os.path.join(cache_dir, 'last_run.json'), 'w', encoding='utf-8') as textfile:
+		json.dump(summary, textfile, indent=2)
+	return summary
+
+
+if __name__=='__main__':
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='pipeline parameters')
+	parser.add_argument('--data_dir', type=str, default='../data/processed/', help='directory of the processed, POS and NER files')
+	parser.add_argument('--result_dir', type=str, default='../data/results/', help='directory the clustering results and transition tuples are copied to')
+	parser.add_argument('--figures_dir', type=str, default='../data/figures/', help='directory the rendered transition graphs are copied to')
+	parser.add_argument('--cache_dir', type=str, default='../data/cache/', help='directory of the cached stage artifacts')
+	parser.add_argument('--targets', type=str, nargs='+', default=['render_crisp', 'render_fuzzy'], help='stages to bring up to date: ' + ', '.join(STAGE_ORDER))
+	parser.add_argument('--force', type=str, nargs='*', default=[], help='stages to recompute even if cached')
+	parser.add_argument('--include_removed_nodes', action='store_true', help='add the removed nodes back to the clusters')
+	parser.add_argument('--fuzzy_reappear', action='store_true', help='add reappear transitions in fuzzy mode')
+	parser.add_argument('--reappear_max_gap', type=int, default=7, help='largest number of timepoints between fuzzy reappearing clusters')
+	parser.add_argument('--approximate', action='store_true', help='use MinHash/LSH candidate pairs instead of exact cluster overlaps')
+	parser.add_argument('--format', type=str, default=None, help='also render the DOT files to this image format with graphviz')
+	parser.add_argument('--pages', type=str, default='all', help='"all", "window" or "subgraph", see transition_visualization.TransitionViz')
+	parser.add_argument('--stream', action='store_true', help='read the input files one tweet at a time, for days larger than the memory')
+	parser.add_argument('--prune', action='store_true', help='remove the cached artifacts this run did not use')
+	parser.add_argument('--profile', type=str, default=None, help='write a json report of the time and memory of each computed stage to this path')
+	AddPruningArguments(parser)
+	AddSamplingArguments(parser)
+	AddTimeRangeArguments(parser)
+	args = parser.parse_args()
+
+	# same date range and timepoints as main_run_clustering.py
+	time_buckets = TimeBucketsFromArgs(args)
+	date_range = time_buckets.GetTimepoints()
+
+	params = {'ingest': {'sampling': SamplingFromArgs(args)},
+			  'weights': PruningFromArgs(args),
+			  'cluster': {'include_removed_nodes': args.include_removed_nodes},
+			  'trace_crisp': {'approximate': args.approximate},
+			  'trace_fuzzy': {'include_reappear': args.fuzzy_reappear, 'reappear_max_gap': args.reappear_max_gap, 'approximate': args.approximate},
+			  'render_crisp': {'format': args.format, 'pages': args.pages},
+			  'render_fuzzy': {'format': args.format, 'pages': args.pages}}
+
+	if args.profile is not None:
+		EnableProfiling()
+
+	summary = RunPipeline(date_range, args.data_dir, args.cache_dir, args.result_dir, args.figures_dir, args.targets, params, args.force, args.prune, time_buckets, args.stream)
+
+	if args.profile is not None:
+		WriteReport(args.profile)
+
+	for stage, unit_to_record in summary['stages'].items():
+		num_computed = sum(record['status'] == 'computed' for record in unit_to_record.values())
+		print('{:<16}{:>4} computed{:>4} cached'.format(stage, num_computed, len(unit_to_record) - num_computed))
@@ -0,0 +1,64 @@
+# read the inputs of the next days on a background thread while the current day is processed
+# PrefetchDays, ReadFileBytes
+#
+# the thread only reads, file reads release the GIL so they overlap with the graph construction,
+# decoding the json on the thread would hold the GIL and take turns with the counting instead
+
+import queue
+import threading
+
+_DONE = object()
+
+
+def ReadFileBytes(file_path):
+	with open(file_path, 'rb') as binfile:
+		return binfile.read()
+
+
+def PrefetchDays(days, read_function, depth=1):
+	""" yield (day, read_function(day)) for each day in order, read up to depth days ahead of the day being processed
+		memory is bounded by the depth days waiting plus the day being read, depth 0 reads each day when it is needed
+		an exception of read_function is raised when its day is reached
+	"""
+	if depth <= 0:
+		for day in days:
+			yield day, read_function(day)
+		return
+
+	prefetched = queue.Queue(maxsize=depth)
+	stop = threading.Event()
+
+	def put(item):
+		# wait for a free slot, unless the consumer stopped early
+		while not stop.is_set():
+			try:
+				prefetched.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				continue
+		return False
+
+	def worker():
+		try:
+			for day in days:
+				if not put((day, read_function(day), None)):
+					return
+		except BaseException as error:
+			put((None, None, error))
+			return
+		put(_DONE)
+
+	thread = threading.Thread(target=worker, name='prefetch', daemon=True)
+	thread.start()
+	try:
+		while True:
+			item = prefetched.get()
+			if item is _DONE:
+				return
+			day, content, error = item
+			if error is not None:
+				raise error
+			yield day, content
+	finally:
+		stop.set()
+		thread.join()
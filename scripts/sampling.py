@@ -0,0 +1,169 @@
+# bash: python sampling.py --max_tweets 2000 --output ../data/results/sampling_report.json
+# deterministic sample of the keyword tweets of each timepoint, for days with too many tweets to count every token pair
+# BottomKSample, SamplePriority, ScaleSampledGraph, MeasureSamplingDeviation, AddSamplingArguments, SamplingFromArgs
+#
+# every keyword tweet gets a pseudo random priority from a hash of its timepoint and position, the max_tweets tweets with
+# the lowest priorities are counted: a uniform sample without replacement that is the same in every run, with or without
+# the keyword index, and that does not depend on the other events of the run. a tweet whose priority is above the kept
+# ones is not tokenized at all. the counts of a sampled graph are scaled by the sampling rate, so the NPMI weights
+# estimate the weights of the full graph, run this script to measure how far the weights and clusters are off
+
+import json
+import time
+import heapq
+import hashlib
+import argparse
+import numpy as np
+
+# sampling of main_run_clustering.MakeTokenGraphsRaw, the defaults count every tweet
+SAMPLING_DEFAULTS = {'max_tweets': None, 'seed': 0}
+
+
+def SamplePriority(seed, *key):
+	""" pseudo random priority in [0, 1) of the tweet identified by key, e.g. (day, bucket, position) """
+	digest = hashlib.blake2b(repr((seed,) + key).encode('utf-8'), digest_size=8).digest()
+	return int.from_bytes(digest, 'big') / (1 << 64)
+
+
+class BottomKSample(object):
+	""" the max_items items with the lowest priorities of the items added """
+	def __init__(self, max_items):
+		assert max_items > 0, 'max_items needs to be positive!'
+		self.max_items = max_items
+		self.heap = list() # max heap of (-priority, position, item)
+		self.num_added = 0
+
+	def __len__(self):
+		return len(self.heap)
+
+	def Accepts(self, priority):
+		""" whether an item with priority would be kept so far, check before making an expensive item """
+		return len(self.heap) < self.max_items or priority < -self.heap[0][0]
+
+	def Add(self, priority, item):
+		self.num_added += 1
+		if len(self.heap) < self.max_items:
+			heapq.heappush(self.heap, (-priority, self.num_added, item))
+		elif priority < -self.heap[0][0]:
+			heapq.heapreplace(self.heap, (-priority, self.num_added, item))
+
+	def GetItems(self):
+		""" the kept items in the order they were added """
+		return [item for _, position, item in sorted(self.heap, key=lambda entry: entry[1])]
+
+
+def ScaleSampledGraph(graph, num_tweets, num_sampled):
+	""" scale the freq of the nodes and edges of a graph counted on num_sampled of num_tweets tweets to estimates of
+		the counts on all num_tweets, the sampling rate is kept in graph.graph['sample_rate']
+	"""
+	graph.graph['sample_rate'] = num_sampled / num_tweets if num_tweets > 0 else 1
+	if num_sampled == num_tweets:
+		return
+	scale = num_tweets / num_sampled
+	for token, data in graph.nodes(data=True):
+		data['freq'] *= scale
+	for token1, token2, data in graph.edges(data=True):
+		data['freq'] *= scale
+
+
+def _compareWeights(full_graph, sampled_graph):
+	""" NPMI weights of the sampled graph against the full graph, on the edges of the full graph """
+	errors = [sampled_graph.edges[token1, token2]['weight'] - w for token1, token2, w in full_graph.edges(data='weight') if sampled_graph.has_edge(token1, token2)]
+	errors = np.array(errors, dtype=np.float64)
+	return {'edges': full_graph.number_of_edges(),
+			'edges_kept': len(errors) / full_graph.number_of_edges() if full_graph.number_of_edges() > 0 else 1,
+			'weight_mean_error': float(errors.mean()) if len(errors) > 0 else 0,
+			'weight_mean_abs_error': float(np.abs(errors).mean()) if len(errors) > 0 else 0,
+			'weight_max_abs_error': float(np.abs(errors).max()) if len(errors) > 0 else 0}
+
+
+def _compareClusterings(full_clustering, sampled_clustering):
+	""" each cluster of the full clustering against its most similar sampled cluster, the mean jaccard is weighted by the cluster sizes """
+	token_to_sampled = dict()
+	for cluster_idx, cluster in enumerate(sampled_clustering):
+		for token in cluster:
+			token_to_sampled.setdefault(token, list()).append(cluster_idx)
+
+	sum_jaccard = 0
+	num_tokens = 0
+	for cluster in full_clustering:
+		cluster = set(cluster)
+		best_jaccard = 0
+		for cluster_idx in set(idx for token in cluster for idx in token_to_sampled.get(token, ())):
+			num_intersection = len(cluster.intersection(sampled_clustering[cluster_idx]))
+			best_jaccard = max(best_jaccard, num_intersection / (len(cluster) + len(sampled_clustering[cluster_idx]) - num_intersection))
+		sum_jaccard += best_jaccard * len(cluster)
+		num_tokens += len(cluster)
+	return {'clusters': len(full_clustering), 'sampled_clusters': len(sampled_clustering),
+			'tokens_kept': len(set(token_to_sampled).intersection(token for cluster in full_clustering for token in cluster)) / num_tokens if num_tokens > 0 else 1,
+			'mean_best_jaccard': sum_jaccard / num_tokens if num_tokens > 0 else 1}
+
+
+def MeasureSamplingDeviation(list_of_timepoint, full_graphs, sampled_graphs, full_clusterings, sampled_clusterings):
+	""" how far the weighted graphs and clusterings of a sampled run are from the run on all tweets
+		* full_graphs, sampled_graphs - graphs with the NPMI weights of each timepoint
+		* full_clusterings, sampled_clusterings - best clustering of each timepoint
+		* report - {timepoint: {'sample_rate', 'weights': {'edges', 'edges_kept', 'weight_mean_error', 'weight_mean_abs_error', 'weight_max_abs_error'},
+								'clusters': {'clusters', 'sampled_clusters', 'tokens_kept', 'mean_best_jaccard'}}}
+	"""
+	report = dict()
+	for timepoint, full_graph, sampled_graph, full_clustering, sampled_clustering in zip(list_of_timepoint, full_graphs, sampled_graphs, full_clusterings, sampled_clusterings):
+		report[timepoint] = {'sample_rate': sampled_graph.graph.get('sample_rate', 1),
+							 'weights': _compareWeights(full_graph, sampled_graph),
+							 'clusters': _compareClusterings(full_clustering, sampled_clustering)}
+	return report
+
+
+def AddSamplingArguments(parser):
+	""" add --max_tweets and --sample_seed to an argparse parser """
+	parser.add_argument('--max_tweets', type=int, default=None, help='count at most this many keyword tweets per timepoint, a deterministic sample of the others')
+	parser.add_argument('--sample_seed', type=int, default=0, help='seed of the sample of --max_tweets')
+
+
+def SamplingFromArgs(args):
+	""" sampling of the arguments added by AddSamplingArguments, see main_run_clustering.MakeTokenGraphsRaw """
+	return {'max_tweets': args.max_tweets, 'seed': args.sample_seed}
+
+
+if __name__=='__main__':
+
+	from main_run_clustering import MakeTokenGraphsRaw, WeightAndPruneTokenGraph, MakeClusteringResults, AddPruningArguments, PruningFromArgs
+	from time_buckets import AddTimeRangeArguments, TimeBucketsFromArgs
+	from synthetic_data import DEFAULT_KEYWORDS
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='deviation of the weights and clusters of a sampled run from the run on all tweets')
+	parser.add_argument('--data_dir', type=str, default='../data/processed/', help='directory of the processed, POS and NER files')
+	parser.add_argument('--index_dir', type=str, default=None, help='directory of the cached keyword indexes, see main_run_clustering.py')
+	parser.add_argument('--output', type=str, default=None, help='write the report as json to this path')
+	AddSamplingArguments(parser)
+	AddPruningArguments(parser)
+	AddTimeRangeArguments(parser)
+	args = parser.parse_args()
+	assert args.max_tweets is not None, 'set --max_tweets to compare a sampled run!'
+
+	time_buckets = TimeBucketsFromArgs(args)
+	date_range = time_buckets.GetTimepoints()
+
+	runs = dict()
+	for run, sampling in [('full', None), ('sampled', SamplingFromArgs(args))]:
+		start = time.perf_counter()
+		graphs, daily_tweet_counts = MakeTokenGraphsRaw(date_range, args.data_dir, DEFAULT_KEYWORDS, time_buckets, index_dir=args.index_dir, sampling=sampling)
+		build_seconds = time.perf_counter() - start
+		clusterings = list()
+		for graph in graphs:
+			WeightAndPruneTokenGraph(graph, sum(daily_tweet_counts), PruningFromArgs(args))
+			clusterings.append(MakeClusteringResults(graph)['best_clustering'])
+		runs[run] = {'graphs': graphs, 'clusterings': clusterings, 'build_seconds': build_seconds, 'seconds': time.perf_counter() - start}
+
+	report = {'sampling': SamplingFromArgs(args),
+			  'seconds': {run: {'build_graphs': runs[run]['build_seconds'], 'total': runs[run]['seconds']} for run in runs},
+			  'timepoints': MeasureSamplingDeviation(date_range, runs['full']['graphs'], runs['sampled']['graphs'], runs['full']['clusterings'], runs['sampled']['clusterings'])}
+
+	if args.output is not None:
+		with open(args.output, 'w', encoding='utf-8') as textfile:
+			json.dump(report, textfile, indent=2)
+	for timepoint, deviation in report['timepoints'].items():
+		print('{}  rate {:.3f}  weight error {:.4f} (max {:.4f})  edges kept {:.3f}  cluster jaccard {:.3f}'.format(timepoint, deviation['sample_rate'],
+			  deviation['weights']['weight_mean_abs_error'], deviation['weights']['weight_max_abs_error'], deviation['weights']['edges_kept'], deviation['clusters']['mean_best_jaccard']))
+	print('build graphs {:.2f}s -> {:.2f}s'.format(report['seconds']['full']['build_graphs'], report['seconds']['sampled']['build_graphs']))
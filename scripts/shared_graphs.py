@@ -0,0 +1,197 @@
+# token graphs of all timepoints in one shared memory block as CSR arrays, for worker processes clustering the timepoints
+# SharedGraphs, AttachSharedGraphs, GraphToCSRArrays, CSRArraysToGraph, EdgesInNeighborOrder
+#
+# a worker attaches to the block by name with the small handle of SharedGraphs.GetHandle and reads the arrays of its
+# timepoint without a copy, no networkx graph is pickled. only the graph of the timepoint it clusters is rebuilt, with the
+# nodes and neighbors in the original order, so the clustering is the same to the last bit.
+# the owner unlinks the block when it is closed or on exit, and if the owner is killed the resource tracker of
+# multiprocessing unlinks it
+
+import atexit
+import numpy as np
+import networkx as nx
+from multiprocessing import shared_memory
+
+# tokens are joined into one utf-8 blob, as in transition_graph_io
+TOKEN_SEPARATOR = '\x00'
+# offset alignment of the arrays in the block
+ALIGNMENT = 8
+
+# blocks attached by this process, {name: SharedMemory}
+_attached = dict()
+
+
+def GraphToCSRArrays(graph):
+	""" arrays of a token graph in its node order, each row has the neighbors in the order of graph.adjacency()
+		* arrays - {'vocabulary_blob', 'indptr', 'indices', 'node_<attribute>', 'edge_<attribute>'},
+				   the edge attributes have one value per entry of indices, so every edge is stored twice
+		* attributes - (node attribute names, edge attribute names) in the order of the attribute dicts
+	"""
+	tokens = list(graph.nodes())
+	for token in tokens:
+		assert TOKEN_SEPARATOR not in str(token), 'token contains the separator character'
+	token_to_idx = {token: idx for idx, token in enumerate(tokens)}
+	node_attributes = list(graph.nodes[tokens[0]].keys()) if len(tokens) > 0 else list()
+	edge_attributes = list(next(iter(graph.edges.values()))) if graph.number_of_edges() > 0 else list()
+
+	indptr = np.zeros(len(tokens) + 1, dtype=np.int64)
+	indices = list()
+	edge_values = {name: list() for name in edge_attributes}
+	for idx, (token, neighbors) in enumerate(graph.adjacency()):
+		indptr[idx + 1] = indptr[idx] + len(neighbors)
+		for neighbor, data in neighbors.items():
+			indices.append(token_to_idx[neighbor])
+			for name in edge_attributes:
+				edge_values[name].append(data[name])
+
+	arrays = {'vocabulary_blob': np.frombuffer(TOKEN_SEPARATOR.join(str(token) for token in tokens).encode('utf-8'), dtype=np.uint8),
+			  'indptr': indptr,
+			  'indices': np.array(indices, dtype=np.int32)}
+	for name in node_attributes:
+		# int counts stay int64, scaled counts of a sampled graph and weights are float64
+		arrays['node_' + name] = np.array([data[name] for token, data in graph.nodes(data=True)])
+	for name in edge_attributes:
+		arrays['edge_' + name] = np.array(edge_values[name])
+	return arrays, (node_attributes, edge_attributes)
+
+
+def EdgesInNeighborOrder(rows):
+	""" the edges of an undirected graph in an order that, added one by one to a graph with the same nodes, gives every node
+		its neighbors in the order of its row. float sums over the neighbors, e.g. the degrees used by the modularity, then
+		match the original graph to the last bit
+		* rows - (node, neighbors) of every node in node order, e.g. graph.adjacency()
+		* edges - [(node, neighbor, entry), ...] each edge once, as first seen in the rows, entry is its position among
+				  the neighbors of all rows, e.g. its position in the indices of a CSR matrix
+	"""
+	pair_to_edge = dict()
+	edges = list()
+	entry_edges = list() # edge of each entry
+	row_ends = list()
+	for node, neighbors in rows:
+		for neighbor in neighbors:
+			edge = pair_to_edge.get((node, neighbor))
+			if edge is None:
+				edge = len(edges)
+				pair_to_edge[(node, neighbor)] = edge
+				pair_to_edge[(neighbor, node)] = edge
+				edges.append((node, neighbor, len(entry_edges)))
+			entry_edges.append(edge)
+		row_ends.append(len(entry_edges))
+
+	# each edge has to come after the edge before it in the rows of both its nodes
+	num_predecessors = [0] * len(edges)
+	successors = [list() for _ in range(len(edges))]
+	row_start = 0
+	for row_end in row_ends:
+		for entry in range(row_start + 1, row_end):
+			successors[entry_edges[entry - 1]].append(entry_edges[entry])
+			num_predecessors[entry_edges[entry]] += 1
+		row_start = row_end
+
+	order = [edge for edge in range(len(edges)) if num_predecessors[edge] == 0]
+	for edge in order: # order grows while iterating
+		for successor in successors[edge]:
+			num_predecessors[successor] -= 1
+			if num_predecessors[successor] == 0:
+				order.append(successor)
+	return [edges[edge] for edge in order]
+
+
+def CSRArraysToGraph(arrays, attributes):
+	""" the networkx graph of GraphToCSRArrays, same node order, neighbor order and attribute values """
+	node_attributes, edge_attributes = attributes
+	num_nodes = len(arrays['indptr']) - 1
+	tokens = bytes(arrays['vocabulary_blob']).decode('utf-8').split(TOKEN_SEPARATOR) if num_nodes > 0 else list()
+	indptr = arrays['indptr'].tolist()
+	indices = arrays['indices'].tolist()
+	node_values = [arrays['node_' + name].tolist() for name in node_attributes]
+	edge_values = [arrays['edge_' + name].tolist() for name in edge_attributes]
+
+	graph = nx.Graph()
+	node_rows = zip(*node_values) if len(node_values) > 0 else [()] * num_nodes
+	graph.add_nodes_from((token, dict(zip(node_attributes, values))) for token, values in zip(tokens, node_rows))
+	rows = ((node_idx, indices[indptr[node_idx]:indptr[node_idx + 1]]) for node_idx in range(num_nodes))
+	graph.add_edges_from((tokens[node_idx], tokens[neighbor_idx], {name: values[entry] for name, values in zip(edge_attributes, edge_values)})
+						 for node_idx, neighbor_idx, entry in EdgesInNeighborOrder(rows))
+	return graph
+
+
+class SharedGraphs(object):
+	""" the CSR arrays of several graphs in one shared memory block owned by this process, a context that unlinks the block """
+	def __init__(self, graphs):
+		list_of_arrays = list()
+		layouts = list()
+		size = 0
+		for graph in graphs:
+			arrays, attributes = GraphToCSRArrays(graph)
+			layout = {'attributes': attributes, 'arrays': dict()}
+			for name, array in arrays.items():
+				size = (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+				layout['arrays'][name] = (array.dtype.str, size, array.shape)
+				size += array.nbytes
+			list_of_arrays.append(arrays)
+			layouts.append(layout)
+
+		self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+		self.closed = False
+		atexit.register(self.Close)
+		try:
+			for arrays, layout in zip(list_of_arrays, layouts):
+				for name, (dtype, offset, shape) in layout['arrays'].items():
+					np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)[...] = arrays[name]
+		except BaseException:
+			self.Close()
+			raise
+		self.handle = {'name': self.shm.name, 'layouts': layouts}
+
+	def __len__(self):
+		return len(self.handle['layouts'])
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.Close()
+		return False
+
+	def GetHandle(self):
+		""" * handle - {'name', 'layouts'}, small and picklable, for AttachSharedGraphs in the workers """
+		return self.handle
+
+	def Close(self):
+		""" release and unlink the block, the workers need to be done with it """
+		if self.closed:
+			return
+		self.closed = True
+		atexit.unregister(self.Close)
+		self.shm.close()
+		self.shm.unlink()
+
+
+class AttachedGraphs(object):
+	""" the graphs of a SharedGraphs block attached in a worker """
+	def __init__(self, handle, shm):
+		self.layouts = handle['layouts']
+		self.shm = shm
+
+	def __len__(self):
+		return len(self.layouts)
+
+	def GetArrays(self, graph_idx):
+		""" read only views of the CSR arrays of one graph in the block, see GraphToCSRArrays """
+		arrays = dict()
+		for name, (dtype, offset, shape) in self.layouts[graph_idx]['arrays'].items():
+			arrays[name] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+			arrays[name].flags.writeable = False
+		return arrays
+
+	def GetGraph(self, graph_idx):
+		""" the networkx graph of one graph in the block """
+		return CSRArraysToGraph(self.GetArrays(graph_idx), self.layouts[graph_idx]['attributes'])
+
+
+def AttachSharedGraphs(handle):
+	""" attach to the block of handle, once per process, the block stays attached until the process exits """
+	if handle['name'] not in _attached:
+		_attached[handle['name']] = shared_memory.SharedMemory(name=handle['name'])
+	return AttachedGraphs(handle, _attached[handle['name']])
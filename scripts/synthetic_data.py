@@ -0,0 +1,123 @@
+# bash: python synthetic_data.py --data_dir ../data/synthetic/ --days 15 --tweets_per_day 2000 --vocab_size 5000
+# synthetic tweets with POS and NER tags in the layout of the processed data, for benchmarks
+# GenerateSyntheticData, MakeSyntheticDateRange
+
+import os
+import json
+import argparse
+import datetime
+import numpy as np
+
+# filler tokens with a POS tag that MakeTokenGraphsRaw drops
+FILLER_POS = ['VB', 'VBD', 'JJ', 'RB', 'DT', 'IN', 'PRP']
+NOUN_POS = ['NN', 'NNS', 'NNP', 'NNPS']
+NER_TAGS = ['PERSON', 'LOCATION', 'ORGANIZATION']
+DEFAULT_KEYWORDS = ['#protectpurdue', '#covid19', '#coronavirus', '#inthistogether', '#covid', '#maskup', '#flu', '#pandemic', '#healthforall', '#masks']
+
+
+def MakeSyntheticDateRange(num_days, start='19-08-2020'):
+	""" MMDD timepoints of num_days consecutive days, like the date_range of the scripts """
+	start = datetime.datetime.strptime(start, "%d-%m-%Y")
+	date_range = list()
+	for x in range(num_days):
+		dt = start + datetime.timedelta(days=x)
+		date_range.append(str(dt.month).zfill(2) + str(dt.day).zfill(2)) # pad casted string to 2 digit with leading 0s
+	return date_range
+
+
+def GenerateSyntheticData(data_dir, date_range, tweets_per_day=1000, vocab_size=5000, num_topics=20, topic_size=15, drift=0.1,
+						  keyword_rate=0.5, keywords=DEFAULT_KEYWORDS, entity_rate=0.1, seed=0, write_times=False, year=2020, line_delimited=False):
+	""" write processed_pu_<date>.json, pos_pu_<date>.json and ner_pu_<date>.json for each date of date_range
+		* write_times - also write time_pu_<date>.json with a uniform random ISO timestamp in year for each tweet, for --bucket_hours
+		* line_delimited - write .jsonl files with one tweet per line instead of json arrays
+		each tweet mixes tokens of one topic with filler tokens, topics drift from day to day
+		* drift - fraction of the tokens of each topic replaced by random nouns every day
+		* keyword_rate - fraction of tweets containing one of the keywords
+		* entity_rate - fraction of nouns tagged as named entities
+		* topics_by_date - {date: [[token, ...], ...]} the topics used each day, in the format of tweet_label_sets.txt
+	"""
+	rng = np.random.RandomState(seed)
+	time_rng = np.random.RandomState(seed + 1) # separate, the tweets do not depend on write_times
+	if not os.path.isdir(data_dir):
+		os.makedirs(data_dir)
+
+	nouns = ['n' + str(i) for i in range(vocab_size)]
+	fillers = ['f' + str(i) for i in range(max(50, vocab_size // 20))]
+	filler_pos = [FILLER_POS[i % len(FILLER_POS)] for i in range(len(fillers))]
+	noun_pos = rng.choice(NOUN_POS, size=vocab_size)
+	noun_ner = np.where(rng.rand(vocab_size) < entity_rate, rng.choice(NER_TAGS, size=vocab_size), 'O')
+
+	# topic popularity follows a zipf like distribution
+	topics = [rng.choice(vocab_size, size=topic_size, replace=False) for _ in range(num_topics)]
+	topic_weights = 1 / np.arange(1, num_topics + 1)
+	topic_weights = topic_weights / topic_weights.sum()
+
+	topics_by_date = dict()
+	for date in date_range:
+		tweets_text, tweets_pos, tweets_ner = list(), list(), list()
+		for topic_idx in rng.choice(num_topics, size=tweets_per_day, p=topic_weights):
+			topic = topics[topic_idx]
+			num_topic_tokens = rng.randint(2, min(8, topic_size) + 1)
+			num_filler_tokens = rng.randint(2, 10)
+			token_ids = rng.choice(topic, size=num_topic_tokens, replace=False)
+			filler_ids = rng.randint(0, len(fillers), size=num_filler_tokens)
+
+			tweet = [nouns[i] for i in token_ids] + [fillers[i] for i in filler_ids]
+			pos = [noun_pos[i] for i in token_ids] + [filler_pos[i] for i in filler_ids]
+			ner = [noun_ner[i] for i in token_ids] + ['O'] * num_filler_tokens
+			if rng.rand() < keyword_rate:
+				tweet.append(keywords[rng.randint(len(keywords))])
+				pos.append('NNP')
+				ner.append('O')
+
+			order = rng.permutation(len(tweet))
+			tweets_text.append([tweet[i] for i in order])
+			tweets_pos.append([str(pos[i]) for i in order])
+			tweets_ner.append([str(ner[i]) for i in order])
+
+		files = [('processed_pu_', tweets_text), ('pos_pu_', tweets_pos), ('ner_pu_', tweets_ner)]
+		if write_times:
+			seconds = np.sort(time_rng.randint(0, 24 * 3600, size=tweets_per_day))
+			day_prefix = str(year) + '-' + date[:2] + '-' + date[2:] + 'T'
+			files.append(('time_pu_', [day_prefix + str(s // 3600).zfill(2) + ':' + str(s // 60 % 60).zfill(2) + ':' + str(s % 60).zfill(2) for s in seconds]))
+
+		for prefix, content in files:
+			if line_delimited:
+				with open(os.path.join(data_dir, prefix + date + '.jsonl'), 'w', encoding='utf-8') as textfile:
+					for value in content:
+						textfile.write(json.dumps(value) + '\n')
+			else:
+				with open(os.path.join(data_dir, prefix + date + '.json'), 'w', encoding='utf-8') as textfile:
+					json.dump(content, textfile)
+
+		topics_by_date[date] = [[nouns[i] for i in topic] for topic in topics]
+
+		# drift the topics for the next day
+		for topic in topics:
+			replace = rng.rand(topic_size) < drift
+			topic[replace] = rng.choice(vocab_size, size=replace.sum())
+
+	return topics_by_date
+
+
+if __name__=='__main__':
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='synthetic data parameters')
+	parser.add_argument('--data_dir', type=str, default='../data/synthetic/', help='directory to write the synthetic processed, POS and NER files to')
+	parser.add_argument('--days', type=int, default=15, help='number of days')
+	parser.add_argument('--tweets_per_day', type=int, default=1000, help='number of tweets per day')
+	parser.add_argument('--vocab_size', type=int, default=5000, help='number of distinct nouns')
+	parser.add_argument('--num_topics', type=int, default=20, help='number of topics')
+	parser.add_argument('--drift', type=float, default=0.1, help='fraction of topic tokens replaced each day')
+	parser.add_argument('--seed', type=int, default=0, help='random seed')
+	parser.add_argument('--write_times', action='store_true', help='also write a timestamp per tweet, for buckets shorter than a day')
+	parser.add_argument('--line_delimited', action='store_true', help='write .jsonl files with one tweet per line')
+	args = parser.parse_args()
+
+	date_range = MakeSyntheticDateRange(args.days)
+	topics_by_date = GenerateSyntheticData(args.data_dir, date_range, args.tweets_per_day, args.vocab_size, args.num_topics, drift=args.drift, seed=args.seed, write_times=args.write_times, line_delimited=args.line_delimited)
+
+	# ground truth topics, in the format of the human labels
+	with open(os.path.join(args.data_dir, 'synthetic_topic_sets.json'), 'w', encoding='utf-8') as textfile:
+		json.dump(topics_by_date, textfile)
@@ -0,0 +1,130 @@
+# time range of a run and its timepoints, one timepoint per day labeled MMDD as in the original scripts,
+# or one per bucket_hours hours labeled MMDD-HH, where HH is the first hour of the bucket
+# TimeBuckets, GetBucketLabels, ParseHour, AddTimeRangeArguments, TimeBucketsFromArgs
+#
+# the input files stay one per day (processed_pu_<MMDD>.json, ...), with buckets shorter than a day the hour of each tweet
+# is read from time_pu_<MMDD>.json, a list with one timestamp per tweet
+
+import json
+import datetime
+
+DEFAULT_START = '19-08-2020'
+DEFAULT_END = '03-09-2020' # first day after the range
+DEFAULT_BUCKET_HOURS = 24
+DATE_FORMATS = ['%d-%m-%Y %H', '%d-%m-%Y']
+FILE_DAY_FORMAT = '%m%d' # day of the input files
+TWITTER_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+
+def GetBucketLabels(day_label, bucket_hours=24):
+	""" labels of the buckets of one day, [day_label] for daily buckets """
+	assert bucket_hours > 0 and 24 % bucket_hours == 0, 'bucket_hours needs to divide 24!'
+	if bucket_hours == 24:
+		return [day_label]
+	return [day_label + '-' + str(hour).zfill(2) for hour in range(0, 24, bucket_hours)]
+
+
+def ParseHour(timestamp):
+	""" hour of a timestamp: unix seconds (UTC), ISO 8601 or the created_at format of the twitter API """
+	if isinstance(timestamp, (int, float)):
+		return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).hour
+	try:
+		return datetime.datetime.fromisoformat(timestamp).hour
+	except ValueError:
+		return datetime.datetime.strptime(timestamp, TWITTER_TIME_FORMAT).hour
+
+
+def _parseDate(value):
+	if isinstance(value, datetime.datetime):
+		return value
+	for date_format in DATE_FORMATS:
+		try:
+			return datetime.datetime.strptime(value, date_format)
+		except ValueError:
+			continue
+	assert False, 'dates need to be dd-mm-yyyy or "dd-mm-yyyy HH": ' + str(value)
+
+
+class TimeBuckets(object):
+	""" consecutive buckets of bucket_hours hours from start to end, end excluded
+		* timepoints - labels of the buckets in time order, used as the timepoints of every stage and in the cluster ids
+		* timepoint_to_idx - {label: position}, so no stage has to search the list of timepoints
+	"""
+	def __init__(self, start=DEFAULT_START, end=DEFAULT_END, bucket_hours=DEFAULT_BUCKET_HOURS, day_format=FILE_DAY_FORMAT):
+		""" * start, end - dd-mm-yyyy or "dd-mm-yyyy HH" strings, or datetimes, aligned to the buckets
+			* day_format - strftime format of the day part of the labels, e.g. %Y%m%d for ranges longer than a year
+		"""
+		self.start = _parseDate(start)
+		self.end = _parseDate(end)
+		self.bucket_hours = bucket_hours
+		self.day_format = day_format
+		assert bucket_hours > 0 and 24 % bucket_hours == 0, 'bucket_hours needs to divide 24!'
+		assert self.start < self.end, 'start needs to be before end!'
+		for dt in [self.start, self.end]:
+			assert dt.minute == 0 and dt.second == 0 and dt.hour % bucket_hours == 0, 'start and end need to be aligned to the buckets!'
+
+		self.timepoints = list()
+		self.bucket_days = list() # day of the input files of each bucket
+		self.bucket_in_day = list() # position of each bucket in its day
+		step = datetime.timedelta(hours=bucket_hours)
+		current = self.start
+		while current < self.end:
+			label = current.strftime(day_format)
+			if bucket_hours < 24:
+				label += '-' + str(current.hour).zfill(2)
+			self.timepoints.append(label)
+			self.bucket_days.append(current.strftime(FILE_DAY_FORMAT))
+			self.bucket_in_day.append(current.hour // bucket_hours)
+			current += step
+
+		self.timepoint_to_idx = dict(zip(self.timepoints, range(len(self.timepoints))))
+		assert len(self.timepoint_to_idx) == len(self.timepoints), 'timepoint labels are not unique, add the year to day_format!'
+
+	def __len__(self):
+		return len(self.timepoints)
+
+	def IsDaily(self):
+		return self.bucket_hours == 24
+
+	def GetTimepoints(self):
+		return list(self.timepoints)
+
+	def GetTimepointIndex(self, timepoint):
+		return self.timepoint_to_idx[timepoint]
+
+	def GetDay(self, timepoint):
+		""" MMDD of the input files of the bucket """
+		return self.bucket_days[self.timepoint_to_idx[timepoint]]
+
+	def GetDayBuckets(self):
+		""" * day_buckets - [(MMDD, [(position in the day, timepoint), ...]), ...] in time order, partial days only have the buckets in range """
+		day_buckets = list()
+		for timepoint, day, bucket_idx in zip(self.timepoints, self.bucket_days, self.bucket_in_day):
+			if len(day_buckets) == 0 or day_buckets[-1][0] != day:
+				day_buckets.append((day, list()))
+			day_buckets[-1][1].append((bucket_idx, timepoint))
+		return day_buckets
+
+	def ToDict(self):
+		return {'start': self.start.strftime(DATE_FORMATS[0]), 'end': self.end.strftime(DATE_FORMATS[0]), 'bucket_hours': self.bucket_hours, 'day_format': self.day_format}
+
+
+def AddTimeRangeArguments(parser):
+	""" add --start, --end, --bucket_hours, --day_format and --time_config to an argparse parser """
+	parser.add_argument('--start', type=str, default=None, help='first day, dd-mm-yyyy or "dd-mm-yyyy HH", default ' + DEFAULT_START)
+	parser.add_argument('--end', type=str, default=None, help='first day after the range, default ' + DEFAULT_END)
+	parser.add_argument('--bucket_hours', type=int, default=None, help='hours per timepoint, a divisor of 24, default 24')
+	parser.add_argument('--day_format', type=str, default=None, help='strftime format of the day in the timepoint labels, default %%m%%d')
+	parser.add_argument('--time_config', type=str, default=None, help='json file with start, end, bucket_hours and day_format, the other arguments override it')
+
+
+def TimeBucketsFromArgs(args):
+	""" TimeBuckets of the arguments added by AddTimeRangeArguments """
+	config = {'start': DEFAULT_START, 'end': DEFAULT_END, 'bucket_hours': DEFAULT_BUCKET_HOURS, 'day_format': FILE_DAY_FORMAT}
+	if args.time_config is not None:
+		with open(args.time_config, 'r', encoding='utf-8') as textfile:
+			config.update(json.load(textfile))
+	for name in ['start', 'end', 'bucket_hours', 'day_format']:
+		if getattr(args, name) is not None:
+			config[name] = getattr(args, name)
+	return TimeBuckets(config['start'], config['end'], config['bucket_hours'], config['day_format'])
@@ -0,0 +1,427 @@
+# save and load transition graphs as a directory of numpy arrays
+# SaveTransitionGraph, LoadTransitionGraph, GraphToArrays, GraphToCSR, ReplaceDirectory
+
+import os
+import json
+import shutil
+import numpy as np
+
+from cluster_transition_graph_config import Vocabulary, GraphEdge, GraphEdgeIntersection, Graph
+
+FORMAT_VERSION = 1
+META_FILENAME = 'meta.json'
+
+# tokens are joined into one utf-8 blob, split again with one call on load
+TOKEN_SEPARATOR = '\x00'
+
+ARRAY_NAMES = ['vocabulary_blob',
+			   'node_timepoint_idx', 'node_cluster_idx', 'node_x_disappear', 'node_element_indptr', 'node_element_ids',
+			   'edge_src', 'edge_dst', 'edge_type', 'edge_element_change', 'edge_fuzzy_indptr', 'edge_fuzzy_type', 'edge_fuzzy_x',
+			   'reappear_src', 'reappear_dst', 'reappear_element_change', 'reappear_fuzzy_indptr', 'reappear_fuzzy_type', 'reappear_fuzzy_x',
+			   'inter_src', 'inter_dst', 'inter_count', 'inter_element_indptr', 'inter_element_ids']
+
+
+def _getCode(code_table, value):
+	""" return the code of value in code_table {value: code}, add value if new """
+	if value not in code_table:
+		code_table[value] = len(code_table)
+	return code_table[value]
+
+def _makeIndptr(lengths):
+	indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+	np.cumsum(lengths, out=indptr[1:])
+	return indptr
+
+def _concatenateIDs(list_of_ids):
+	if len(list_of_ids) == 0:
+		return np.zeros(0, dtype=np.int32)
+	return np.concatenate(list_of_ids).astype(np.int32, copy=False)
+
+
+def _getSourceArrays(graph):
+	""" return the arrays and meta of a loaded graph if they still describe it, else None
+		edges can only have been changed after their objects were created, nodes are compared one by one
+	"""
+	edge_loader = graph.source_edge_loader
+	if edge_loader is None or edge_loader.edges_created:
+		return None
+
+	nodes = list(graph.GetAllNodes())
+	if len(nodes) != len(edge_loader.nodes) or any(node is not loaded_node for node, loaded_node in zip(nodes, edge_loader.nodes)):
+		return None
+
+	# disappear strengths are set on the nodes, take the current ones
+	arrays = dict(edge_loader.arrays)
+	x_disappear = [node.GetDisappearStrength() for node in nodes]
+	arrays['node_x_disappear'] = np.array([np.nan if x is None else x for x in x_disappear], dtype=np.float64)
+	return arrays, edge_loader.meta
+
+
+def GraphToArrays(graph):
+	""" flatten a transition graph into numpy arrays, nodes are numbered in GetAllNodes order
+		a loaded graph whose edges were never created returns the loaded arrays without copying them
+		* arrays - {array name: np array}, see ARRAY_NAMES
+			-- node_*: one value per node, node_element_* is the CSR of the element ids
+			-- edge_*: one value per directed edge, ordered by start node, edge_fuzzy_* is the CSR of the fuzzy types
+			-- reappear_*: one value per reappear edge object, both directions are kept
+			-- inter_*: one value per intersecting edge
+		* meta - {'timepoints', 'edge_types', 'fuzzy_types', 'store_intersections', ...}
+	"""
+	source_arrays = _getSourceArrays(graph)
+	if source_arrays is not None:
+		return source_arrays
+
+	for token in graph.vocabulary.id_to_token:
+		assert TOKEN_SEPARATOR not in str(token), 'token contains the separator character'
+
+	nodes = list(graph.GetAllNodes())
+	node_to_idx = dict((id(node), i) for i, node in enumerate(nodes))
+	edge_type_codes = dict()
+	fuzzy_type_codes = dict()
+
+	node_element_ids = [node.GetElementIDs() for node in nodes]
+	x_disappear = [node.GetDisappearStrength() for node in nodes]
+
+	edge_src, edge_dst, edge_type, edge_element_change, edge_num_fuzzy, edge_fuzzy_type, edge_fuzzy_x = [], [], [], [], [], [], []
+	reappear_src, reappear_dst, reappear_element_change, reappear_num_fuzzy, reappear_fuzzy_type, reappear_fuzzy_x = [], [], [], [], [], []
+
+	for i, node in enumerate(nodes):
+		for neighbor_id, edge in node.GetOutgoingNeighborsAndEdges():
+			edge_src.append(i)
+			edge_dst.append(node_to_idx[id(edge.GetNodeEnd())])
+			edge_type.append(_getCode(edge_type_codes, edge.GetEdgeType()))
+			edge_element_change.append(edge.GetElementChangePercentage())
+			fuzzy_types = edge.GetFuzzytypes()
+			edge_num_fuzzy.append(len(fuzzy_types))
+			for fuzzy_type, x in fuzzy_types.items():
+				edge_fuzzy_type.append(_getCode(fuzzy_type_codes, fuzzy_type))
+				edge_fuzzy_x.append(x)
+
+		for neighbor_id, edge in node.GetReappearNeighborsAndEdges():
+			reappear_src.append(i)
+			reappear_dst.append(node_to_idx[id(edge.GetNodeEnd())])
+			reappear_element_change.append(edge.GetElementChangePercentage())
+			fuzzy_types = edge.GetFuzzytypes()
+			reappear_num_fuzzy.append(len(fuzzy_types))
+			for fuzzy_type, x in fuzzy_types.items():
+				reappear_fuzzy_type.append(_getCode(fuzzy_type_codes, fuzzy_type))
+				reappear_fuzzy_x.append(x)
+
+	inter_src, inter_dst, inter_count, inter_element_ids = [], [], [], []
+	for (node_1, node_2), inter_edge in graph.node_pair_to_inter_edge_mapping.items():
+		inter_src.append(node_to_idx[id(node_1)])
+		inter_dst.append(node_to_idx[id(node_2)])
+		inter_count.append(inter_edge.GetNumOfIntersectingElements())
+		if graph.store_intersections:
+			inter_element_ids.append(inter_edge.GetIntersectingElementIDs())
+
+	arrays = {
+		'vocabulary_blob': np.frombuffer(TOKEN_SEPARATOR.join(str(token) for token in graph.vocabulary.id_to_token).encode('utf-8'), dtype=np.uint8),
+		'node_timepoint_idx': np.array([node.GetTimepointIndex() for node in nodes], dtype=np.int32),
+		'node_cluster_idx': np.array([node.GetIndex() for node in nodes], dtype=np.int32),
+		'node_x_disappear': np.array([np.nan if x is None else x for x in x_disappear], dtype=np.float64),
+		'node_element_indptr': _makeIndptr([len(ids) for ids in node_element_ids]),
+		'node_element_ids': _concatenateIDs(node_element_ids),
+		'edge_src': np.array(edge_src, dtype=np.int32),
+		'edge_dst': np.array(edge_dst, dtype=np.int32),
+		'edge_type': np.array(edge_type, dtype=np.int16),
+		'edge_element_change': np.array(edge_element_change, dtype=np.float64),
+		'edge_fuzzy_indptr': _makeIndptr(edge_num_fuzzy),
+		'edge_fuzzy_type': np.array(edge_fuzzy_type, dtype=np.int8),
+		'edge_fuzzy_x': np.array(edge_fuzzy_x, dtype=np.float64),
+		'reappear_src': np.array(reappear_src, dtype=np.int32),
+		'reappear_dst': np.array(reappear_dst, dtype=np.int32),
+		'reappear_element_change': np.array(reappear_element_change, dtype=np.float64),
+		'reappear_fuzzy_indptr': _makeIndptr(reappear_num_fuzzy),
+		'reappear_fuzzy_type': np.array(reappear_fuzzy_type, dtype=np.int8),
+		'reappear_fuzzy_x': np.array(reappear_fuzzy_x, dtype=np.float64),
+		'inter_src': np.array(inter_src, dtype=np.int32),
+		'inter_dst': np.array(inter_dst, dtype=np.int32),
+		'inter_count': np.array(inter_count, dtype=np.int32),
+		'inter_element_indptr': _makeIndptr([len(ids) for ids in inter_element_ids]),
+		'inter_element_ids': _concatenateIDs(inter_element_ids),
+		}
+
+	meta = {'format_version': FORMAT_VERSION,
+			'timepoints': graph.GetTimepoints(),
+			'vocabulary_size': len(graph.vocabulary),
+			'edge_types': list(edge_type_codes.keys()),
+			'fuzzy_types': list(fuzzy_type_codes.keys()),
+			'store_intersections': graph.store_intersections,
+			'num_nodes': len(nodes),
+			'num_edges': len(edge_src),
+			}
+
+	return arrays, meta
+
+
+def _makeCSRPart(src, dst, num_nodes):
+	""" CSR of the edges src -> dst, order is None if the edges are already sorted by src, else the permutation applied """
+	src = np.asarray(src)
+	order = None
+	if len(src) > 1 and np.any(src[1:] < src[:-1]):
+		order = np.argsort(src, kind='stable')
+		dst = np.asarray(dst)[order]
+	indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+	np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+	return indptr, dst, order
+
+
+def _makeFuzzyCores(fuzzy_indptr, fuzzy_type, fuzzy_x, num_fuzzy_types, order):
+	""" dense (num edges, num fuzzy types) array of the fuzzy cores, 0 for the types an edge does not have """
+	num_edges = len(fuzzy_indptr) - 1
+	fuzzy_cores = np.zeros((num_edges, num_fuzzy_types), dtype=np.float64)
+	rows = np.repeat(np.arange(num_edges), np.diff(fuzzy_indptr))
+	fuzzy_cores[rows, np.asarray(fuzzy_type, dtype=np.int64)] = fuzzy_x
+	if order is not None:
+		fuzzy_cores = fuzzy_cores[order]
+	return fuzzy_cores
+
+
+def GraphToCSR(graph):
+	""" export the edges of a transition graph as CSR arrays for numpy/scipy analytics
+		the arrays of a loaded graph whose edges were never created are used as they are, directed and reappear edges
+		are saved sorted by start node so their indices are views into the loaded arrays
+		(indptr, indices) of a part can be passed to scipy.sparse.csr_matrix((data, indices, indptr))
+		* csr - {
+			'timepoints', 'edge_types', 'fuzzy_types': code tables,
+			'node_timepoint_idx', 'node_cluster_idx', 'node_size', 'node_x_disappear' (nan if not set): one value per node in GetAllNodes order,
+			'directed': {'indptr', 'indices', 'edge_type', 'element_change', 'fuzzy_cores'},
+			'reappear': {'indptr', 'indices', 'element_change', 'fuzzy_cores'}, both directions of a reappear edge,
+			'intersection': {'indptr', 'indices', 'count'}, one entry per intersecting pair, from the earlier node,
+			}
+			-- fuzzy_cores has one column per fuzzy type, 0 for the types an edge does not have
+	"""
+	arrays, meta = GraphToArrays(graph)
+	num_nodes = len(arrays['node_timepoint_idx'])
+	num_fuzzy_types = len(meta['fuzzy_types'])
+
+	csr = {'timepoints': meta['timepoints'],
+		   'edge_types': meta['edge_types'],
+		   'fuzzy_types': meta['fuzzy_types'],
+		   'node_timepoint_idx': arrays['node_timepoint_idx'],
+		   'node_cluster_idx': arrays['node_cluster_idx'],
+		   'node_size': np.diff(arrays['node_element_indptr']),
+		   'node_x_disappear': arrays['node_x_disappear'],
+		   }
+
+	indptr, indices, order = _makeCSRPart(arrays['edge_src'], arrays['edge_dst'], num_nodes)
+	csr['directed'] = {'indptr': indptr,
+					   'indices': indices,
+					   'edge_type': arrays['edge_type'] if order is None else arrays['edge_type'][order],
+					   'element_change': arrays['edge_element_change'] if order is None else arrays['edge_element_change'][order],
+					   'fuzzy_cores': _makeFuzzyCores(arrays['edge_fuzzy_indptr'], arrays['edge_fuzzy_type'], arrays['edge_fuzzy_x'], num_fuzzy_types, order),
+					   }
+
+	indptr, indices, order = _makeCSRPart(arrays['reappear_src'], arrays['reappear_dst'], num_nodes)
+	csr['reappear'] = {'indptr': indptr,
+					   'indices': indices,
+					   'element_change': arrays['reappear_element_change'] if order is None else arrays['reappear_element_change'][order],
+					   'fuzzy_cores': _makeFuzzyCores(arrays['reappear_fuzzy_indptr'], arrays['reappear_fuzzy_type'], arrays['reappear_fuzzy_x'], num_fuzzy_types, order),
+					   }
+
+	indptr, indices, order = _makeCSRPart(arrays['inter_src'], arrays['inter_dst'], num_nodes)
+	csr['intersection'] = {'indptr': indptr,
+						   'indices': indices,
+						   'count': arrays['inter_count'] if order is None else arrays['inter_count'][order],
+						   }
+
+	return csr
+
+
+def ReplaceDirectory(new_dir, target_dir):
+	""" move new_dir to target_dir, a target_dir that exists is moved aside first and removed after
+		the files of the old directory stay readable through the memory maps of a graph loaded from it
+	"""
+	old_dir = None
+	if os.path.isdir(target_dir):
+		old_dir = '{}.{}.old'.format(os.path.normpath(target_dir), os.getpid())
+		if os.path.isdir(old_dir):
+			shutil.rmtree(old_dir)
+		os.replace(target_dir, old_dir)
+	os.replace(new_dir, target_dir)
+	if old_dir is not None:
+		shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def SaveTransitionGraph(graph, graph_dir):
+	""" save transition graph to graph_dir, one .npy file per array and a meta.json
+		the files are written to a new directory next to graph_dir that then replaces it, so a graph loaded from
+		graph_dir with its arrays memory mapped can be saved back to it, and a failed save leaves graph_dir as it was
+	"""
+	arrays, meta = GraphToArrays(graph)
+
+	tmp_dir = '{}.{}.tmp'.format(os.path.normpath(graph_dir), os.getpid())
+	if os.path.isdir(tmp_dir):
+		shutil.rmtree(tmp_dir)
+	os.makedirs(tmp_dir)
+	try:
+		for name in ARRAY_NAMES:
+			np.save(os.path.join(tmp_dir, name + '.npy'), arrays[name])
+
+		with open(os.path.join(tmp_dir, META_FILENAME), 'w', encoding='utf-8') as textfile:
+			json.dump(meta, textfile, indent=2)
+	except BaseException:
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+		raise
+	ReplaceDirectory(tmp_dir, graph_dir)
+
+
+def LoadTransitionGraphArrays(graph_dir, mmap=True):
+	""" load the arrays and meta saved by SaveTransitionGraph, arrays are memory mapped if mmap """
+	with open(os.path.join(graph_dir, META_FILENAME), 'r', encoding='utf-8') as textfile:
+		meta = json.load(textfile)
+	assert meta['format_version'] == FORMAT_VERSION, 'unsupported transition graph format version'
+
+	mmap_mode = 'r' if mmap else None
+	arrays = dict()
+	for name in ARRAY_NAMES:
+		arrays[name] = np.load(os.path.join(graph_dir, name + '.npy'), mmap_mode=mmap_mode)
+
+	return arrays, meta
+
+
+def _makeNodeCSR(node_of_entry, num_nodes): 
+	""" group entries by node, return indptr and the entry indices ordered by node, entry order is kept within a node """
+	order = np.argsort(node_of_entry, kind='stable')
+	indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+	np.cumsum(np.bincount(node_of_entry, minlength=num_nodes), out=indptr[1:])
+	return indptr, order
+
+
+class ArrayEdgeLoader(object): 
+	""" create the edge objects of a loaded graph from the arrays of GraphToArrays when they are first needed 
+		edge objects are cached, so both nodes of an edge get the same object 
+	"""
+	def __init__(self, graph, nodes, arrays, meta): 
+		self.graph = graph 
+		self.nodes = nodes 
+		self.node_to_idx = dict((id(node), i) for i, node in enumerate(nodes))
+		self.arrays = arrays 
+		self.meta = meta 
+		self.edges_created = False 
+		self.edge_types = meta['edge_types']
+		self.fuzzy_types = meta['fuzzy_types']
+		self.store_intersections = meta['store_intersections']
+		
+		num_nodes = len(nodes)
+		self.out_indptr, self.out_order = _makeNodeCSR(arrays['edge_src'], num_nodes)
+		self.in_indptr, self.in_order = _makeNodeCSR(arrays['edge_dst'], num_nodes)
+		self.reappear_indptr, self.reappear_order = _makeNodeCSR(arrays['reappear_src'], num_nodes)
+		self.inter_src_indptr, self.inter_src_order = _makeNodeCSR(arrays['inter_src'], num_nodes)
+		self.inter_dst_indptr, self.inter_dst_order = _makeNodeCSR(arrays['inter_dst'], num_nodes)
+		
+		self.edge_cache = dict() # {edge index: GraphEdge}
+		self.inter_edge_cache = dict() # {intersecting edge index: GraphEdgeIntersection}
+		
+	def _addFuzzyTypes(self, edge, prefix, k): 
+		fuzzy_indptr = self.arrays[prefix + '_fuzzy_indptr']
+		fuzzy_type = self.arrays[prefix + '_fuzzy_type']
+		fuzzy_x = self.arrays[prefix + '_fuzzy_x']
+		for j in range(int(fuzzy_indptr[k]), int(fuzzy_indptr[k + 1])): 
+			edge.AddFuzzyType(self.fuzzy_types[fuzzy_type[j]], float(fuzzy_x[j]))
+		
+	def GetEdge(self, k): 
+		if k not in self.edge_cache: 
+			arrays = self.arrays 
+			edge = GraphEdge(self.nodes[arrays['edge_src'][k]], self.nodes[arrays['edge_dst'][k]], self.edge_types[arrays['edge_type'][k]], float(arrays['edge_element_change'][k]))
+			self._addFuzzyTypes(edge, 'edge', k)
+			self.edge_cache[k] = edge 
+		return self.edge_cache[k]
+		
+	def GetIntersectingEdge(self, k): 
+		if k not in self.inter_edge_cache: 
+			arrays = self.arrays 
+			node_1 = self.nodes[arrays['inter_src'][k]]
+			node_2 = self.nodes[arrays['inter_dst'][k]]
+			if self.store_intersections: 
+				inter_element_indptr = arrays['inter_element_indptr']
+				intersection_ids = arrays['inter_element_ids'][inter_element_indptr[k]:inter_element_indptr[k + 1]]
+				self.inter_edge_cache[k] = GraphEdgeIntersection(node_1, node_2, intersection_ids, self.graph.vocabulary)
+			else: 
+				self.inter_edge_cache[k] = GraphEdgeIntersection(node_1, node_2, None, num_intersection=int(arrays['inter_count'][k]))
+		return self.inter_edge_cache[k]
+		
+	def _loadNodeEdges(self, node): 
+		i = self.node_to_idx[id(node)]
+		arrays = self.arrays 
+		
+		for k in self.out_order[self.out_indptr[i]:self.out_indptr[i + 1]].tolist(): 
+			edge = self.GetEdge(k)
+			node.AddOutgoingNeighbor(edge.GetNodeEnd().GetID(), edge)
+			
+		for k in self.in_order[self.in_indptr[i]:self.in_indptr[i + 1]].tolist(): 
+			edge = self.GetEdge(k)
+			node.AddIncomingNeighbor(edge.GetNodeStart().GetID(), edge)
+			
+		# each direction of a reappear edge has its own edge object, only referenced by its start node 
+		for k in self.reappear_order[self.reappear_indptr[i]:self.reappear_indptr[i + 1]].tolist(): 
+			neighbor = self.nodes[arrays['reappear_dst'][k]]
+			node.AddReappearNeighbor(neighbor, 'reappear', float(arrays['reappear_element_change'][k]))
+			self._addFuzzyTypes(node.GetEdge(neighbor.GetID(), include_reappear=True), 'reappear', k)
+			
+		# intersecting edges in the order they were added, as the node saw them 
+		inter_indices = self.inter_src_order[self.inter_src_indptr[i]:self.inter_src_indptr[i + 1]].tolist() + self.inter_dst_order[self.inter_dst_indptr[i]:self.inter_dst_indptr[i + 1]].tolist()
+		for k in sorted(inter_indices): 
+			inter_edge = self.GetIntersectingEdge(k)
+			node_1, node_2 = inter_edge.GetNodes()
+			node.AddIntersectingEdgeByNode(node_2 if node_1 is node else node_1, inter_edge)
+			
+	def _loadGraphIntersectingEdges(self, graph): 
+		for k in range(len(self.arrays['inter_src'])): 
+			inter_edge = self.GetIntersectingEdge(k)
+			graph.node_pair_to_inter_edge_mapping[inter_edge.GetNodes()] = inter_edge 
+		
+	def LoadEdges(self, target): 
+		""" called once by a node or by the graph when its edge mappings are first accessed """
+		self.edges_created = True 
+		if isinstance(target, Graph): 
+			self._loadGraphIntersectingEdges(target)
+		else: 
+			self._loadNodeEdges(target)
+
+
+def ArraysToGraph(arrays, meta, lazy=True):
+	""" rebuild the transition graph objects from the arrays of GraphToArrays
+		node and intersection elements are views into the arrays, nothing is parsed per edge
+		* lazy - only create the edges of a node when they are first accessed, otherwise create all edges now
+	"""
+	vocabulary = Vocabulary()
+	if meta['vocabulary_size'] > 0:
+		vocabulary.id_to_token = bytes(arrays['vocabulary_blob']).decode('utf-8').split(TOKEN_SEPARATOR)
+		vocabulary.token_to_id = dict(zip(vocabulary.id_to_token, range(len(vocabulary.id_to_token))))
+
+	graph = Graph(vocabulary, meta['store_intersections'])
+	timepoints = meta['timepoints']
+	for timepoint in timepoints:
+		graph.AddTimepoint(timepoint)
+
+	nodes = list()
+	node_element_indptr = arrays['node_element_indptr'].tolist()
+	node_element_ids = arrays['node_element_ids']
+	x_disappear = arrays['node_x_disappear'].tolist()
+	for i, (timepoint_idx, cluster_idx) in enumerate(zip(arrays['node_timepoint_idx'].tolist(), arrays['node_cluster_idx'].tolist())):
+		element_ids = node_element_ids[node_element_indptr[i]:node_element_indptr[i + 1]]
+		node = graph.AddNode(None, timepoints[timepoint_idx], cluster_idx, element_ids=element_ids)
+		if not np.isnan(x_disappear[i]):
+			node.SetDisappearStrength(x_disappear[i])
+		nodes.append(node)
+
+	edge_loader = ArrayEdgeLoader(graph, nodes, arrays, meta)
+	graph.edge_loader = edge_loader
+	graph.source_edge_loader = edge_loader
+	for node in nodes:
+		node.edge_loader = edge_loader
+
+	if not lazy:
+		graph.node_pair_to_inter_edge_mapping
+		for node in nodes:
+			node.node_to_inter_edge_mapping
+
+	return graph
+
+
+def LoadTransitionGraph(graph_dir, mmap=True, lazy=True):
+	""" load a transition graph saved by SaveTransitionGraph """
+	arrays, meta = LoadTransitionGraphArrays(graph_dir, mmap)
+	return ArraysToGraph(arrays, meta, lazy)
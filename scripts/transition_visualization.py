@@ -0,0 +1,333 @@
+# bash: python transition_visualization.py --mode crisp/fuzzy --format png --pages all/window/subgraph --max_nodes 300
+# render the transition tuples of main_trace_transition.py as graphviz DOT files, one file or one per page
+# TransitionViz, DedupStrongestTuples, WriteTransitionDot, MakeWindowPages, MakeSubgraphPages, SplitPageByNodes
+
+import os
+import json
+import bisect
+import argparse
+
+from json_stream import IterJSONArray
+from time_buckets import AddTimeRangeArguments, TimeBucketsFromArgs
+
+# line width multiplier per fuzzy strength
+STRENGTH_TO_PENWIDTH = {'weak': 0.1, 'medium': 0.8, 'strong': 1}
+STRENGTH_ORDER = {'weak': 0, 'medium': 1, 'strong': 2}
+
+EDGE_COLOR = {'unchanged': 'azure3',
+			  'absorbed': 'chartreuse3',
+			  'split': 'crimson',
+			  'dissolved': 'deepskyblue',
+			  'merged': 'blueviolet',
+			  'reappear': 'chocolate1',
+			  }
+
+
+def MakeTimepointLabels(timepoints):
+	""" label timepoints A, B, ..., Z, AA, AB, ... in order
+		* timepoint_to_label - {timepoint: label}
+	"""
+	timepoint_to_label = dict()
+	for i, timepoint in enumerate(timepoints):
+		label = ''
+		i += 1
+		while i > 0:
+			i, remainder = divmod(i - 1, 26)
+			label = chr(ord('A') + remainder) + label
+		timepoint_to_label[timepoint] = label
+	return timepoint_to_label
+
+
+def ClusterIDToDisplayID(node_id, timepoint_to_label):
+	""" convert cluster ids to the ids shown in the visualization, e.g. 0820_01 --> B01 """
+	timepoint, _, cluster_idx = node_id.rpartition('_')
+	return timepoint_to_label[timepoint] + cluster_idx
+
+
+def GetEdgeStyle(edge_type, penwidth=3):
+	""" edge attributes of a transition type, empty for unknown types """
+	if edge_type not in EDGE_COLOR:
+		return ''
+	style = ', style=dashed' if edge_type == 'reappear' else ''
+	return ' [dir=none, weight=1, penwidth={}, color={}{}]'.format(penwidth, EDGE_COLOR[edge_type], style)
+
+
+def DedupStrongestTuples(list_of_node_tuples):
+	""" keep the tuple with the largest membership for each (cl_idx_1, cl_idx_2, transition_type) in one pass
+		ties keep the stronger fuzzy strength, tuples are in the format of main_trace_transition.py:
+			(cl_idx_1, cl_idx_2, transition_type, strength, membership_miu)
+		* key_to_tuple - {(cl_idx_1, cl_idx_2, transition_type): tuple} in order of first appearance
+	"""
+	key_to_tuple = dict()
+	for node_tuple in list_of_node_tuples:
+		key = (node_tuple[0], node_tuple[1], node_tuple[2])
+		current = key_to_tuple.get(key)
+		if current is None or (node_tuple[4], STRENGTH_ORDER.get(node_tuple[3], 0)) > (current[4], STRENGTH_ORDER.get(current[3], 0)):
+			key_to_tuple[key] = tuple(node_tuple)
+	return key_to_tuple
+
+
+def WriteTransitionDot(textfile, node_tuples, timepoints, timepoint_to_label=None):
+	""" write the DOT description of the transitions to an open text file, line by line
+		* node_tuples - deduplicated transition tuples
+		* timepoints - timepoints in display order, one rank per timepoint
+		* timepoint_to_label - labels of the timepoints, pages of one graph share the labels of all its timepoints
+	"""
+	if timepoint_to_label is None:
+		timepoint_to_label = MakeTimepointLabels(timepoints)
+	timepoint_to_idx = dict(zip(timepoints, range(len(timepoints))))
+
+	# nodes of each timepoint, ordered by cluster index
+	node_ids = set()
+	for node_tuple in node_tuples:
+		node_ids.add(node_tuple[0])
+		node_ids.add(node_tuple[1])
+	nodes_by_timepoint = [list() for _ in timepoints]
+	for node_id in node_ids:
+		timepoint, _, cluster_idx = node_id.rpartition('_')
+		nodes_by_timepoint[timepoint_to_idx[timepoint]].append((int(cluster_idx), node_id))
+
+	textfile.write('digraph A {\nranksep=.75; nodesep = 0.15; rankdir = LR;\ngraph [fontname=Verdana ];\nnode [fontname=Verdana];\nedge [fontname=Verdana];{\nnode [shape=plaintext, fontname=Verdana, fontsize=18];\n')
+	# labels of sub-daily buckets, e.g. 0819-06, are only valid DOT ids when quoted
+	textfile.write(' -> '.join(timepoint if timepoint.isdigit() else '"' + timepoint + '"' for timepoint in timepoints) + ';\n}\n')
+
+	for nodes in nodes_by_timepoint:
+		if len(nodes) > 0:
+			textfile.write('{ rank = same; ')
+			for _, node_id in sorted(nodes):
+				textfile.write(ClusterIDToDisplayID(node_id, timepoint_to_label) + '; ')
+			textfile.write('}\n')
+
+	for cl_idx_1, cl_idx_2, transition_type, strength, miu in node_tuples:
+		penwidth = 7 * miu * STRENGTH_TO_PENWIDTH.get(strength, 1)
+		textfile.write(ClusterIDToDisplayID(cl_idx_1, timepoint_to_label) + '->' + ClusterIDToDisplayID(cl_idx_2, timepoint_to_label) + GetEdgeStyle(transition_type, penwidth) + ';\n')
+
+	textfile.write('}\n')
+
+
+def RenderDot(dot_path, output_path, format='png'):
+	""" render a DOT file with graphviz, only needed when an image is asked for """
+	import graphviz
+
+	src = graphviz.Source.from_file(dot_path)
+	src.format = format
+	return src.render(output_path)
+
+
+def FilterTuples(node_tuples, min_membership=0, transition_types=None):
+	""" keep the tuples with membership >= min_membership and, if given, a transition type in transition_types """
+	for node_tuple in node_tuples:
+		if node_tuple[4] >= min_membership and (transition_types is None or node_tuple[2] in transition_types):
+			yield node_tuple
+
+
+def _getTimepointIndex(node_id, timepoint_to_idx):
+	return timepoint_to_idx[node_id.rpartition('_')[0]]
+
+
+def MakeWindowPages(node_tuples, timepoints, window_size=7):
+	""" split the tuples into windows of window_size timepoints, consecutive windows share their boundary timepoint
+		so that every transition between adjacent timepoints is on a page
+		* pages - [(first timepoint idx, last timepoint idx, [tuple, ...]), ...]
+		* num_dropped - number of tuples spanning more than one window, e.g. long reappear transitions
+	"""
+	assert window_size >= 2, 'a window needs at least 2 timepoints!'
+	timepoint_to_idx = dict(zip(timepoints, range(len(timepoints))))
+	step = window_size - 1
+	num_windows = max(1, -(-(len(timepoints) - 1) // step))
+	window_tuples = [list() for _ in range(num_windows)]
+	num_dropped = 0
+
+	for node_tuple in node_tuples:
+		idx_1 = _getTimepointIndex(node_tuple[0], timepoint_to_idx)
+		idx_2 = _getTimepointIndex(node_tuple[1], timepoint_to_idx)
+		# only the window starting at or before the earlier timepoint can contain both
+		window_idx = min(min(idx_1, idx_2) // step, num_windows - 1)
+		if max(idx_1, idx_2) > window_idx * step + step:
+			num_dropped += 1
+			continue
+		window_tuples[window_idx].append(node_tuple)
+
+	pages = list()
+	for window_idx, page_tuples in enumerate(window_tuples):
+		first_idx = window_idx * step
+		pages.append((first_idx, min(first_idx + step, len(timepoints) - 1), page_tuples))
+	return pages, num_dropped
+
+
+def MakeSubgraphPages(node_tuples, timepoints):
+	""" one page per transition subgraph, the connected components of the tuples, ordered by their first timepoint
+		* pages - [(first timepoint idx, last timepoint idx, [tuple, ...]), ...]
+	"""
+	timepoint_to_idx = dict(zip(timepoints, range(len(timepoints))))
+	parent = dict()
+
+	def find(node_id):
+		root = node_id
+		while parent[root] != root:
+			root = parent[root]
+		while parent[node_id] != root:
+			parent[node_id], node_id = root, parent[node_id]
+		return root
+
+	node_tuples = list(node_tuples)
+	for node_tuple in node_tuples:
+		for node_id in node_tuple[:2]:
+			if node_id not in parent:
+				parent[node_id] = node_id
+		root_1, root_2 = find(node_tuple[0]), find(node_tuple[1])
+		if root_1 != root_2:
+			parent[root_2] = root_1
+
+	root_to_page = dict() # {root: [first timepoint idx, last timepoint idx, tuples]}
+	for node_tuple in node_tuples:
+		idx_1 = _getTimepointIndex(node_tuple[0], timepoint_to_idx)
+		idx_2 = _getTimepointIndex(node_tuple[1], timepoint_to_idx)
+		root = find(node_tuple[0])
+		if root not in root_to_page:
+			root_to_page[root] = [min(idx_1, idx_2), max(idx_1, idx_2), list()]
+		page = root_to_page[root]
+		page[0] = min(page[0], idx_1, idx_2)
+		page[1] = max(page[1], idx_1, idx_2)
+		page[2].append(node_tuple)
+
+	return sorted([tuple(page) for page in root_to_page.values()], key=lambda page: (page[0], page[1]))
+
+
+def SplitPageByNodes(page, timepoints, max_nodes):
+	""" split a page into consecutive timepoint ranges with at most max_nodes nodes each, ranges share their boundary timepoint
+		a range always keeps at least 2 timepoints, so it can exceed max_nodes if 2 timepoints already do
+		* pages - [(first timepoint idx, last timepoint idx, [tuple, ...]), ...]
+		* num_dropped - number of tuples spanning more than one range
+	"""
+	first_idx, last_idx, page_tuples = page
+	timepoint_to_idx = dict(zip(timepoints, range(len(timepoints))))
+	nodes_by_timepoint = dict()
+	for node_tuple in page_tuples:
+		for node_id in node_tuple[:2]:
+			nodes_by_timepoint.setdefault(_getTimepointIndex(node_id, timepoint_to_idx), set()).add(node_id)
+	if first_idx == last_idx or sum(len(nodes) for nodes in nodes_by_timepoint.values()) <= max_nodes:
+		return [page], 0
+
+	# greedy ranges over the timepoints of the page
+	ranges = list()
+	range_start = first_idx
+	while range_start < last_idx:
+		range_end = range_start + 1
+		num_nodes = len(nodes_by_timepoint.get(range_start, ())) + len(nodes_by_timepoint.get(range_end, ()))
+		while range_end < last_idx and num_nodes + len(nodes_by_timepoint.get(range_end + 1, ())) <= max_nodes:
+			range_end += 1
+			num_nodes += len(nodes_by_timepoint.get(range_end, ()))
+		ranges.append((range_start, range_end))
+		range_start = range_end
+
+	range_tuples = [list() for _ in ranges]
+	range_ends = [range_end for _, range_end in ranges]
+	num_dropped = 0
+	for node_tuple in page_tuples:
+		idx_1 = _getTimepointIndex(node_tuple[0], timepoint_to_idx)
+		idx_2 = _getTimepointIndex(node_tuple[1], timepoint_to_idx)
+		low, high = min(idx_1, idx_2), max(idx_1, idx_2)
+		range_idx = bisect.bisect_left(range_ends, high)
+		if ranges[range_idx][0] <= low:
+			range_tuples[range_idx].append(node_tuple)
+		else:
+			num_dropped += 1
+
+	return [(range_start, range_end, tuples) for (range_start, range_end), tuples in zip(ranges, range_tuples) if len(tuples) > 0], num_dropped
+
+
+def TransitionViz(input_path, dot_path, timepoints, format=None, pages='all', window_size=7, max_nodes=None, min_membership=0, transition_types=None):
+	""" stream the tuple file, keep the strongest tuple per transition and write the DOT file
+		the image is rendered next to the DOT file if format is not None
+		* pages - 'all' for one DOT file, 'window' for one page per window_size timepoints, 'subgraph' for one page per transition subgraph
+		* max_nodes - pages with more nodes are split by time, so the graphviz layout of each page stays bounded
+		with more than one page, the pages are written to <dot_path without .dot>_page<i>.dot and listed in <...>_pages.json
+	"""
+	key_to_tuple = DedupStrongestTuples(IterJSONArray(input_path))
+	node_tuples = list(FilterTuples(key_to_tuple.values(), min_membership, transition_types))
+
+	if os.path.dirname(dot_path) != '' and not os.path.isdir(os.path.dirname(dot_path)):
+		os.makedirs(os.path.dirname(dot_path))
+
+	num_dropped = 0
+	if pages == 'all':
+		page_list = [(0, len(timepoints) - 1, node_tuples)]
+	elif pages == 'window':
+		page_list, num_dropped = MakeWindowPages(node_tuples, timepoints, window_size)
+	elif pages == 'subgraph':
+		page_list = MakeSubgraphPages(node_tuples, timepoints)
+	else:
+		assert False, 'pages needs to be either "all", "window" or "subgraph"!'
+
+	if max_nodes is not None:
+		split_pages = list()
+		for page in page_list:
+			pages_of_page, num_dropped_of_page = SplitPageByNodes(page, timepoints, max_nodes)
+			split_pages.extend(pages_of_page)
+			num_dropped += num_dropped_of_page
+		page_list = split_pages
+
+	if pages == 'all' and len(page_list) == 1:
+		with open(dot_path, 'w', encoding='utf-8') as textfile:
+			WriteTransitionDot(textfile, node_tuples, timepoints)
+		if format is not None:
+			RenderDot(dot_path, os.path.splitext(dot_path)[0], format)
+		return
+
+	# labels of all the timepoints, so a cluster has the same label on every page
+	timepoint_to_label = MakeTimepointLabels(timepoints)
+	dot_prefix = os.path.splitext(dot_path)[0]
+	num_digits = len(str(len(page_list)))
+	page_index = {'num_pages': len(page_list), 'num_dropped_transitions': num_dropped, 'pages': list()}
+
+	for page_idx, (first_idx, last_idx, page_tuples) in enumerate(page_list):
+		page_path = dot_prefix + '_page' + str(page_idx).zfill(num_digits) + '.dot'
+		with open(page_path, 'w', encoding='utf-8') as textfile:
+			WriteTransitionDot(textfile, page_tuples, timepoints[first_idx:last_idx + 1], timepoint_to_label)
+		if format is not None:
+			RenderDot(page_path, os.path.splitext(page_path)[0], format)
+
+		node_ids = set()
+		for node_tuple in page_tuples:
+			node_ids.update(node_tuple[:2])
+		page_index['pages'].append({'dot': os.path.basename(page_path),
+									'timepoints': [timepoints[first_idx], timepoints[last_idx]],
+									'num_nodes': len(node_ids),
+									'num_transitions': len(page_tuples)})
+
+	with open(dot_prefix + '_pages.json', 'w', encoding='utf-8') as textfile:
+		json.dump(page_index, textfile, indent=2)
+
+
+if __name__=='__main__':
+
+	# constants
+	result_dir = '../data/results/'
+	dot_dir = '../data/dot/'
+
+	# argument from commandline
+	parser = argparse.ArgumentParser(description='transition visualization parameters')
+	parser.add_argument('--mode', type=str, default='fuzzy', help='choose whether to render the crisp or fuzzy transition tuples')
+	parser.add_argument('--format', type=str, default=None, help='also render the DOT file with graphviz to this format, e.g. png')
+	parser.add_argument('--pages', type=str, default='all', help='choose whether to render all transitions at once, by time window or by transition subgraph')
+	parser.add_argument('--window_size', type=int, default=7, help='number of timepoints per window page')
+	parser.add_argument('--max_nodes', type=int, default=None, help='split pages with more clusters than this by time')
+	parser.add_argument('--min_membership', type=float, default=0, help='only render transitions with at least this membership')
+	parser.add_argument('--transition_types', type=str, nargs='*', default=None, help='only render these transition types')
+	parser.add_argument('--event', type=str, default=None, help='render the transition tuples of this event of main_run_clustering.py --events')
+	AddTimeRangeArguments(parser)
+	args = parser.parse_args()
+	assert args.mode in ['crisp', 'fuzzy'], 'mode needs to be either "crisp" or "fuzzy"!'
+	assert args.pages in ['all', 'window', 'subgraph'], 'pages needs to be either "all", "window" or "subgraph"!'
+
+	# date range [0819, 0902] by default, the same arguments as main_trace_transition.py
+	date_range = TimeBucketsFromArgs(args).GetTimepoints()
+
+	if args.event is not None:
+		result_dir = os.path.join(result_dir, args.event)
+		dot_dir = os.path.join(dot_dir, args.event)
+
+	file_name = args.mode + '_graph_tuples'
+	TransitionViz(os.path.join(result_dir, file_name + '.json'), os.path.join(dot_dir, file_name + '.dot'), date_range, args.format,
+				  pages=args.pages, window_size=args.window_size, max_nodes=args.max_nodes, min_membership=args.min_membership, transition_types=args.transition_types)
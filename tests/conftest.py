@@ -0,0 +1,5 @@
+# the scripts import each other by module name, as when run from scripts/
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
@@ -0,0 +1,55 @@
+import numpy as np
+import networkx as nx
+
+from synthetic_data import GenerateSyntheticData, MakeSyntheticDateRange, DEFAULT_KEYWORDS
+from main_run_clustering import MakeTokenGraphsRaw, AddRemovedNodesToClusters
+
+
+def _addRemovedNodesToClustersLoop(graph, nodes_removed, clustering):
+	""" the per node loop AddRemovedNodesToClusters replaced """
+	modified_clustering = list()
+	for cluster in clustering:
+		new_cluster = set()
+		for node in cluster:
+			neighbors = set(graph.neighbors(node))
+			new_cluster.update(neighbors.intersection(nodes_removed))
+		new_cluster.update(cluster)
+		modified_clustering.append(list(new_cluster))
+	return modified_clustering
+
+
+def _makeClustering(graph, nodes_removed, num_clusters, rng):
+	""" random partition of the tokens that were not removed """
+	tokens = [token for token in graph.nodes() if token not in set(nodes_removed)]
+	labels = rng.randint(0, num_clusters, size=len(tokens))
+	return [[token for token, label in zip(tokens, labels) if label == cluster_idx] for cluster_idx in range(num_clusters)]
+
+
+def test_matches_loop_on_synthetic_graphs(tmp_path):
+	date_range = MakeSyntheticDateRange(3)
+	GenerateSyntheticData(str(tmp_path), date_range, tweets_per_day=500, vocab_size=800, seed=1)
+	graphs, daily_tweet_counts = MakeTokenGraphsRaw(date_range, str(tmp_path), DEFAULT_KEYWORDS)
+
+	rng = np.random.RandomState(0)
+	for graph in graphs:
+		# the tokens FindOptimClustering removes first
+		sorted_tokens = [token for token, coeff in sorted(nx.clustering(graph).items(), key=lambda x: x[1])]
+		for num_removed in [0, 1, 10, len(sorted_tokens) // 5]:
+			nodes_removed = sorted_tokens[:num_removed]
+			for num_clusters in [1, 5, 40]:
+				clustering = _makeClustering(graph, nodes_removed, num_clusters, rng)
+				expected = _addRemovedNodesToClustersLoop(graph, nodes_removed, clustering)
+				modified_clustering = AddRemovedNodesToClusters(graph, nodes_removed, clustering)
+
+				assert [set(cluster) for cluster in modified_clustering] == [set(cluster) for cluster in expected]
+				assert all(len(cluster) == len(set(cluster)) for cluster in modified_clustering)
+				# the tokens of the cluster come first, in their order
+				assert all(modified[:len(cluster)] == cluster for modified, cluster in zip(modified_clustering, clustering))
+
+
+def test_empty_inputs():
+	graph = nx.Graph()
+	graph.add_edge('a', 'b')
+	assert AddRemovedNodesToClusters(graph, [], [['a', 'b']]) == [['a', 'b']]
+	assert AddRemovedNodesToClusters(graph, ['b'], [['a']]) == [['a', 'b']]
+	assert AddRemovedNodesToClusters(graph, ['a', 'b'], []) == []
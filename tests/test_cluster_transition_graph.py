@@ -0,0 +1,50 @@
+from cluster_transition_graph_config import Graph
+from fuzzy_transition import MakeTransitionGraphFuzzy
+from lineage_index import LineageIndex
+
+
+def _makeUnchangedChains(timepoints, num_chains):
+	""" num_chains clusters at every timepoint, each unchanged from the cluster with the same index before it """
+	graph = Graph()
+	nodes = [[graph.AddNode(['token%d' % i], timepoint, i) for i in range(num_chains)] for timepoint in timepoints]
+	for previous_nodes, next_nodes in zip(nodes, nodes[1:]):
+		for node_1, node_2 in zip(previous_nodes, next_nodes):
+			graph.AddDirectedEdge(node_1, node_2, 'unchanged')
+	return graph
+
+
+def test_subgraph_from_last_node_keeps_time_order(capsys):
+	graph = _makeUnchangedChains(['0819', '0820', '0821'], 2)
+	subgraph = graph.GetTransitionSubgraphByNodeID('0821_01')
+	assert subgraph.GetTimepoints() == ['0819', '0820', '0821']
+
+	subgraph.PrintTransitionGraph()
+	assert capsys.readouterr().out.splitlines() == ['TransitionGraph', '0819_01 -- unchanged --> 0820_01', '0820_01 -- unchanged --> 0821_01']
+
+	lineage_index = LineageIndex(subgraph)
+	assert lineage_index.GetAncestors('0821_01') == ['0819_01', '0820_01']
+	assert lineage_index.GetLevel('0821_01') == 2
+
+
+def test_intersecting_edge_getters_take_node_ids():
+	graph = MakeTransitionGraphFuzzy(['0819', '0820'], [[['a', 'b'], ['c']], [['a', 'c'], ['b', 'd']]])
+	assert graph.HasIntersectingEdge('0819_00', '0820_00')
+	assert graph.HasIntersectingEdge('0819_00', '0820_01')
+	assert not graph.HasIntersectingEdge('0820_00', '0819_00')
+	assert not graph.HasIntersectingEdge('0819_01', '0820_01')
+	assert not graph.HasIntersectingEdge('0819_00', '0821_00')
+	assert graph.GetIntersectingElements('0819_00', '0820_01') == {'b'}
+	assert graph.GetIntersectingEdge('0819_01', '0820_00').GetNodeIDs() == ('0819_01', '0820_00')
+
+	node = graph.GetNodeByID('0820_00')
+	assert list(node.GetIntersectingNeighborsAndElements()) == [('0819_00', {'a'}), ('0819_01', {'c'})]
+	assert node.GetIntersectingElements('0819_01') == {'c'}
+	assert [node_id for node_id, edge in node.GetIntersectingNeighborsAndEdges()] == ['0819_00', '0819_01']
+
+	# a graph built with the id-based adders
+	graph = Graph()
+	graph.AddNode(['a', 'b'], '0819', 0)
+	graph.AddNode(['b'], '0820', 0)
+	graph.AddIntersectingEdge('0819_00', '0820_00', ['b'])
+	assert graph.GetIntersectingElements('0819_00', '0820_00') == {'b'}
+	assert graph.GetNodeByID('0819_00').GetIntersectingElements('0820_00') == {'b'}
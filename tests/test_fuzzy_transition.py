@@ -0,0 +1,102 @@
+import random
+
+from fuzzy_transition import MakeTransitionGraphFuzzy
+
+
+def _fuzzyCoresSixPasses(list_of_timepoint, clustering_by_timepoint):
+	""" the cores of the six separate passes SetFuzzyTransitionCores replaced, on plain sets
+		* cores - {(timepoint_idx, cluster_idx): disappear x}, {(timepoint_idx, cluster_idx, next_cluster_idx): [(type, x), ...]}
+	"""
+	clusters = [[set(cluster) for cluster in clustering] for clustering in clustering_by_timepoint]
+	node_x = dict()
+	edge_types = dict()
+	for t in range(len(list_of_timepoint)):
+		for a, cluster_a in enumerate(clusters[t]):
+			if t == len(list_of_timepoint) - 1:
+				node_x[(t, a)] = 0
+				continue
+			next_clusters = [b for b, cluster_b in enumerate(clusters[t + 1]) if cluster_a & cluster_b]
+			passed = set().union(*[cluster_a & clusters[t + 1][b] for b in next_clusters])
+			node_x[(t, a)] = 1 - len(passed) / len(cluster_a)
+			for b in next_clusters:
+				edge_types[(t, a, b)] = list()
+
+	# unchanged, absorbed, dissolved
+	for key in edge_types:
+		t, a, b = key
+		cluster_a, cluster_b = clusters[t][a], clusters[t + 1][b]
+		intersection, union = cluster_a & cluster_b, cluster_a | cluster_b
+		edge_types[key].append(('unchanged', len(intersection) / len(union)))
+	for key in edge_types:
+		t, a, b = key
+		cluster_a, cluster_b = clusters[t][a], clusters[t + 1][b]
+		intersection, union = cluster_a & cluster_b, cluster_a | cluster_b
+		x = len(intersection) / len(cluster_a) - len(intersection) / len(union)
+		if x > 0:
+			edge_types[key].append(('absorbed', x))
+	for key in edge_types:
+		t, a, b = key
+		cluster_a, cluster_b = clusters[t][a], clusters[t + 1][b]
+		intersection, union = cluster_a & cluster_b, cluster_a | cluster_b
+		x = len(intersection) / len(cluster_b) - len(intersection) / len(union)
+		if x > 0:
+			edge_types[key].append(('dissolved', x))
+
+	# split over the next clusters of a, merge over the previous clusters of b
+	for key in edge_types:
+		t, a, b = key
+		next_clusters = [clusters[t + 1][b2] for (t2, a2, b2) in edge_types if (t2, a2) == (t, a)]
+		if len(next_clusters) > 1:
+			passed = set().union(*[clusters[t][a] & cluster for cluster in next_clusters])
+			x = len(passed) / len(clusters[t][a].union(*next_clusters))
+			if x:
+				edge_types[key].append(('split', x))
+	for key in edge_types:
+		t, a, b = key
+		previous_clusters = [clusters[t][a2] for (t2, a2, b2) in edge_types if (t2, b2) == (t, b)]
+		if len(previous_clusters) > 1:
+			passed = set().union(*[clusters[t + 1][b] & cluster for cluster in previous_clusters])
+			x = len(passed) / len(clusters[t + 1][b].union(*previous_clusters))
+			if x:
+				edge_types[key].append(('merged', x))
+	return node_x, edge_types
+
+
+def _fuzzyCores(transition_graph, list_of_timepoint):
+	""" the cores set on a transition graph, keyed as in _fuzzyCoresSixPasses """
+	node_x = dict()
+	edge_types = dict()
+	for t, timepoint in enumerate(list_of_timepoint):
+		for node in transition_graph.GetNodesAtTimepoint(timepoint):
+			node_x[(t, node.GetIndex())] = node.GetDisappearStrength()
+			for neighbor_id, edge in node.GetOutgoingNeighborsAndEdges():
+				edge_types[(t, node.GetIndex(), edge.GetNodeEnd().GetIndex())] = list(edge.GetFuzzytypes().items())
+	return node_x, edge_types
+
+
+def _randomClusterings(rnd):
+	""" 1 to 6 timepoints, disjoint or overlapping clusterings of a small vocabulary """
+	list_of_timepoint = ['08%02d' % (10 + i) for i in range(rnd.randint(1, 6))]
+	vocab = ['w%d' % i for i in range(rnd.randint(3, 40))]
+	clustering_by_timepoint = list()
+	for timepoint in list_of_timepoint:
+		num_clusters = rnd.randint(1, 6)
+		if rnd.random() < 0.4:
+			clustering = [rnd.sample(vocab, rnd.randint(1, min(8, len(vocab)))) for _ in range(num_clusters)]
+		else:
+			tokens = vocab[:]
+			rnd.shuffle(tokens)
+			clustering = list()
+			for _ in range(num_clusters):
+				size = min(rnd.randint(1, 5), len(tokens))
+				clustering.append(tokens[:size] or [vocab[0]])
+				tokens = tokens[size:]
+		clustering_by_timepoint.append(clustering)
+	return list_of_timepoint, clustering_by_timepoint
+
+
+def test_fused_cores_match_six_passes():
+	for seed in range(300):
+		list_of_timepoint, clustering_by_timepoint = _randomClusterings(random.Random(seed))
+		transition_graph = MakeTransitionGraphFuzzy(list_of_timepoint, clustering_by_timepoint)
+		assert _fuzzyCores(transition_graph, list_of_timepoint) == _fuzzyCoresSixPasses(list_of_timepoint, clustering_by_timepoint), seed
@@ -0,0 +1,62 @@
+import os
+import json
+
+import pytest
+
+import incremental
+from incremental import AppendDay, LoadCorpusStats
+from synthetic_data import GenerateSyntheticData, MakeSyntheticDateRange, DEFAULT_KEYWORDS
+
+
+class _Crash(Exception):
+	pass
+
+
+def _crashOnce(monkeypatch, name):
+	""" make incremental.<name> raise the first time it is called """
+	function = getattr(incremental, name)
+
+	def crash(*args, **kwargs):
+		monkeypatch.setattr(incremental, name, function)
+		raise _Crash()
+
+	monkeypatch.setattr(incremental, name, crash)
+
+
+def _readOutputs(result_dir):
+	outputs = dict()
+	for name in ['corpus_stats.json', 'stale_artifacts.json', 'crisp_graph_tuples.json', 'fuzzy_graph_tuples.json',
+				 os.path.join('crisp_transition_graph', 'meta.json'), os.path.join('fuzzy_transition_graph', 'meta.json')]:
+		with open(os.path.join(result_dir, name), 'r', encoding='utf-8') as textfile:
+			outputs[name] = json.load(textfile)
+	return outputs
+
+
+@pytest.mark.parametrize('crash_at', ['_writeJSONAtomic', '_moveStagedOutputs'])
+def test_append_recovers_from_a_crash(tmp_path, monkeypatch, crash_at):
+	data_dir = str(tmp_path / 'processed')
+	date_range = MakeSyntheticDateRange(3)
+	GenerateSyntheticData(data_dir, date_range, tweets_per_day=200, vocab_size=400, seed=1, write_times=True)
+
+	expected_dir = str(tmp_path / 'expected')
+	for date in date_range:
+		AppendDay(date, data_dir, expected_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+
+	result_dir = str(tmp_path / 'results')
+	AppendDay(date_range[0], data_dir, result_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+	# dies before or after the day counts as appended
+	_crashOnce(monkeypatch, crash_at)
+	with pytest.raises(_Crash):
+		AppendDay(date_range[1], data_dir, result_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+
+	if crash_at == '_writeJSONAtomic':
+		assert len(LoadCorpusStats(result_dir)['timepoints']) == 2
+		AppendDay(date_range[1], data_dir, result_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+	else:
+		assert len(LoadCorpusStats(result_dir)['timepoints']) == 4
+		with pytest.raises(AssertionError, match='already appended'):
+			AppendDay(date_range[1], data_dir, result_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+	AppendDay(date_range[2], data_dir, result_dir, DEFAULT_KEYWORDS, bucket_hours=12)
+
+	assert _readOutputs(result_dir) == _readOutputs(expected_dir)
+	assert sorted(os.listdir(result_dir)) == sorted(os.listdir(expected_dir))
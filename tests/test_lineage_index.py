@@ -0,0 +1,34 @@
+from cluster_transition_graph_config import Graph
+from lineage_index import LineageIndex
+
+
+def _makeChain(x_values):
+	""" one fuzzy unchanged transition with each core in x_values, from 0819_00 over the following days """
+	graph = Graph()
+	nodes = [graph.AddNode(['a'], '08%02d' % (19 + i), 0) for i in range(len(x_values) + 1)]
+	for node_1, node_2, x in zip(nodes, nodes[1:], x_values):
+		graph.AddDirectedEdge(node_1, node_2, 'fuzzy')
+		node_1.GetEdge(node_2.GetID()).AddFuzzyType('unchanged', x)
+	return graph
+
+
+def test_fuzzy_strength_filter():
+	# with the limiter 0.3, 0.4, 0.6, 0.7: 0.62 is mostly medium and a little strong, 0.35 is half weak and half medium
+	lineage_index = LineageIndex(_makeChain([0.9, 0.62, 0.35, 0.1]), fuzzy_limiter=[0.3, 0.4, 0.6, 0.7])
+	assert lineage_index.GetDescendants('0819_00') == ['0820_00', '0821_00', '0822_00', '0823_00']
+	assert lineage_index.GetDescendants('0819_00', min_strength='strong') == ['0820_00', '0821_00']
+	assert lineage_index.GetDescendants('0819_00', min_strength='strong', min_miu=0.5) == ['0820_00']
+	assert lineage_index.GetDescendants('0819_00', min_strength='medium') == ['0820_00', '0821_00', '0822_00']
+	assert lineage_index.GetAncestors('0823_00', min_strength='medium') == list()
+	assert lineage_index.FindPaths('0819_00', '0822_00', min_strength='medium') == [['0819_00', '0820_00', '0821_00', '0822_00']]
+
+	# the same cores are all weak with a higher limiter
+	lineage_index = LineageIndex(_makeChain([0.9, 0.62, 0.35, 0.1]), fuzzy_limiter=[0.95, 0.96, 0.97, 0.98])
+	assert lineage_index.GetDescendants('0819_00', min_strength='medium') == list()
+
+
+def test_crisp_transitions_are_strong():
+	graph = Graph()
+	node_1, node_2 = graph.AddNode(['a'], '0819', 0), graph.AddNode(['a'], '0820', 0)
+	graph.AddDirectedEdge(node_1, node_2, 'unchanged')
+	assert LineageIndex(graph).GetDescendants('0819_00', min_strength='strong', min_miu=0.99) == ['0820_00']
@@ -0,0 +1,42 @@
+import os
+import random
+
+import numpy as np
+
+from fuzzy_transition import MakeTransitionGraphFuzzy, SetFuzzyReappear
+from transition_graph_io import SaveTransitionGraph, LoadTransitionGraph, LoadTransitionGraphArrays
+
+
+def _makeClusterings(num_timepoints, vocab_size, seed):
+	rnd = random.Random(seed)
+	list_of_timepoint = ['%04d' % (819 + i) for i in range(num_timepoints)]
+	clustering_by_timepoint = list()
+	for timepoint in list_of_timepoint:
+		tokens = ['w%d' % i for i in rnd.sample(range(vocab_size), vocab_size // 2)]
+		clusters = [list() for _ in range(rnd.randint(30, 60))]
+		for token in tokens:
+			clusters[rnd.randrange(len(clusters))].append(token)
+		clustering_by_timepoint.append([cluster for cluster in clusters if len(cluster) > 0])
+	return list_of_timepoint, clustering_by_timepoint
+
+
+def test_save_into_own_directory(tmp_path):
+	# large enough that the arrays are rewritten while they are memory mapped
+	list_of_timepoint, clustering_by_timepoint = _makeClusterings(40, 3000, 2)
+	transition_graph = MakeTransitionGraphFuzzy(list_of_timepoint, clustering_by_timepoint)
+	SetFuzzyReappear(transition_graph, list_of_timepoint)
+	graph_dir = str(tmp_path / 'fuzzy_transition_graph')
+	SaveTransitionGraph(transition_graph, graph_dir)
+	expected_arrays, expected_meta = LoadTransitionGraphArrays(graph_dir, mmap=False)
+
+	loaded_graph = LoadTransitionGraph(graph_dir)
+	SaveTransitionGraph(loaded_graph, graph_dir)
+	arrays, meta = LoadTransitionGraphArrays(graph_dir, mmap=False)
+	assert meta == expected_meta
+	for name, expected in expected_arrays.items():
+		np.testing.assert_array_equal(arrays[name], expected)
+	assert os.listdir(str(tmp_path)) == ['fuzzy_transition_graph']
+
+	# the loaded graph still reads the arrays it was loaded from
+	assert loaded_graph.GetTimepoints() == list_of_timepoint
+	assert sum(1 for node in loaded_graph.GetAllNodes() for _ in node.GetOutgoingNeighborsAndEdges()) == len(expected_arrays['edge_src'])